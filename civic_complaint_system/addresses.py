@@ -0,0 +1,70 @@
+"""Address normalisation for grouping complaints by locality.
+
+Addresses are free text ("12, M.G. Rd, Bengaluru 560001"). locality_key
+reduces one to its last two meaningful parts, usually the street or area
+and the city ("mg road, bangalore"). House numbers, PIN codes and
+"near ..." landmarks are dropped, and common abbreviations and spellings
+are unified, so that differently written addresses of one place share a
+key.
+"""
+import re
+
+ABBREVIATIONS = {
+    'rd': 'road',
+    'st': 'street',
+    'ave': 'avenue',
+    'ln': 'lane',
+    'cir': 'circle',
+    'crs': 'cross',
+    'blvd': 'boulevard',
+    'nagr': 'nagar',
+    'sect': 'sector',
+    'sec': 'sector',
+    'apts': 'apartments',
+    'stn': 'station',
+    'hwy': 'highway',
+    'blr': 'bangalore',
+    'bengaluru': 'bangalore',
+    'bombay': 'mumbai',
+    'madras': 'chennai',
+    'calcutta': 'kolkata',
+}
+
+# Components starting with these describe a landmark, not the locality
+LANDMARK_PREFIXES = ('near', 'opp', 'opposite', 'behind', 'beside', 'next to', 'in front of', 'adjacent to')
+
+UNKNOWN_LOCALITY = 'unknown'
+
+# House and flat numbers: "12", "12/3", "#4b", "no 7", "flat 2c", "plot 15-a"
+HOUSE_NUMBER = re.compile(r'^(?:(?:no|house|flat|plot|door|shop|h)\s*)?#?\s*\d+[a-z]?(?:\s*[-/]\s*\d*[a-z]?)*$')
+PIN_CODE = re.compile(r'\b\d{6}\b')
+
+def normalise_component(component):
+    """One comma-separated part of an address, lower case with abbreviations expanded"""
+    component = PIN_CODE.sub(' ', component)
+    words = re.sub(r'[^a-z0-9/#\-\s]', ' ', component).split()
+    return ' '.join(ABBREVIATIONS.get(word, word) for word in words)
+
+def normalise_address(address):
+    """The meaningful parts of an address, in order"""
+    if not address:
+        return []
+    # "M.G. Road" and "MG Road" are the same street
+    text = address.lower().replace('&', ' and ').replace('.', '')
+    parts = []
+    for component in re.split(r'[,\n;]+', text):
+        component = normalise_component(component)
+        if not component or HOUSE_NUMBER.match(component):
+            continue
+        if any(component == prefix or component.startswith(prefix + ' ') for prefix in LANDMARK_PREFIXES):
+            continue
+        if not parts or parts[-1] != component:
+            parts.append(component)
+    return parts
+
+def locality_key(address):
+    """Key shared by the addresses of one locality, at most 120 characters"""
+    parts = normalise_address(address)
+    if not parts:
+        return UNKNOWN_LOCALITY
+    return ', '.join(parts[-2:])[:120]
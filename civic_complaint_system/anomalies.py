@@ -0,0 +1,181 @@
+"""Spike alerts: bursts of one category of complaints from one locality.
+
+A run of water_supply complaints from one area usually means a burst main.
+Every (category, locality) pair has a row in anomaly_states with the
+complaints submitted in the current hour and an exponentially weighted
+mean and variance of the hours before. Each new complaint updates that one
+row in the complaint's transaction, without reading the history. When the
+current hour's count is ANOMALY_MIN_COUNT or more and ANOMALY_Z_THRESHOLD
+standard deviations above the mean, an AnomalyAlert is recorded and the
+department's officers are notified through the outbox (see
+notifications.py), at most once per pair and hour. The admin dashboard lists the last day's alerts.
+
+Complaints created more than an hour in the past (imports, test data) are
+not live submissions and are skipped. To start from the recent history
+instead of from nothing, replay the hotspot buckets:
+
+    python anomalies.py rebuild
+"""
+import math
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from addresses import locality_key
+from models import db, Complaint, User, AnomalyState, AnomalyAlert, HotspotBucket, insert_ignore
+from notifications import enqueue_notification
+
+# Longer quiet spells are folded in as one decay step
+MAX_EMPTY_HOURS = 7 * 24
+# Variance floor, so the first complaints after a quiet spell are not infinitely unusual
+MIN_VARIANCE = 0.25
+
+def hour_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def fold(mean, variance, value, alpha):
+    """Exponentially weighted mean and variance after one more observation"""
+    diff = value - mean
+    increment = alpha * diff
+    return mean + increment, (1 - alpha) * (variance + diff * increment)
+
+def advance(state, hour, alpha):
+    """Move a state dict on to ``hour``, folding in the finished hour and the empty hours after it"""
+    gap = int((hour - state['hour']).total_seconds() // 3600)
+    if gap <= 0:
+        return state
+    mean, variance = fold(state['mean'], state['variance'], state['count'], alpha)
+    empty = gap - 1
+    for _ in range(min(empty, MAX_EMPTY_HOURS)):
+        mean, variance = fold(mean, variance, 0, alpha)
+    if empty > MAX_EMPTY_HOURS:
+        decay = (1 - alpha) ** (empty - MAX_EMPTY_HOURS)
+        mean, variance = mean * decay, variance * decay
+    return dict(state, hour=hour, count=0, mean=mean, variance=variance, hours=state['hours'] + gap)
+
+def z_score(count, mean, variance):
+    return (count - mean) / math.sqrt(max(variance, mean, MIN_VARIANCE))
+
+def load_state(connection, category, locality, hour):
+    """The pair's state, locked for this transaction where the database supports it"""
+    table = AnomalyState.__table__
+    initial = {'category': category, 'locality': locality, 'hour': hour, 'count': 0, 'mean': 0.0,
+               'variance': 0.0, 'hours': 0, 'alerted_hour': None}
+    # Two first complaints at once must not both insert the row
+    insert_ignore(connection, table, initial, ['category', 'locality'])
+    row = connection.execute(select(table).where(table.c.category == category, table.c.locality == locality)
+                             .with_for_update()).one()
+    return dict(row._mapping)
+
+def record_submissions(connection, category, locality, submissions, config):
+    """Count new complaints of one pair, given as (created_at, department) in submission order.
+
+    Returns the AnomalyAlert row values of any spikes they complete. The
+    state row is read and written once however many complaints there are.
+    """
+    state = load_state(connection, category, locality, hour_of(submissions[0][0]))
+    alerts = []
+    for created_at, department in submissions:
+        hour = hour_of(created_at)
+        state = advance(state, hour, config['ANOMALY_ALPHA'])
+        # A complaint from an hour the state has already moved past is too late to matter
+        if hour != state['hour']:
+            continue
+        state['count'] += 1
+
+        score = z_score(state['count'], state['mean'], state['variance'])
+        if (state['alerted_hour'] != hour and state['count'] >= config['ANOMALY_MIN_COUNT']
+                and score >= config['ANOMALY_Z_THRESHOLD']):
+            state['alerted_hour'] = hour
+            alert = {'category': category, 'locality': locality, 'department': department, 'hour': hour,
+                     'count': state['count'], 'expected': state['mean'], 'z_score': score,
+                     'created_at': datetime.utcnow()}
+            alert['id'] = connection.execute(AnomalyAlert.__table__.insert(), alert).inserted_primary_key[0]
+            alerts.append(alert)
+
+    table = AnomalyState.__table__
+    connection.execute(table.update()
+                       .where(table.c.category == category, table.c.locality == locality)
+                       .values({name: state[name] for name in ('hour', 'count', 'mean', 'variance', 'hours',
+                                                               'alerted_hour')}))
+    return alerts
+
+def notify_alert(connection, alert):
+    """Queue a notification about the alert for each officer of its department"""
+    if not alert['department']:
+        return 0
+    users = User.__table__
+    officers = connection.execute(
+        select(users.c.id, users.c.email)
+        .where(users.c.role == 'municipal', users.c.department == alert['department'], users.c.is_active.is_(True))
+    ).all()
+    payload = {name: alert[name] for name in ('id', 'category', 'locality', 'hour', 'count', 'expected')}
+    return sum(enqueue_notification('complaint_spike', alert['department'], officer.email, payload,
+                                    f"complaint_spike:{alert['id']}:{officer.id}")
+               for officer in officers)
+
+@event.listens_for(Session, 'after_flush')
+def detect_submission_spikes(session, flush_context):
+    complaints = [instance for instance in session.new if isinstance(instance, Complaint)]
+    if not complaints or not has_app_context() or not current_app.config.get('ANOMALY_DETECTION'):
+        return
+    config = current_app.config
+    live_since = datetime.utcnow() - timedelta(hours=1)
+    # A flush of many complaints (the intake writer's groups) updates each pair once
+    pairs = {}
+    for complaint in complaints:
+        created_at = complaint.created_at or datetime.utcnow()
+        if created_at < live_since:
+            continue
+        pairs.setdefault((complaint.category, locality_key(complaint.address)), []).append(
+            (created_at, complaint.assigned_department))
+    connection = session.connection()
+    for (category, locality), submissions in pairs.items():
+        submissions.sort(key=lambda submission: submission[0])
+        for alert in record_submissions(connection, category, locality, submissions, config):
+            notify_alert(connection, alert)
+
+def recent_alerts(hours=24, limit=20):
+    """Alerts raised in the last ``hours`` hours, newest first"""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    return AnomalyAlert.query.filter(AnomalyAlert.created_at >= since)\
+        .order_by(AnomalyAlert.created_at.desc()).limit(limit).all()
+
+def rebuild_anomaly_states(days=7, now=None):
+    """Replace the states with ones replayed from the last ``days`` of hotspot buckets"""
+    from hotspots import ensure_hotspot_counts
+
+    ensure_hotspot_counts()
+    now = now or datetime.utcnow()
+    alpha = current_app.config['ANOMALY_ALPHA']
+    current_hour = hour_of(now)
+    start = current_hour - timedelta(days=days)
+    buckets = HotspotBucket.__table__
+    states = {}
+    for locality, category, hour, count in db.session.execute(
+        select(buckets.c.locality, buckets.c.category, buckets.c.hour, buckets.c.count)
+        .where(buckets.c.hour >= start, buckets.c.count > 0).order_by(buckets.c.hour)
+    ):
+        state = states.get((category, locality)) or {
+            'category': category, 'locality': locality, 'hour': start, 'count': 0, 'mean': 0.0,
+            'variance': 0.0, 'hours': 0, 'alerted_hour': None}
+        state = states[(category, locality)] = advance(state, hour, alpha)
+        state['count'] += count
+    rows = [advance(state, current_hour, alpha) if state['hour'] < current_hour else state
+            for state in states.values()]
+
+    db.session.execute(AnomalyState.__table__.delete())
+    if rows:
+        db.session.execute(AnomalyState.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+if __name__ == '__main__':
+    import sys
+    from app import create_app
+
+    if sys.argv[1:] != ['rebuild']:
+        sys.exit('usage: python anomalies.py rebuild')
+    with create_app().app_context():
+        db.create_all()
+        print(f'Rebuilt {rebuild_anomaly_states()} anomaly states from the hotspot buckets')
@@ -1,8 +1,14 @@
 import os
 from flask import Flask
 from flask_login import LoginManager
-from models import db, User
+from models import db, User, install_sqlite_pragmas
 from config import config
+from instrumentation import init_instrumentation
+from slow_queries import init_slow_query_log
+from metrics import init_metrics
+from profiling import init_profiling
+from events import init_status_events
+from templating import init_template_cache, warm_templates
 
 def create_app(config_name=None):
     app = Flask(__name__)
@@ -11,9 +17,17 @@ def create_app(config_name=None):
     if config_name is None:
         config_name = os.environ.get('FLASK_ENV', 'default')
     app.config.from_object(config[config_name])
+    init_template_cache(app)
 
     # Initialize extensions
     db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(db.engine, app.config.get('SQLITE_PRAGMAS'))
+        init_instrumentation(app, db.engine)
+        init_slow_query_log(app, db.engine)
+        init_metrics(app, db.engine)
+        init_status_events(app, db.engine)
+    init_profiling(app)
 
     # Initialize Flask-Login
     login_manager = LoginManager()
@@ -32,11 +46,16 @@ def create_app(config_name=None):
         os.makedirs(upload_folder)
 
     # Register blueprints
-    from routes import auth_bp, main_bp, complaints_bp, admin_bp
+    from routes import auth_bp, main_bp, complaints_bp, admin_bp, api_bp
     app.register_blueprint(auth_bp, url_prefix='/')
     app.register_blueprint(main_bp, url_prefix='/')
     app.register_blueprint(complaints_bp, url_prefix='/')
     app.register_blueprint(admin_bp, url_prefix='/')
+    app.register_blueprint(api_bp, url_prefix='/api/v1')
+
+    # API clients authenticate with a bearer token instead of the session cookie
+    from routes.api import load_api_user
+    login_manager.request_loader(load_api_user)
 
     # Custom template functions
     @app.template_filter('datetime')
@@ -103,6 +122,9 @@ def create_app(config_name=None):
         db.session.rollback()
         return render_template('500.html'), 500
 
+    if app.config.get('TEMPLATE_WARMUP'):
+        warm_templates(app)
+
     return app
 
 def init_db(app):
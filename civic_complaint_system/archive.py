@@ -0,0 +1,106 @@
+"""Hot/cold archival of closed complaints.
+
+Resolved and rejected complaints older than ARCHIVE_AFTER_DAYS are moved,
+together with their status updates, from the hot ``complaints`` and
+``status_updates`` tables into ``complaints_archive`` and
+``status_updates_archive``. Each batch is copied and deleted inside one
+transaction, so a crash never leaves a complaint in both places or neither.
+
+    python archive_complaints.py --days 365 --batch-size 500
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, delete, literal
+from models import db, Complaint, StatusUpdate, ArchivedComplaint, ArchivedStatusUpdate, ComplaintLocality
+
+CLOSED_STATUSES = ['resolved', 'rejected']
+
+COMPLAINT_COLUMNS = [
+    'id', 'user_id', 'assigned_department', 'assigned_officer', 'category',
+    'description', 'address', 'landmark', 'image_filename', 'status', 'priority',
+    'resolution_notes', 'created_at', 'updated_at', 'resolved_at'
+]
+
+STATUS_UPDATE_COLUMNS = ['id', 'complaint_id', 'updated_by', 'old_status', 'new_status', 'note', 'timestamp']
+
+def archive_cutoff(older_than_days=None):
+    """Return the last-activity timestamp before which closed complaints are archived"""
+    if older_than_days is None:
+        older_than_days = current_app.config['ARCHIVE_AFTER_DAYS']
+    return datetime.utcnow() - timedelta(days=older_than_days)
+
+def find_archivable_ids(cutoff, limit):
+    """Return ids of closed complaints with no activity since the cutoff"""
+    return db.session.execute(
+        select(Complaint.id)
+        .where(Complaint.status.in_(CLOSED_STATUSES), Complaint.updated_at < cutoff)
+        .order_by(Complaint.id)
+        .limit(limit)
+    ).scalars().all()
+
+def archive_batch(complaint_ids):
+    """Move one batch of complaints and their status updates to the archive tables"""
+    complaints = Complaint.__table__
+    updates = StatusUpdate.__table__
+    now = datetime.utcnow()
+
+    db.session.execute(
+        ArchivedComplaint.__table__.insert().from_select(
+            COMPLAINT_COLUMNS + ['archived_at'],
+            select(*[complaints.c[name] for name in COMPLAINT_COLUMNS], literal(now))
+            .where(complaints.c.id.in_(complaint_ids))
+        )
+    )
+    db.session.execute(
+        ArchivedStatusUpdate.__table__.insert().from_select(
+            STATUS_UPDATE_COLUMNS,
+            select(*[updates.c[name] for name in STATUS_UPDATE_COLUMNS])
+            .where(updates.c.complaint_id.in_(complaint_ids))
+        )
+    )
+    db.session.execute(delete(updates).where(updates.c.complaint_id.in_(complaint_ids)))
+    db.session.execute(delete(ComplaintLocality.__table__).where(ComplaintLocality.complaint_id.in_(complaint_ids)))
+    db.session.execute(delete(complaints).where(complaints.c.id.in_(complaint_ids)))
+
+def archive_closed_complaints(older_than_days=None, batch_size=None, max_batches=None):
+    """Archive closed complaints in batches, committing after each batch.
+
+    Returns the number of complaints moved to the archive.
+    """
+    if batch_size is None:
+        batch_size = current_app.config['ARCHIVE_BATCH_SIZE']
+    cutoff = archive_cutoff(older_than_days)
+
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        complaint_ids = find_archivable_ids(cutoff, batch_size)
+        if not complaint_ids:
+            break
+
+        try:
+            archive_batch(complaint_ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        archived += len(complaint_ids)
+        batches += 1
+
+    return archived
+
+def count_archivable(older_than_days=None):
+    """Count closed complaints that would be archived with the given age"""
+    cutoff = archive_cutoff(older_than_days)
+    return Complaint.query.filter(
+        Complaint.status.in_(CLOSED_STATUSES),
+        Complaint.updated_at < cutoff
+    ).count()
+
+def get_complaint_or_archived(complaint_id):
+    """Look up a complaint in the hot table, falling back to the archive"""
+    complaint = db.session.get(Complaint, complaint_id)
+    if complaint is None:
+        complaint = db.session.get(ArchivedComplaint, complaint_id)
+    return complaint
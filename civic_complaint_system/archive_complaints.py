@@ -0,0 +1,28 @@
+import argparse
+from app import create_app
+from models import db
+from archive import archive_closed_complaints, count_archivable
+
+def main():
+    parser = argparse.ArgumentParser(description='Move old resolved/rejected complaints to the archive tables')
+    parser.add_argument('--days', type=int, default=None,
+                        help='archive complaints closed more than this many days ago (default: ARCHIVE_AFTER_DAYS)')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='complaints moved per transaction (default: ARCHIVE_BATCH_SIZE)')
+    parser.add_argument('--dry-run', action='store_true', help='only report how many complaints would be archived')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        # Make sure the archive tables exist on databases created before archival
+        db.create_all()
+
+        if args.dry_run:
+            print(f'{count_archivable(args.days)} complaints eligible for archival')
+            return
+
+        archived = archive_closed_complaints(args.days, args.batch_size)
+        print(f'Archived {archived} complaints')
+
+if __name__ == '__main__':
+    main()
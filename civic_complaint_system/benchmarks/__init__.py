@@ -0,0 +1,5 @@
+"""Performance benchmarks for the civic complaint system.
+
+Run from the civic_complaint_system directory, e.g.
+``python -m benchmarks.db_concurrency``.
+"""
@@ -0,0 +1,151 @@
+"""Size and scan speed of VARCHAR vs small-integer coded columns.
+
+Builds a database with the legacy VARCHAR schema, measures it, converts a
+copy with migrate_coded_columns and measures again.
+
+    python -m benchmarks.coded_columns --rows 200000
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import MetaData, Table, String, create_engine
+
+from codes import CodedString, VOCABULARIES
+from migrate_coded_columns import migrate_database
+from models import db
+
+QUERIES = {
+    'status counts': "SELECT status, COUNT(*) FROM complaints GROUP BY status",
+    'department backlog': "SELECT COUNT(*) FROM complaints WHERE assigned_department = {department} "
+                          "AND status IN ({submitted}, {in_progress})",
+    'category/priority scan': "SELECT COUNT(*) FROM complaints WHERE category = {category} AND priority = {priority}",
+    'role counts': "SELECT role, COUNT(*) FROM users GROUP BY role",
+}
+
+def create_legacy_schema(engine):
+    """Create the schema as it was before coded columns, with VARCHAR types"""
+    metadata = MetaData()
+    for table in db.metadata.sorted_tables:
+        columns = []
+        for column in table.columns:
+            copy = column._copy()
+            if isinstance(column.type, CodedString):
+                copy.type = String(50)
+            columns.append(copy)
+        Table(table.name, metadata, *columns)
+    metadata.create_all(engine)
+
+    # Same indexes as the models declare
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                unique = 'UNIQUE ' if index.unique else ''
+                columns = ', '.join(column.name for column in index.columns)
+                conn.exec_driver_sql(f'CREATE {unique}INDEX IF NOT EXISTS {index.name} ON {table.name} ({columns})')
+
+def populate(db_path, rows):
+    """Fill the legacy database with realistic string values"""
+    categories = list(VOCABULARIES['category'])
+    departments = {'potholes': 'roads', 'streetlight': 'roads', 'garbage': 'sanitation',
+                   'water_supply': 'water', 'drainage': 'water', 'other': 'general'}
+    now = datetime.utcnow()
+    conn = sqlite3.connect(db_path)
+    users = [(i, f'User {i}', f'user{i}@example.com', 'x',
+              'citizen' if i > 20 else ('admin' if i == 1 else 'municipal'), now.isoformat())
+             for i in range(1, 1001)]
+    conn.executemany('INSERT INTO users (id, name, email, password_hash, role, created_at) '
+                     'VALUES (?, ?, ?, ?, ?, ?)', users)
+    batch = []
+    for i in range(1, rows + 1):
+        category = random.choice(categories)
+        created = now - timedelta(minutes=random.randrange(0, 525600))
+        batch.append((i, random.randrange(21, 1001), departments[category], category,
+                      'Complaint description text', 'MG Road, Bangalore',
+                      random.choices(['submitted', 'in_progress', 'resolved', 'rejected'], [2, 3, 8, 1])[0],
+                      random.choice(['low', 'medium', 'high']), created.isoformat(), created.isoformat()))
+        if len(batch) == 10000:
+            conn.executemany('INSERT INTO complaints (id, user_id, assigned_department, category, description, '
+                             'address, status, priority, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             batch)
+            batch = []
+    if batch:
+        conn.executemany('INSERT INTO complaints (id, user_id, assigned_department, category, description, '
+                         'address, status, priority, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         batch)
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+
+def measure(db_path, coded, repeats):
+    """Return file size, per-index sizes and query timings for one database"""
+    conn = sqlite3.connect(db_path)
+    sizes = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat "
+                              "WHERE name LIKE 'idx_%' OR name = 'complaints' GROUP BY name").fetchall())
+
+    def literal(kind, value):
+        return str(VOCABULARIES[kind][value]) if coded else f"'{value}'"
+
+    params = {
+        'department': literal('department', 'roads'),
+        'submitted': literal('status', 'submitted'),
+        'in_progress': literal('status', 'in_progress'),
+        'category': literal('category', 'garbage'),
+        'priority': literal('priority', 'high'),
+    }
+    timings = {}
+    for name, sql in QUERIES.items():
+        sql = sql.format(**params)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            conn.execute(sql).fetchall()
+        timings[name] = (time.perf_counter() - start) / repeats * 1000
+    conn.close()
+    return os.path.getsize(db_path), sizes, timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='civic_codes_')
+    try:
+        legacy_path = os.path.join(workdir, 'legacy.db')
+        coded_path = os.path.join(workdir, 'coded.db')
+
+        engine = create_engine('sqlite:///' + legacy_path)
+        create_legacy_schema(engine)
+        engine.dispose()
+        populate(legacy_path, args.rows)
+        shutil.copy(legacy_path, coded_path)
+
+        engine = create_engine('sqlite:///' + coded_path)
+        start = time.perf_counter()
+        migrate_database(engine, batch_size=20000, log=lambda message: None)
+        migration_seconds = time.perf_counter() - start
+        engine.dispose()
+        conn = sqlite3.connect(coded_path)
+        conn.execute('VACUUM')
+        conn.close()
+
+        before = measure(legacy_path, False, args.repeats)
+        after = measure(coded_path, True, args.repeats)
+
+        print(f'{args.rows} complaints, migration took {migration_seconds:.1f}s')
+        print(f"{'':<26}{'VARCHAR':>12}{'coded':>12}")
+        print(f"{'database file (KB)':<26}{before[0] / 1024:>12.0f}{after[0] / 1024:>12.0f}")
+        for name in sorted(before[1]):
+            print(f"{name + ' (KB)':<26}{before[1][name] / 1024:>12.0f}{after[1].get(name, 0) / 1024:>12.0f}")
+        for name in QUERIES:
+            print(f"{name + ' (ms)':<26}{before[2][name]:>12.2f}{after[2][name]:>12.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Concurrent read/write throughput of the SQLite database, default vs production profile.
+
+Simulates several gunicorn workers (one process each) hitting the same
+database file: readers run dashboard-style COUNT queries while writers
+insert complaints with their initial status update.
+
+    python -m benchmarks.db_concurrency --readers 6 --writers 2 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import OperationalError
+
+from config import ProductionConfig, production_engine_options
+from models import db, User, Complaint, StatusUpdate, install_sqlite_pragmas
+
+CATEGORIES = ['potholes', 'streetlight', 'garbage', 'water_supply', 'drainage', 'other']
+DEPARTMENTS = ['roads', 'roads', 'sanitation', 'water', 'water', 'general']
+STATUSES = ['submitted', 'in_progress', 'resolved', 'rejected']
+
+def make_engine(db_path, profile):
+    """Create an engine for the given profile ('default' or 'production')"""
+    uri = 'sqlite:///' + db_path
+    if profile == 'production':
+        engine = create_engine(uri, **production_engine_options(uri))
+        install_sqlite_pragmas(engine, ProductionConfig.SQLITE_PRAGMAS)
+    else:
+        engine = create_engine(uri)
+    return engine
+
+def seed_database(db_path, profile, rows):
+    """Create the schema and a starting set of complaints"""
+    engine = make_engine(db_path, profile)
+    db.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{
+            'name': 'Bench Citizen', 'email': 'bench@example.com',
+            'password_hash': 'x', 'role': 'citizen', 'is_active': True, 'created_at': now,
+        }])
+        complaints = []
+        for i in range(rows):
+            index = i % len(CATEGORIES)
+            complaints.append({
+                'user_id': 1, 'category': CATEGORIES[index],
+                'assigned_department': DEPARTMENTS[index],
+                'description': 'Seeded complaint for benchmarking',
+                'address': 'MG Road, Bangalore', 'status': random.choice(STATUSES),
+                'priority': 'medium', 'created_at': now, 'updated_at': now,
+            })
+        conn.execute(Complaint.__table__.insert(), complaints)
+    engine.dispose()
+
+def reader(db_path, profile, deadline, results):
+    """Run dashboard-style read queries until the deadline"""
+    engine = make_engine(db_path, profile)
+    complaints = Complaint.__table__
+    ops = errors = 0
+    while time.time() < deadline:
+        department = random.choice(DEPARTMENTS)
+        try:
+            with engine.connect() as conn:
+                conn.execute(
+                    select(complaints.c.status, func.count())
+                    .where(complaints.c.assigned_department == department)
+                    .group_by(complaints.c.status)
+                ).all()
+                conn.execute(
+                    select(complaints.c.id)
+                    .order_by(complaints.c.created_at.desc()).limit(20)
+                ).all()
+            ops += 1
+        except OperationalError:
+            errors += 1
+    engine.dispose()
+    results.put(('read', ops, errors))
+
+def writer(db_path, profile, deadline, results):
+    """Insert complaints with their initial status update until the deadline"""
+    engine = make_engine(db_path, profile)
+    ops = errors = 0
+    while time.time() < deadline:
+        index = random.randrange(len(CATEGORIES))
+        now = datetime.utcnow()
+        try:
+            with engine.begin() as conn:
+                result = conn.execute(Complaint.__table__.insert().values(
+                    user_id=1, category=CATEGORIES[index],
+                    assigned_department=DEPARTMENTS[index],
+                    description='Benchmark complaint', address='MG Road, Bangalore',
+                    status='submitted', priority='medium', created_at=now, updated_at=now,
+                ))
+                conn.execute(StatusUpdate.__table__.insert().values(
+                    complaint_id=result.inserted_primary_key[0], updated_by=1,
+                    new_status='submitted', timestamp=now,
+                ))
+            ops += 1
+        except OperationalError:
+            errors += 1
+    engine.dispose()
+    results.put(('write', ops, errors))
+
+def run_profile(profile, readers, writers, duration, rows):
+    """Run one benchmark round against a fresh database file"""
+    workdir = tempfile.mkdtemp(prefix='civic_bench_')
+    db_path = os.path.join(workdir, 'bench.db')
+    try:
+        seed_database(db_path, profile, rows)
+
+        results = multiprocessing.Queue()
+        deadline = time.time() + duration
+        processes = [multiprocessing.Process(target=reader, args=(db_path, profile, deadline, results))
+                     for _ in range(readers)]
+        processes += [multiprocessing.Process(target=writer, args=(db_path, profile, deadline, results))
+                      for _ in range(writers)]
+        for process in processes:
+            process.start()
+        totals = {'read': [0, 0], 'write': [0, 0]}
+        for _ in processes:
+            kind, ops, errors = results.get()
+            totals[kind][0] += ops
+            totals[kind][1] += errors
+        for process in processes:
+            process.join()
+
+        return {
+            'profile': profile,
+            'reads_per_sec': totals['read'][0] / duration,
+            'writes_per_sec': totals['write'][0] / duration,
+            'read_errors': totals['read'][1],
+            'write_errors': totals['write'][1],
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=6)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per profile')
+    parser.add_argument('--rows', type=int, default=5000, help='complaints seeded before the run')
+    args = parser.parse_args()
+
+    print(f'{args.readers} readers, {args.writers} writers, {args.duration:.0f}s per profile, '
+          f'{args.rows} seeded complaints')
+    print(f"{'profile':<12}{'reads/s':>10}{'writes/s':>10}{'read errs':>11}{'write errs':>12}")
+    for profile in ('default', 'production'):
+        result = run_profile(profile, args.readers, args.writers, args.duration, args.rows)
+        print(f"{result['profile']:<12}{result['reads_per_sec']:>10.1f}{result['writes_per_sec']:>10.1f}"
+              f"{result['read_errors']:>11}{result['write_errors']:>12}")
+
+if __name__ == '__main__':
+    main()
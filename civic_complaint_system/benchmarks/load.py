@@ -0,0 +1,464 @@
+"""Route latency under concurrent load on a synthetic dataset.
+
+Simulated users log in with their own session and call every page and
+form route of the app, picked by weight for their role, either through the Flask test client or
+over HTTP against a local threaded WSGI server (--server). Each role gets
+its own number of concurrent users. Per route the run reports p50/p95/p99
+latency and SQL queries per request (from the X-SQL-Query-Count header
+added by instrumentation.py) and writes the results as JSON, which
+`compare` diffs between commits:
+
+    python -m benchmarks.load run --complaints 100k --concurrency citizen=4,municipal=2,admin=1,anonymous=2
+    python -m benchmarks.load compare results/before.json results/after.json
+
+The dataset is copied before every run, so write routes don't change it.
+Left out: user deletion and the user edit POST, which would lock simulated
+users out of their accounts; the bulk status form, whose cost is
+update status times the selection; and the API, event streams and the
+operator pages (/metrics, performance, profiles, jobs), which have
+benchmarks or tests of their own.
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import platform
+import random
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from app import create_app
+from codes import encode
+from config import config, Config, ProductionConfig, production_engine_options
+from benchmarks.synthetic import PASSWORD, SIZES, get_dataset, parse_size
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+DEFAULT_CONCURRENCY = 'anonymous=2,citizen=4,municipal=2,admin=1'
+
+# A route that logs out is followed by an unrecorded login
+Route = namedtuple('Route', 'name weight build logs_out', defaults=(False,))
+SimUser = namedtuple('SimUser', 'role email department complaint_ids user_ids', defaults=((),))
+
+def complaint_path(user, rng, suffix=''):
+    return f'/complaints/{rng.choice(user.complaint_ids)}{suffix}'
+
+def new_complaint(user, rng):
+    category = rng.choice(list(Config.CATEGORY_DEPARTMENT_MAP))
+    return 'POST', '/complaints/new', {'category': category, 'priority': rng.choice(['high', 'medium', 'low']),
+                                       'description': 'Benchmark complaint about a local civic issue',
+                                       'address': 'MG Road, Bangalore'}
+
+def register(user, rng):
+    email = f'bench-{rng.getrandbits(64):016x}@example.com'
+    return 'POST', '/register', {'name': 'Benchmark Citizen', 'email': email, 'password': PASSWORD,
+                                 'confirm_password': PASSWORD, 'role': 'citizen'}
+
+def update_status(user, rng):
+    return 'POST', complaint_path(user, rng, '/edit'), {'status': rng.choice(['in_progress', 'resolved']),
+                                                        'note': 'Benchmark status update'}
+
+def admin_complaints(user, rng):
+    status = rng.choice(['submitted', 'in_progress', 'resolved', 'rejected'])
+    department = rng.choice(sorted(set(Config.CATEGORY_DEPARTMENT_MAP.values())))
+    return 'GET', f'/admin/complaints?status={status}&department={department}&category=all', None
+
+def assign_officer(user, rng):
+    return 'POST', complaint_path(user, rng, '/assign'), {'assigned_to': rng.choice(user.user_ids)}
+
+def notify_department(user, rng):
+    return 'POST', f'/admin{complaint_path(user, rng, "/notify_department")}', None
+
+def edit_user_form(user, rng):
+    return 'GET', f'/admin/users/{rng.choice(user.user_ids)}/edit', None
+
+def report_export(export_format):
+    def build(user, rng):
+        start = (datetime.utcnow() - timedelta(days=7)).strftime('%Y-%m-%d')
+        return 'GET', f'/admin/reports?start_date={start}&export={export_format}', None
+    return build
+
+def get(path):
+    return lambda user, rng: ('GET', path, None)
+
+# Routes each role calls, with relative weights
+ROUTES = {
+    'anonymous': [
+        Route('home', 3, get('/')),
+        Route('about', 1, get('/about')),
+        Route('contact', 1, get('/contact')),
+        Route('help', 1, get('/help')),
+        Route('login form', 1, get('/login')),
+        Route('register form', 1, get('/register')),
+        Route('register', 1, register),
+    ],
+    'citizen': [
+        Route('citizen dashboard', 5, get('/complaints/citizen/dashboard')),
+        Route('citizen view complaint', 4, lambda user, rng: ('GET', complaint_path(user, rng), None)),
+        Route('complaint form', 1, get('/complaints/new')),
+        Route('submit complaint', 1, new_complaint),
+        Route('dashboard redirect', 1, get('/dashboard')),
+        Route('logout', 1, get('/logout'), logs_out=True),
+    ],
+    'municipal': [
+        Route('municipal dashboard', 5, get('/complaints/municipal/dashboard')),
+        Route('officer view complaint', 3, lambda user, rng: ('GET', complaint_path(user, rng), None)),
+        Route('edit form', 1, lambda user, rng: ('GET', complaint_path(user, rng, '/edit'), None)),
+        Route('update status', 1, update_status),
+        Route('dashboard redirect', 1, get('/dashboard')),
+        Route('logout', 1, get('/logout'), logs_out=True),
+    ],
+    'admin': [
+        Route('admin dashboard', 3, get('/admin/dashboard')),
+        Route('all complaints filtered', 3, admin_complaints),
+        Route('admin view complaint', 2, lambda user, rng: ('GET', complaint_path(user, rng), None)),
+        Route('reports', 2, get('/admin/reports')),
+        Route('report csv export', 1, report_export('csv')),
+        Route('report excel export', 1, report_export('excel')),
+        Route('assign officer', 1, assign_officer),
+        Route('notify department', 1, notify_department),
+        Route('users', 1, get('/admin/users')),
+        Route('edit user form', 1, edit_user_form),
+        Route('dashboard redirect', 1, get('/dashboard')),
+        Route('logout', 1, get('/logout'), logs_out=True),
+    ],
+}
+
+class ClientSession:
+    """In-process requests through the Flask test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.get_data()
+        return response.status_code, response.headers
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class HttpSession:
+    """Requests over HTTP with a cookie jar; redirects are returned, not followed"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data, doseq=True).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(request, timeout=300) as response:
+                response.read()
+                return response.status, response.headers
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers
+
+def parse_concurrency(value):
+    """'citizen=4,admin=1' -> {'citizen': 4, 'admin': 1}"""
+    concurrency = {}
+    for part in filter(None, value.split(',')):
+        role, _, count = part.partition('=')
+        if role not in ROUTES:
+            raise argparse.ArgumentTypeError(f'Unknown role {role!r}; choose from {", ".join(ROUTES)}')
+        concurrency[role] = int(count)
+    return concurrency
+
+def pick_users(db_path, concurrency, rng):
+    """Choose the accounts and sample complaint ids each simulated user works with"""
+    conn = sqlite3.connect(db_path)
+    max_id = conn.execute('SELECT MAX(id) FROM complaints').fetchone()[0] or 0
+    users = []
+
+    # Owners of random complaints, so every simulated citizen has complaints to open
+    citizens = []
+    for _ in range(100 * concurrency.get('citizen', 0) if max_id else 0):
+        if len(citizens) == concurrency['citizen']:
+            break
+        row = conn.execute('SELECT u.email FROM complaints c JOIN users u ON u.id = c.user_id WHERE c.id = ?',
+                           (rng.randrange(1, max_id + 1),)).fetchone()
+        if row and row[0] not in citizens:
+            citizens.append(row[0])
+    for email in citizens:
+        ids = [row[0] for row in conn.execute(
+            'SELECT c.id FROM complaints c JOIN users u ON u.id = c.user_id WHERE u.email = ? LIMIT 500', (email,))]
+        users.append(SimUser('citizen', email, None, ids))
+
+    officers = conn.execute('SELECT email, department FROM users WHERE role = ? ORDER BY id',
+                            (encode('role', 'municipal'),)).fetchall()
+    rng.shuffle(officers)
+    for i in range(concurrency.get('municipal', 0)):
+        email, department = officers[i % len(officers)]
+        ids = [row[0] for row in conn.execute(
+            'SELECT id FROM complaints WHERE assigned_department = ? AND id >= ? LIMIT 500',
+            (encode('department', department), rng.randrange(1, max(2, max_id // 2))))]
+        users.append(SimUser('municipal', email, department, ids))
+
+    admin = conn.execute('SELECT email FROM users WHERE role = ? LIMIT 1', (encode('role', 'admin'),)).fetchone()[0]
+    officer_ids = [row[0] for row in conn.execute('SELECT id FROM users WHERE role = ?',
+                                                  (encode('role', 'municipal'),))]
+    for _ in range(concurrency.get('admin', 0)):
+        ids = [rng.randrange(1, max_id + 1) for _ in range(500)]
+        # Officers, whom assignments go to and whose accounts the user edit form opens
+        users.append(SimUser('admin', admin, None, ids, officer_ids))
+
+    users += [SimUser('anonymous', None, None, []) for _ in range(concurrency.get('anonymous', 0))]
+    conn.close()
+    return users
+
+def log_in(user, session):
+    status, _ = session.request('POST', '/login', {'email': user.email, 'password': PASSWORD})
+    if status != 302:
+        raise RuntimeError(f'Login failed for {user.email} ({status})')
+
+def simulate_user(user, session, routes, deadline, max_requests, warmup, rng, samples):
+    """Log in, then call weighted random routes until the deadline or request budget"""
+    if user.email:
+        log_in(user, session)
+
+    weights = [route.weight for route in routes]
+    done = 0
+    while time.time() < deadline and (max_requests is None or done < max_requests + warmup):
+        route = rng.choices(routes, weights)[0]
+        method, path, data = route.build(user, rng)
+        started = time.perf_counter()
+        try:
+            status, headers = session.request(method, path, data)
+            queries = headers.get('X-SQL-Query-Count')
+        except Exception:
+            status, queries = 599, None
+        latency_ms = (time.perf_counter() - started) * 1000
+        if done >= warmup:
+            samples.append((route.name, user.role, latency_ms, status, int(queries) if queries else None))
+        if route.logs_out:
+            log_in(user, session)
+        done += 1
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+def summarise(samples, elapsed):
+    """Per-route latency and query statistics"""
+    routes = {}
+    for name, role, latency_ms, status, queries in samples:
+        route = routes.setdefault(name, {'role': role, 'latencies': [], 'queries': [], 'errors': 0})
+        route['latencies'].append(latency_ms)
+        if queries is not None:
+            route['queries'].append(queries)
+        if status >= 400:
+            route['errors'] += 1
+
+    summary = {}
+    for name, route in sorted(routes.items()):
+        latencies = sorted(route['latencies'])
+        queries = route['queries']
+        summary[name] = {
+            'role': route['role'],
+            'requests': len(latencies),
+            'errors': route['errors'],
+            'rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'max_ms': round(latencies[-1], 2),
+            'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'queries_max': max(queries) if queries else None,
+        }
+    return summary
+
+def git_revision():
+    """Current commit and whether the tree has local changes"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+def benchmark_config(db_path, profile, upload_folder):
+    """Register and return the name of a config class pointing at the dataset copy"""
+    uri = 'sqlite:///' + db_path
+    base = ProductionConfig if profile == 'production' else Config
+    attributes = {
+        'SQLALCHEMY_DATABASE_URI': uri,
+        'SQL_INSTRUMENTATION': True,
+        'SQL_STATS_HEADERS': True,
+        'SLOW_QUERY_LOG': None,
+        'METRICS_MULTIPROC_DIR': None,
+        'UPLOAD_FOLDER': upload_folder,
+    }
+    if profile == 'production':
+        attributes['SQLALCHEMY_ENGINE_OPTIONS'] = production_engine_options(uri)
+    config['benchmark'] = type('BenchmarkConfig', (base,), attributes)
+    return 'benchmark'
+
+def run_load(dataset, concurrency, duration=30, max_requests=None, warmup=1, profile='production',
+             server=False, route_filter=None, seed=42, log=print):
+    """Run one load test against a copy of a dataset file and return the results"""
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix='civic_load_')
+    try:
+        db_path = os.path.join(workdir, 'bench.db')
+        shutil.copy(dataset, db_path)
+        app = create_app(benchmark_config(db_path, profile, os.path.join(workdir, 'uploads')))
+
+        http_server = None
+        if server:
+            from werkzeug.serving import make_server
+            http_server = make_server('127.0.0.1', 0, app, threaded=True)
+            threading.Thread(target=http_server.serve_forever, daemon=True).start()
+            base_url = f'http://127.0.0.1:{http_server.server_port}'
+
+        users = pick_users(db_path, concurrency, rng)
+        samples = []
+        threads = []
+        deadline = time.time() + (duration if max_requests is None else 86400)
+        for user in users:
+            routes = [route for route in ROUTES[user.role]
+                      if route_filter is None or re.search(route_filter, route.name)]
+            if not routes:
+                continue
+            session = HttpSession(base_url) if server else ClientSession(app)
+            threads.append(threading.Thread(target=simulate_user, args=(
+                user, session, routes, deadline, max_requests, warmup, random.Random(rng.random()), samples)))
+
+        log(f'{len(threads)} simulated users, {"HTTP server" if server else "test client"}, {profile} profile')
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if http_server is not None:
+            http_server.shutdown()
+        for role in sorted(set(concurrency) - {sample[1] for sample in samples}):
+            if concurrency[role]:
+                log(f'No {role} requests were recorded; their routes may need a longer --duration or fewer --warmup')
+
+        with sqlite3.connect(dataset) as conn:
+            complaints = conn.execute('SELECT COUNT(*) FROM complaints').fetchone()[0]
+        commit, dirty = git_revision()
+        return {
+            'benchmark': 'load',
+            'commit': commit,
+            'dirty': dirty,
+            'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'dataset': {'path': os.path.abspath(dataset), 'complaints': complaints},
+            'profile': profile,
+            'mode': 'server' if server else 'client',
+            'concurrency': concurrency,
+            'elapsed_seconds': round(elapsed, 2),
+            'requests': len(samples),
+            'routes': summarise(samples, elapsed),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def compare_results(baseline, current, threshold=0.2, min_ms=2.0):
+    """Per-route differences; a route regresses if its p95 or query count went up"""
+    rows, regressions = [], []
+    for name in sorted(set(baseline['routes']) & set(current['routes'])):
+        before, after = baseline['routes'][name], current['routes'][name]
+        delta_ms = after['p95_ms'] - before['p95_ms']
+        slower = delta_ms > min_ms and delta_ms > threshold * before['p95_ms']
+        more_queries = (before['queries_mean'] is not None and after['queries_mean'] is not None
+                        and after['queries_mean'] > before['queries_mean'] + 0.5)
+        row = {
+            'route': name,
+            'p95_before': before['p95_ms'], 'p95_after': after['p95_ms'],
+            'p95_change': delta_ms / before['p95_ms'] if before['p95_ms'] else 0.0,
+            'queries_before': before['queries_mean'], 'queries_after': after['queries_mean'],
+            'regression': slower or more_queries,
+        }
+        rows.append(row)
+        if row['regression']:
+            regressions.append(name)
+    return rows, regressions
+
+def print_summary(results):
+    print(f"{results['requests']} requests in {results['elapsed_seconds']}s on "
+          f"{results['dataset']['complaints']} complaints (commit {results['commit']})")
+    print(f"{'route':<28}{'reqs':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+    for name, route in results['routes'].items():
+        queries = f"{route['queries_mean']:.1f}" if route['queries_mean'] is not None else '-'
+        print(f"{name:<28}{route['requests']:>7}{route['errors']:>5}{route['p50_ms']:>10.1f}"
+              f"{route['p95_ms']:>10.1f}{route['p99_ms']:>10.1f}{queries:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Run a load test and write JSON results')
+    run.add_argument('--complaints', type=parse_size, default=SIZES['10k'], help='10k, 100k, 1m or a number')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--concurrency', type=parse_concurrency, default=parse_concurrency(DEFAULT_CONCURRENCY),
+                     help=f'Concurrent users per role (default {DEFAULT_CONCURRENCY})')
+    run.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    run.add_argument('--requests', type=int, help='Requests per simulated user instead of a duration')
+    run.add_argument('--warmup', type=int, default=1, help='Unrecorded requests per simulated user')
+    run.add_argument('--profile', choices=['default', 'production'], default='production')
+    run.add_argument('--server', action='store_true', help='Go through a local HTTP server instead of the test client')
+    run.add_argument('--routes', help='Only run routes whose name matches this regex')
+    run.add_argument('--output', help='Results file (default benchmarks/results/load_<size>_<commit>_<time>.json)')
+
+    compare = commands.add_parser('compare', help='Compare two result files')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.2, help='Allowed relative p95 increase')
+    compare.add_argument('--min-ms', type=float, default=2.0, help='Ignore p95 increases smaller than this')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        if baseline['dataset']['complaints'] != current['dataset']['complaints']:
+            print('Warning: the runs used datasets of different sizes')
+        rows, regressions = compare_results(baseline, current, args.threshold, args.min_ms)
+        print(f"{'route':<28}{'p95 before':>12}{'p95 after':>12}{'change':>9}{'queries':>16}")
+        for row in rows:
+            queries = f"{row['queries_before']} -> {row['queries_after']}"
+            flag = '  REGRESSION' if row['regression'] else ''
+            print(f"{row['route']:<28}{row['p95_before']:>12.1f}{row['p95_after']:>12.1f}"
+                  f"{row['p95_change']:>+9.0%}{queries:>16}{flag}")
+        sys.exit(1 if regressions else 0)
+
+    dataset = get_dataset(args.complaints, args.seed)
+    results = run_load(dataset, args.concurrency, args.duration, args.requests, args.warmup, args.profile,
+                       args.server, args.routes, args.seed)
+    print_summary(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load_{results['dataset']['complaints']}_"
+                                         f"{results['commit'] or 'unknown'}_{datetime.utcnow():%Y%m%d%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {output}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Cold-start cost of a worker: import time, create_app time and memory.
+
+Each run boots a fresh interpreter with ``python -X importtime``, imports
+app.py and calls create_app(), the same work a gunicorn worker, a CLI script
+or the test suite does before handling anything. The report shows where the
+import time goes, by top-level package and by module, and the resident set
+size once the app is built.
+
+    python -m benchmarks.startup --repeat 5
+    python -m benchmarks.startup --json > startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON line after the importtime log
+CHILD = """
+import json, os, resource, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app(os.environ.get('STARTUP_CONFIG', 'testing'))
+created = time.perf_counter()
+rss_kb = None
+try:
+    with open('/proc/self/status') as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+except (OSError, StopIteration):
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'rss_kb': rss_kb,
+    'modules': len(sys.modules),
+}))
+"""
+
+def parse_importtime(stderr):
+    """Self and cumulative microseconds per module from -X importtime output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        name = name.strip()
+        # A module imported from several places is only timed the first time
+        modules.setdefault(name, {'self_us': int(self_us), 'cumulative_us': int(cumulative_us)})
+    return modules
+
+def measure_once(config_name='testing'):
+    """Boot the app in a fresh interpreter and return its timings"""
+    env = dict(os.environ, STARTUP_CONFIG=config_name)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], cwd=APP_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    summary = json.loads(result.stdout.strip().splitlines()[-1])
+    summary['import_modules'] = parse_importtime(result.stderr)
+    return summary
+
+def by_package(modules):
+    """Self time summed per top-level package"""
+    packages = {}
+    for name, timing in modules.items():
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + timing['self_us']
+    return packages
+
+def measure(repeat=3, config_name='testing'):
+    """Median of several cold starts, with the module breakdown of the median run"""
+    runs = [measure_once(config_name) for _ in range(repeat)]
+    runs.sort(key=lambda run: run['import_ms'] + run['create_app_ms'])
+    median_run = runs[len(runs) // 2]
+    return {
+        'repeat': repeat,
+        'config': config_name,
+        'import_ms': round(statistics.median(run['import_ms'] for run in runs), 1),
+        'create_app_ms': round(statistics.median(run['create_app_ms'] for run in runs), 1),
+        'total_ms': round(statistics.median(run['import_ms'] + run['create_app_ms'] for run in runs), 1),
+        'rss_kb': int(statistics.median(run['rss_kb'] for run in runs)),
+        'modules': median_run['modules'],
+        'packages_ms': {name: round(us / 1000, 2) for name, us in
+                        sorted(by_package(median_run['import_modules']).items(), key=lambda item: -item[1])},
+        'import_modules': median_run['import_modules'],
+    }
+
+def print_report(report, top=20):
+    print(f"Cold start ({report['config']} config, median of {report['repeat']}): "
+          f"import app {report['import_ms']:.1f}ms, create_app {report['create_app_ms']:.1f}ms, "
+          f"total {report['total_ms']:.1f}ms, RSS {report['rss_kb'] / 1024:.1f}MB, "
+          f"{report['modules']} modules loaded")
+    print(f"\n{'package':<32}{'self ms':>10}")
+    for name, ms in list(report['packages_ms'].items())[:top]:
+        print(f'{name:<32}{ms:>10.2f}')
+    print(f"\n{'module':<48}{'self ms':>10}{'cumul. ms':>11}")
+    slowest = sorted(report['import_modules'].items(), key=lambda item: -item[1]['cumulative_us'])
+    for name, timing in slowest[:top]:
+        print(f"{name:<48}{timing['self_us'] / 1000:>10.2f}{timing['cumulative_us'] / 1000:>11.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='cold starts to take the median of')
+    parser.add_argument('--config', default='testing', help='config name passed to create_app')
+    parser.add_argument('--top', type=int, default=20, help='rows per table')
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    args = parser.parse_args()
+
+    report = measure(args.repeat, args.config)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args.top)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""Synthetic complaint datasets for load benchmarks.
+
+Complaints follow the mix of add_30_complaints.py (same categories,
+departments, priorities, descriptions and addresses) spread over the past
+year, with more recent complaints than old ones, a weekday peak and
+statuses that depend on age: fresh complaints are still submitted or in
+progress, most older ones are resolved. Every complaint gets the status
+updates the app would have written, and officers are assigned the way the
+auto-assignment does.
+
+Datasets are cached by size and seed, so each one is built only once:
+
+    python -m benchmarks.synthetic --complaints 100000
+"""
+import argparse
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from werkzeug.security import generate_password_hash
+
+from config import Config
+from models import db, User, Complaint, StatusUpdate, install_sqlite_pragmas, rebuild_open_counts
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+SIZES = {'10k': 10000, '100k': 100000, '1m': 1000000}
+PASSWORD = 'Bench123!'
+
+# Descriptions and addresses from add_30_complaints.py
+DESCRIPTIONS = {
+    'potholes': ['Large pothole causing traffic near main road', 'Cracked pavement repaired near school',
+                 'Uneven speed breaker damaging vehicles', 'Request for road widening not approved',
+                 'Damaged divider fixed on main road'],
+    'streetlight': ['Entire street dark due to multiple lights off', 'Faulty streetlight replaced near bus stop',
+                    'Dim light outside community park', 'Complaint about private society light ignored',
+                    'Light remains on during daytime'],
+    'garbage': ['Overflowing bins attracting stray dogs', 'Garbage cleared near market area',
+                'Garbage truck skips scheduled visit', 'Duplicate complaint of garbage delay',
+                'Street sweeping done after complaint'],
+    'water_supply': ['No water supply since two days', 'Leakage from public tap fixed',
+                     'Rusty water reported from old pipes', 'Illegal connection request denied',
+                     'Sudden water pressure drop in building'],
+    'drainage': ['Blocked drain causing road overflow', 'Open manhole near junction covered',
+                 'Poorly maintained drain behind park', 'Complaint about private drain ignored',
+                 'Clogged storm drain cleaned near market'],
+    'other': ['Illegal parking blocking street entrance', 'Stray dogs captured near playground',
+              'Broken bench in community park', 'Construction noise within legal hours',
+              'Unauthorized street banner reported'],
+}
+ADDRESSES = [
+    "MG Road, Bangalore", "Connaught Place, Delhi", "Marine Drive, Mumbai",
+    "Anna Salai, Chennai", "Sector 17, Chandigarh", "Banjara Hills, Hyderabad",
+    "Salt Lake City, Kolkata", "Rajouri Garden, Delhi", "Koramangala, Bangalore",
+    "Andheri West, Mumbai", "T. Nagar, Chennai", "Punjabi Bagh, Delhi",
+    "Gachibowli, Hyderabad", "Salt Lake, Kolkata", "Jayanagar, Bangalore",
+    "Bandra East, Mumbai", "Adyar, Chennai", "Karol Bagh, Delhi",
+    "Jubilee Hills, Hyderabad", "New Town, Kolkata", "Whitefield, Bangalore",
+    "Powai, Mumbai", "Velachery, Chennai", "Dwarka, Delhi",
+    "Hitech City, Hyderabad", "Park Street, Kolkata", "Indiranagar, Bangalore",
+    "Lower Parel, Mumbai", "Nungambakkam, Chennai", "Lajpat Nagar, Delhi"
+]
+
+CATEGORY_WEIGHTS = {'potholes': 22, 'garbage': 22, 'streetlight': 16, 'water_supply': 16, 'drainage': 14, 'other': 10}
+PRIORITY_WEIGHTS = {'high': 30, 'medium': 45, 'low': 25}
+# Relative submissions per weekday, Monday first
+WEEKDAY_WEIGHTS = [1.3, 1.2, 1.1, 1.0, 1.0, 0.7, 0.6]
+# Status mix by age of the complaint in days
+STATUS_BY_AGE = [
+    (2, {'submitted': 70, 'in_progress': 30, 'resolved': 0, 'rejected': 0}),
+    (14, {'submitted': 25, 'in_progress': 40, 'resolved': 28, 'rejected': 7}),
+    (None, {'submitted': 5, 'in_progress': 10, 'resolved': 72, 'rejected': 13}),
+]
+# Median days to resolution by priority
+RESOLUTION_DAYS = {'high': 2, 'medium': 5, 'low': 9}
+
+def dataset_path(complaints, seed):
+    return os.path.join(DATA_DIR, f'complaints_{complaints}_seed{seed}.db')
+
+def weighted(rng, weights):
+    return rng.choices(list(weights), list(weights.values()))[0]
+
+def random_created_at(rng, now):
+    """Timestamp in the past year: growing volume, weekday peak, daytime hours"""
+    while True:
+        # Volume grows over the year, so recent days are more likely
+        age_days = 365 * (1 - math.sqrt(rng.random()))
+        created = now - timedelta(days=age_days)
+        if rng.random() * max(WEEKDAY_WEIGHTS) <= WEEKDAY_WEIGHTS[created.weekday()]:
+            hour = min(23, max(6, int(rng.gauss(13, 4))))
+            created = created.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60), microsecond=0)
+            if created <= now:
+                return created
+
+def status_for_age(rng, age_days):
+    for limit, weights in STATUS_BY_AGE:
+        if limit is None or age_days < limit:
+            return weighted(rng, weights)
+
+def create_users(conn, complaints, password_hash, now):
+    """Admin, officers per department and citizens; returns their ids by role"""
+    departments = sorted(set(Config.CATEGORY_DEPARTMENT_MAP.values()))
+    officers_per_department = max(2, complaints // 20000)
+    citizens = max(50, complaints // 25)
+
+    rows = [{'name': 'Bench Admin', 'email': 'admin@bench.local', 'role': 'admin',
+             'department': 'administration'}]
+    for department in departments:
+        rows += [{'name': f'{department.title()} Officer {i}', 'email': f'{department}{i}@bench.local',
+                  'role': 'municipal', 'department': department} for i in range(1, officers_per_department + 1)]
+    rows += [{'name': f'Citizen {i}', 'email': f'citizen{i}@bench.local', 'role': 'citizen', 'department': None}
+             for i in range(1, citizens + 1)]
+    for row in rows:
+        row.update(password_hash=password_hash, is_active=True, created_at=now - timedelta(days=400))
+    conn.execute(User.__table__.insert(), rows)
+
+    users = User.__table__
+    ids = {'citizen': [], 'admin': [], 'municipal': {}}
+    for user_id, role, department in conn.execute(users.select().with_only_columns(
+            users.c.id, users.c.role, users.c.department)):
+        if role == 'municipal':
+            ids['municipal'].setdefault(department, []).append(user_id)
+        else:
+            ids[role].append(user_id)
+    return ids
+
+def build_dataset(path, complaints, seed=42, chunk_size=20000, log=print):
+    """Write a fresh SQLite dataset with the given number of complaints"""
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+
+    engine = create_engine('sqlite:///' + path)
+    install_sqlite_pragmas(engine, {'journal_mode': 'OFF', 'synchronous': 'OFF', 'cache_size': -262144})
+    db.metadata.create_all(engine)
+    started = time.perf_counter()
+
+    with engine.begin() as conn:
+        # One hash for every account; hashing is deliberately slow
+        users = create_users(conn, complaints, generate_password_hash(PASSWORD), now)
+
+    complaint_id = 0
+    for start in range(0, complaints, chunk_size):
+        complaint_rows, update_rows = [], []
+        for _ in range(min(chunk_size, complaints - start)):
+            complaint_id += 1
+            category = weighted(rng, CATEGORY_WEIGHTS)
+            department = Config.CATEGORY_DEPARTMENT_MAP[category]
+            priority = weighted(rng, PRIORITY_WEIGHTS)
+            created_at = random_created_at(rng, now)
+            age_days = (now - created_at).total_seconds() / 86400
+            status = status_for_age(rng, age_days)
+            citizen = rng.choice(users['citizen'])
+            officer = rng.choice(users['municipal'][department]) if status != 'submitted' else None
+
+            # Work starts within a day or so; closing takes longer for low priority
+            started_at = min(now, created_at + timedelta(hours=rng.expovariate(1 / 20)))
+            closed_at = min(now, started_at + timedelta(days=rng.lognormvariate(math.log(RESOLUTION_DAYS[priority]), 0.8)))
+            updated_at = {'submitted': created_at, 'in_progress': started_at}.get(status, closed_at)
+
+            complaint_rows.append({
+                'id': complaint_id, 'user_id': citizen, 'assigned_department': department,
+                'assigned_officer': officer, 'category': category,
+                'description': rng.choice(DESCRIPTIONS[category]), 'address': rng.choice(ADDRESSES),
+                'status': status, 'priority': priority,
+                'resolution_notes': 'Work completed by field team' if status == 'resolved' else None,
+                'created_at': created_at, 'updated_at': updated_at,
+                'resolved_at': closed_at if status == 'resolved' else None,
+            })
+            update_rows.append({'complaint_id': complaint_id, 'updated_by': citizen, 'old_status': None,
+                                'new_status': 'submitted', 'timestamp': created_at,
+                                'note': f'Complaint submitted to {department} department'})
+            if status != 'submitted':
+                update_rows.append({'complaint_id': complaint_id, 'updated_by': officer, 'old_status': 'submitted',
+                                    'new_status': 'in_progress', 'timestamp': started_at, 'note': 'Work started'})
+            if status in ('resolved', 'rejected'):
+                update_rows.append({'complaint_id': complaint_id, 'updated_by': officer, 'old_status': 'in_progress',
+                                    'new_status': status, 'timestamp': closed_at, 'note': None})
+
+        with engine.begin() as conn:
+            conn.execute(Complaint.__table__.insert(), complaint_rows)
+            conn.execute(StatusUpdate.__table__.insert(), update_rows)
+        log(f'{complaint_id} complaints written ({time.perf_counter() - started:.0f}s)')
+
+    with engine.begin() as conn:
+        rebuild_open_counts(conn)
+        conn.exec_driver_sql('ANALYZE')
+    engine.dispose()
+    return path
+
+def get_dataset(complaints, seed=42, rebuild=False, log=print):
+    """Path of a cached dataset, building it first if needed"""
+    path = dataset_path(complaints, seed)
+    if rebuild or not os.path.exists(path):
+        log(f'Building dataset with {complaints} complaints at {path}')
+        build_dataset(path, complaints, seed, log=log)
+    return path
+
+def parse_size(value):
+    """Accept 10k/100k/1m or a plain number"""
+    return SIZES.get(value.lower()) or int(value)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--complaints', type=parse_size, default=SIZES['10k'], help='10k, 100k, 1m or a number')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rebuild', action='store_true', help='Regenerate even if a cached copy exists')
+    args = parser.parse_args()
+    print(get_dataset(args.complaints, args.seed, args.rebuild))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,414 @@
+"""High-throughput bulk import of complaints and users from CSV or NDJSON.
+
+Records are streamed from the input file, validated in chunks (optionally
+across a process pool) with the same rules as the web forms, and inserted
+with Core executemany. Each chunk, its initial StatusUpdate rows and the
+import checkpoint are committed in one transaction, so a failed import is
+resumed from the last committed chunk by simply running it again.
+
+    python bulk_import.py complaints city_complaints.csv --workers 4
+    python bulk_import.py users city_users.ndjson --chunk-size 500
+
+Complaint columns: user_email (or user_id), category, description, address,
+landmark, priority, status, created_at, resolved_at, resolution_notes.
+User columns: name, email, role, department, password (or password_hash).
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+from multiprocessing import Pool
+from sqlalchemy import select, func, update, delete
+from werkzeug.security import generate_password_hash
+from models import (db, User, Complaint, StatusUpdate, ImportCheckpoint, get_auto_assignment_department,
+                    add_delta, adjust_open_counts, open_count_key, adjust_hotspot_counts, hotspot_key)
+from routes.auth import validate_email, validate_password
+from routes.complaints import validate_complaint_form
+from reference import get_reference_data
+
+def read_records(path):
+    """Stream records from a CSV (with header row) or NDJSON file"""
+    if path.endswith('.ndjson') or path.endswith('.jsonl'):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    else:
+        with open(path, newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+
+def chunked(iterable, size):
+    """Yield lists of up to size items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def parse_datetime(value):
+    """Parse an ISO date or datetime, returning None for blanks"""
+    if value in (None, ''):
+        return None
+    return datetime.fromisoformat(str(value).strip())
+
+def clean(value):
+    """Strip strings and turn blanks into None"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+# Chunk preparation runs in worker processes, so it only touches the record data
+
+def prepare_complaints(records, reference):
+    """Validate and normalise complaint records, returning (rows, rejects)"""
+    rows, rejects = [], []
+    for record in records:
+        data = {
+            'category': clean(record.get('category')),
+            'description': clean(record.get('description')) or '',
+            'address': clean(record.get('address')) or '',
+            'priority': clean(record.get('priority')) or 'medium',
+        }
+        errors = validate_complaint_form(data, reference)
+
+        status = clean(record.get('status')) or 'submitted'
+        if status not in reference.statuses:
+            errors.append(f'Invalid status {status!r}')
+
+        user_email = (clean(record.get('user_email')) or '').lower() or None
+        user_id = clean(record.get('user_id'))
+        if not user_email and not user_id:
+            errors.append('user_email or user_id is required')
+
+        try:
+            created_at = parse_datetime(record.get('created_at')) or datetime.utcnow()
+            resolved_at = parse_datetime(record.get('resolved_at'))
+        except ValueError as e:
+            errors.append(f'Invalid date: {e}')
+            created_at = resolved_at = None
+
+        if errors:
+            rejects.append({'record': record, 'errors': errors})
+            continue
+
+        if status == 'resolved' and resolved_at is None:
+            resolved_at = created_at
+        rows.append({
+            'user_email': user_email,
+            'user_id': int(user_id) if user_id else None,
+            'category': data['category'],
+            'description': data['description'],
+            'address': data['address'],
+            'landmark': clean(record.get('landmark')),
+            'priority': data['priority'],
+            'status': status,
+            'resolution_notes': clean(record.get('resolution_notes')),
+            'created_at': created_at,
+            'updated_at': resolved_at or created_at,
+            'resolved_at': resolved_at if status == 'resolved' else None,
+        })
+    return rows, rejects
+
+def prepare_users(records, reference):
+    """Validate user records and hash their passwords, returning (rows, rejects)"""
+    rows, rejects = [], []
+    seen = set()
+    for record in records:
+        name = clean(record.get('name')) or ''
+        email = (clean(record.get('email')) or '').lower()
+        role = clean(record.get('role')) or 'citizen'
+        department = clean(record.get('department'))
+        password = record.get('password')
+        password_hash = clean(record.get('password_hash'))
+
+        errors = []
+        if len(name) < 2:
+            errors.append('Name must be at least 2 characters long')
+        if not validate_email(email):
+            errors.append('Please enter a valid email address')
+        elif email in seen:
+            errors.append('Duplicate email in import file')
+        if role not in reference.roles:
+            errors.append('Invalid role selected')
+        if role == 'municipal' and not department:
+            errors.append('Department is required for municipal officers')
+        if role == 'admin' and not department:
+            department = 'administration'
+        if password:
+            valid_password, password_msg = validate_password(password)
+            if not valid_password:
+                errors.append(password_msg)
+        elif not password_hash:
+            errors.append('password or password_hash is required')
+
+        if errors:
+            rejects.append({'record': {k: v for k, v in record.items() if k != 'password'}, 'errors': errors})
+            continue
+
+        seen.add(email)
+        rows.append({
+            'name': name,
+            'email': email,
+            'role': role,
+            'department': department if role in ('municipal', 'admin') else None,
+            'password_hash': password_hash or generate_password_hash(password),
+            'is_active': True,
+            'created_at': datetime.utcnow(),
+        })
+    return rows, rejects
+
+class OfficerBalancer:
+    """Least-loaded officer per department, tracked in memory for the whole import.
+
+    Gives the same choice as find_best_officer_for_assignment without
+    re-counting each officer's workload for every imported row.
+    """
+
+    def __init__(self, conn):
+        users = User.__table__
+        complaints = Complaint.__table__
+        officers = conn.execute(
+            select(users.c.id, users.c.department)
+            .where(users.c.role == 'municipal', users.c.is_active.is_(True))
+        ).all()
+        workload = dict(conn.execute(
+            select(complaints.c.assigned_officer, func.count())
+            .where(complaints.c.status == 'in_progress', complaints.c.assigned_officer.isnot(None))
+            .group_by(complaints.c.assigned_officer)
+        ).all())
+        self.counts = {officer.id: workload.get(officer.id, 0) for officer in officers}
+        self.by_department = {}
+        for officer in officers:
+            self.by_department.setdefault(officer.department, []).append(officer.id)
+
+    def pick(self, department, status):
+        candidates = self.by_department.get(department) or list(self.counts)
+        if not candidates:
+            return None
+        officer_id = min(candidates, key=lambda officer: self.counts[officer])
+        if status == 'in_progress':
+            self.counts[officer_id] += 1
+        return officer_id
+
+class BulkImporter:
+    """Inserts prepared chunks and records progress; runs inside an app context"""
+
+    def __init__(self, kind, source, assign_officers=False):
+        self.kind = kind
+        self.source = source
+        self.assign_officers = assign_officers
+        self.user_ids = {}
+        self.balancer = None
+
+    def load_checkpoint(self):
+        checkpoints = ImportCheckpoint.__table__
+        with db.engine.connect() as conn:
+            return conn.execute(select(checkpoints).where(checkpoints.c.source == self.source)).first()
+
+    def clear_checkpoint(self):
+        checkpoints = ImportCheckpoint.__table__
+        with db.engine.begin() as conn:
+            conn.execute(delete(checkpoints).where(checkpoints.c.source == self.source))
+
+    def insert_chunk(self, rows, rejects, rows_in_chunk):
+        """Insert one prepared chunk and advance the checkpoint in the same transaction"""
+        with db.engine.begin() as conn:
+            if self.kind == 'complaints':
+                rows, rejects = self.insert_complaints(conn, rows, rejects)
+            else:
+                rows, rejects = self.insert_users(conn, rows, rejects)
+            self.advance_checkpoint(conn, rows_in_chunk, len(rows), len(rejects))
+        return len(rows), rejects
+
+    def resolve_users(self, conn, rows, rejects):
+        """Map user_email to user ids with one query per chunk"""
+        users = User.__table__
+        missing = {row['user_email'] for row in rows if row['user_email'] and row['user_email'] not in self.user_ids}
+        if missing:
+            self.user_ids.update(conn.execute(
+                select(users.c.email, users.c.id).where(users.c.email.in_(missing))
+            ).all())
+
+        resolved = []
+        for row in rows:
+            user_id = row.pop('user_id') or self.user_ids.get(row['user_email'])
+            email = row.pop('user_email')
+            if user_id is None:
+                rejects.append({'record': {**row, 'user_email': email}, 'errors': [f'Unknown user {email!r}']})
+                continue
+            row['user_id'] = user_id
+            resolved.append(row)
+        return resolved, rejects
+
+    def insert_complaints(self, conn, rows, rejects):
+        rows, rejects = self.resolve_users(conn, rows, rejects)
+        if not rows:
+            return rows, rejects
+
+        if self.assign_officers and self.balancer is None:
+            self.balancer = OfficerBalancer(conn)
+        for row in rows:
+            row['assigned_department'] = get_auto_assignment_department(row['category'])
+            row['assigned_officer'] = (self.balancer.pick(row['assigned_department'], row['status'])
+                                       if self.balancer else None)
+
+        complaints = Complaint.__table__
+        ids = conn.execute(
+            complaints.insert().returning(complaints.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+        # Timeline: the submission, plus the transition to the imported status
+        updates = []
+        for complaint_id, row in zip(ids, rows):
+            updates.append({
+                'complaint_id': complaint_id, 'updated_by': row['user_id'], 'old_status': None,
+                'new_status': 'submitted', 'timestamp': row['created_at'],
+                'note': f"Imported complaint submitted to {row['assigned_department']} department",
+            })
+            if row['status'] != 'submitted':
+                updates.append({
+                    'complaint_id': complaint_id, 'updated_by': row['user_id'], 'old_status': 'submitted',
+                    'new_status': row['status'], 'timestamp': row['updated_at'],
+                    'note': row['resolution_notes'] or 'Status imported from historical data',
+                })
+        conn.execute(StatusUpdate.__table__.insert(), updates)
+
+        deltas = {}
+        for row in rows:
+            add_delta(deltas, open_count_key(row['assigned_department'], row['status'],
+                                             row['assigned_officer'], row['created_at']), 1)
+        adjust_open_counts(conn, deltas)
+
+        deltas = {}
+        localities = {}
+        for complaint_id, row in zip(ids, rows):
+            key = hotspot_key(row['address'], row['category'], row['created_at'])
+            add_delta(deltas, key, 1)
+            localities[complaint_id] = key[0]
+        adjust_hotspot_counts(conn, deltas, localities)
+        return rows, rejects
+
+    def insert_users(self, conn, rows, rejects):
+        users = User.__table__
+        emails = [row['email'] for row in rows]
+        existing = set(conn.execute(select(users.c.email).where(users.c.email.in_(emails))).scalars())
+        if existing:
+            rejects.extend({'record': {'email': row['email'], 'name': row['name']}, 'errors': ['Email already registered']}
+                           for row in rows if row['email'] in existing)
+            rows = [row for row in rows if row['email'] not in existing]
+        if rows:
+            conn.execute(users.insert(), rows)
+        return rows, rejects
+
+    def advance_checkpoint(self, conn, rows_in_chunk, inserted, rejected, completed=False):
+        checkpoints = ImportCheckpoint.__table__
+        result = conn.execute(
+            update(checkpoints).where(checkpoints.c.source == self.source).values(
+                rows_done=checkpoints.c.rows_done + rows_in_chunk,
+                inserted=checkpoints.c.inserted + inserted,
+                rejected=checkpoints.c.rejected + rejected,
+                completed=completed,
+                updated_at=datetime.utcnow(),
+            )
+        )
+        if not result.rowcount:
+            conn.execute(checkpoints.insert().values(
+                source=self.source, rows_done=rows_in_chunk, inserted=inserted,
+                rejected=rejected, completed=completed, updated_at=datetime.utcnow(),
+            ))
+
+    def mark_completed(self):
+        with db.engine.begin() as conn:
+            self.advance_checkpoint(conn, 0, 0, 0, completed=True)
+
+def run_import(kind, path, chunk_size=1000, workers=0, assign_officers=False,
+               restart=False, rejects_path=None, log=print):
+    """Import a file; must be called inside an app context. Returns a stats dict."""
+    source = f'{kind}:{os.path.abspath(path)}'
+    importer = BulkImporter(kind, source, assign_officers)
+
+    checkpoint = importer.load_checkpoint()
+    if checkpoint and restart:
+        importer.clear_checkpoint()
+        checkpoint = None
+    if checkpoint and checkpoint.completed:
+        log(f'{path} was already imported ({checkpoint.inserted} rows); use --restart to import it again')
+        return {'inserted': 0, 'rejected': 0, 'rows': 0, 'seconds': 0.0, 'skipped': checkpoint.rows_done}
+
+    skip = checkpoint.rows_done if checkpoint else 0
+    if skip:
+        log(f'Resuming {path} after {skip} rows')
+
+    records = itertools.islice(read_records(path), skip, None)
+    chunks = chunked(records, chunk_size)
+    rejects_path = rejects_path or path + '.rejects.ndjson'
+
+    stats = {'inserted': 0, 'rejected': 0, 'rows': 0, 'skipped': skip}
+    started = time.perf_counter()
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        # Workers validate/hash ahead while this process inserts; imap keeps file order
+        # Workers have no app context, so they get the reference data along with each chunk
+        reference = get_reference_data()
+        prepared = pool.imap(prepare_chunk, ((kind, chunk, reference) for chunk in chunks)) if pool \
+            else (prepare_chunk((kind, chunk, reference)) for chunk in chunks)
+        with open(rejects_path, 'a', encoding='utf-8') as rejects_file:
+            for rows, rejects, rows_in_chunk in prepared:
+                inserted, rejects = importer.insert_chunk(rows, rejects, rows_in_chunk)
+                for reject in rejects:
+                    rejects_file.write(json.dumps(reject, default=str) + '\n')
+
+                stats['rows'] += rows_in_chunk
+                stats['inserted'] += inserted
+                stats['rejected'] += len(rejects)
+                elapsed = time.perf_counter() - started
+                log(f"{skip + stats['rows']} rows read, {stats['inserted']} inserted, "
+                    f"{stats['rejected']} rejected, {stats['rows'] / elapsed:.0f} rows/s")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    importer.mark_completed()
+    stats['seconds'] = time.perf_counter() - started
+    if not stats['rejected'] and os.path.exists(rejects_path) and not os.path.getsize(rejects_path):
+        os.remove(rejects_path)
+    return stats
+
+def prepare_chunk(job):
+    """Pool entry point: validate one chunk of records"""
+    kind, records, reference = job
+    prepare = prepare_complaints if kind == 'complaints' else prepare_users
+    rows, rejects = prepare(records, reference)
+    return rows, rejects, len(records)
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import complaints or users from CSV/NDJSON')
+    parser.add_argument('kind', choices=['complaints', 'users'])
+    parser.add_argument('path', help='.csv file with a header row, or .ndjson/.jsonl')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='rows per transaction')
+    parser.add_argument('--workers', type=int, default=0, help='processes used for parsing and validation')
+    parser.add_argument('--assign-officers', action='store_true',
+                        help='assign each complaint to the least-loaded officer of its department')
+    parser.add_argument('--restart', action='store_true', help='ignore any checkpoint and import from the start')
+    parser.add_argument('--rejects', help='where to write rejected rows (default: <path>.rejects.ndjson)')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        stats = run_import(args.kind, args.path, args.chunk_size, args.workers,
+                           args.assign_officers, args.restart, args.rejects)
+    if stats['seconds']:
+        print(f"Imported {stats['inserted']} {args.kind} ({stats['rejected']} rejected) in "
+              f"{stats['seconds']:.1f}s, {stats['rows'] / stats['seconds']:.0f} rows/s")
+
+if __name__ == '__main__':
+    main()
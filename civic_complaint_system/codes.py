@@ -0,0 +1,86 @@
+"""Small-integer encodings for low-cardinality string columns.
+
+``status``, ``priority``, ``category``, ``assigned_department`` and
+``User.role`` are stored as SMALLINT codes instead of VARCHARs. The
+``CodedString`` column type translates at the database boundary, so models,
+filters and templates keep working with the familiar string values.
+
+Codes are part of the on-disk format: never renumber an existing value,
+only append new ones.
+"""
+from sqlalchemy import SmallInteger
+from sqlalchemy.types import TypeDecorator
+
+VOCABULARIES = {
+    'status': {'submitted': 1, 'in_progress': 2, 'resolved': 3, 'rejected': 4},
+    # Ordered so that ORDER BY priority DESC lists high priority first
+    'priority': {'low': 1, 'medium': 2, 'high': 3},
+    'category': {'potholes': 1, 'streetlight': 2, 'garbage': 3, 'water_supply': 4, 'drainage': 5, 'other': 6},
+    'department': {'roads': 1, 'water': 2, 'sanitation': 3, 'general': 4, 'administration': 5},
+    'role': {'citizen': 1, 'municipal': 2, 'admin': 3},
+}
+
+# Reverse lookup tables, code -> value
+_DECODE = {kind: {code: value for value, code in values.items()} for kind, values in VOCABULARIES.items()}
+
+# Code used for comparisons against unknown values, matches no stored row
+NO_MATCH = -1
+
+# Called with (kind, code) for a code this process does not know, e.g. a
+# category another worker added since (see reference.py); it registers the
+# code if the value exists
+unknown_code_hook = None
+
+def encode(kind, value):
+    """Return the integer code for a value, raising ValueError if it is unknown"""
+    if value is None:
+        return None
+    try:
+        return VOCABULARIES[kind][value]
+    except KeyError:
+        raise ValueError(f'Unknown {kind} value: {value!r}')
+
+def decode(kind, code):
+    """Return the string value for an integer code"""
+    if code is None:
+        return None
+    code = int(code)
+    if code not in _DECODE[kind] and unknown_code_hook is not None:
+        unknown_code_hook(kind, code)
+    return _DECODE[kind][code]
+
+def register_value(kind, value, code=None):
+    """Add a value to a vocabulary at runtime, returning its code"""
+    values = VOCABULARIES[kind]
+    if value in values:
+        return values[value]
+    if code is None:
+        code = max(values.values(), default=0) + 1
+    elif code in _DECODE[kind]:
+        raise ValueError(f'{kind} code {code} is already used by {_DECODE[kind][code]!r}')
+    values[value] = code
+    _DECODE[kind][code] = value
+    return code
+
+class CodedString(TypeDecorator):
+    """String column stored as a small integer code from one vocabulary"""
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, kind, strict=True):
+        super().__init__()
+        self.kind = kind
+        self.strict = strict
+
+    def process_bind_param(self, value, dialect):
+        if self.strict:
+            return encode(self.kind, value)
+        # Filters on unknown values (e.g. ?status=bogus) simply match nothing
+        return VOCABULARIES[self.kind].get(value, NO_MATCH) if value is not None else None
+
+    def process_result_value(self, value, dialect):
+        return decode(self.kind, value)
+
+    def coerce_compared_value(self, op, value):
+        # Values written to the table must be known; values compared against it need not be
+        return CodedString(self.kind, strict=False)
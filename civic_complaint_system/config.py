@@ -3,6 +3,35 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+def production_engine_options(database_uri):
+    """Connection pool settings for the production profile, tuned per backend"""
+    options = {
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+
+    if database_uri.startswith('sqlite'):
+        # In-memory databases use a single static connection, nothing to size
+        if database_uri in ('sqlite://', 'sqlite:///:memory:'):
+            return {}
+        # Writers are serialised by the SQLite lock, so a small pool per worker
+        # is enough; the busy timeout makes waiting writers queue instead of failing
+        options.update({
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'connect_args': {'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000},
+        })
+    else:
+        # Server databases (PostgreSQL, MySQL) drop idle connections, so check them on checkout
+        options.update({
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'pool_pre_ping': True,
+        })
+
+    return options
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.abspath('instance/complaints.db')
@@ -10,7 +39,8 @@ class Config:
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'static/uploads'
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 5242880))  # 5MB default
 
-    # Category to Department Mapping for Auto-Assignment
+    # Category to Department Mapping for Auto-Assignment, the initial one: admins
+    # can change it on the Reference Data page
     CATEGORY_DEPARTMENT_MAP = {
         'potholes': 'roads',
         'streetlight': 'roads',
@@ -20,17 +50,190 @@ class Config:
         'other': 'general'
     }
 
+    # Categories, departments and their names are kept in the database and
+    # cached by every worker (see reference.py), which checks for changes made
+    # by other workers every REFERENCE_CHECK_SECONDS; the map above seeds them
+    REFERENCE_CHECK_SECONDS = float(os.environ.get('REFERENCE_CHECK_SECONDS', 5))
+
     # Allowed file extensions for uploads
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+    # Maximum number of complaints changed by one bulk status update
+    BULK_STATUS_UPDATE_LIMIT = int(os.environ.get('BULK_STATUS_UPDATE_LIMIT', 200))
+
+    # Per-request SQL query count/latency instrumentation (see instrumentation.py);
+    # SQL_STATS_HEADERS defaults to on in debug mode only
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', 'true').lower() == 'true'
+    SQL_STATS_WINDOW_SECONDS = int(os.environ.get('SQL_STATS_WINDOW_SECONDS', 3600))
+    SQL_STATS_HEADERS = None
+
+    # Statements slower than this are logged with their query plan (0 disables)
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG') or os.path.abspath('instance/slow_queries.log')
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.environ.get('SLOW_QUERY_LOG_MAX_BYTES', 5242880))
+    SLOW_QUERY_LOG_BACKUPS = int(os.environ.get('SLOW_QUERY_LOG_BACKUPS', 3))
+
+    # Prometheus metrics at /metrics (see metrics.py); scrapes need
+    # "Authorization: Bearer <METRICS_TOKEN>" when a token is set. With
+    # METRICS_REQUIRE_TOKEN (production), no token means no scrapes at all
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_REQUIRE_TOKEN = os.environ.get('METRICS_REQUIRE_TOKEN', 'false').lower() == 'true'
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+    METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+
+    # On-demand request profiling (see profiling.py): ?_profile=1 for admins,
+    # or an X-Profile-Token header; profiles are kept in PROFILE_DIR
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'true').lower() == 'true'
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.abspath('instance/profiles')
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))
+    PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', 3600))
+
+    # JSON API at /api/v1 (see routes/api.py): bearer token lifetime and page sizes
+    API_TOKEN_MAX_AGE = int(os.environ.get('API_TOKEN_MAX_AGE', 30 * 24 * 3600))
+    API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+    API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 200))
+
+    # Live status updates over Server-Sent Events (see events.py); each open
+    # stream holds a worker thread, so EVENTS_MAX_CONNECTIONS is per worker and
+    # defaults to half of WEB_THREADS (gunicorn --threads), leaving the other
+    # half for ordinary requests
+    EVENTS_ENABLED = os.environ.get('EVENTS_ENABLED', 'true').lower() == 'true'
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', 32))
+    EVENTS_MAX_CONNECTIONS = int(os.environ.get('EVENTS_MAX_CONNECTIONS', WEB_THREADS // 2))
+    EVENTS_HEARTBEAT_SECONDS = float(os.environ.get('EVENTS_HEARTBEAT_SECONDS', 15))
+    EVENTS_POLL_SECONDS = float(os.environ.get('EVENTS_POLL_SECONDS', 2))
+    EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+    EVENTS_REPLAY_LIMIT = int(os.environ.get('EVENTS_REPLAY_LIMIT', 500))
+    EVENTS_RETRY_MS = int(os.environ.get('EVENTS_RETRY_MS', 5000))
+
+    # Department notifications (see notifications.py): queued in the outbox and
+    # delivered in digests by dispatch_notifications.py through NOTIFY_CHANNEL
+    # ('file', 'smtp' or 'webhook')
+    NOTIFY_CHANNEL = os.environ.get('NOTIFY_CHANNEL', 'file')
+    NOTIFY_FILE_PATH = os.environ.get('NOTIFY_FILE_PATH') or os.path.abspath('instance/notifications.ndjson')
+    NOTIFY_SMTP_HOST = os.environ.get('NOTIFY_SMTP_HOST', 'localhost')
+    NOTIFY_SMTP_PORT = int(os.environ.get('NOTIFY_SMTP_PORT', 1025))
+    NOTIFY_MAIL_FROM = os.environ.get('NOTIFY_MAIL_FROM', 'notifications@civic-complaints.local')
+    NOTIFY_WEBHOOK_URL = os.environ.get('NOTIFY_WEBHOOK_URL', 'http://localhost:8025/notifications')
+    NOTIFY_TIMEOUT = float(os.environ.get('NOTIFY_TIMEOUT', 10))
+    NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE', 500))
+    NOTIFY_MAX_ATTEMPTS = int(os.environ.get('NOTIFY_MAX_ATTEMPTS', 8))
+    NOTIFY_RETRY_BASE_SECONDS = float(os.environ.get('NOTIFY_RETRY_BASE_SECONDS', 30))
+    NOTIFY_RETRY_MAX_SECONDS = float(os.environ.get('NOTIFY_RETRY_MAX_SECONDS', 3600))
+    NOTIFY_LEASE_SECONDS = int(os.environ.get('NOTIFY_LEASE_SECONDS', 300))
+    NOTIFY_DISPATCH_INTERVAL = float(os.environ.get('NOTIFY_DISPATCH_INTERVAL', 10))
+
+    # Background jobs (see jobs.py), run by run_jobs.py workers; a job not
+    # finished within its visibility timeout is taken by another worker.
+    # With BACKGROUND_EXPORTS, report downloads are built by a worker
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 4))
+    JOBS_MODE = os.environ.get('JOBS_MODE', 'thread')
+    JOBS_POLL_SECONDS = float(os.environ.get('JOBS_POLL_SECONDS', 1))
+    JOBS_VISIBILITY_TIMEOUT = int(os.environ.get('JOBS_VISIBILITY_TIMEOUT', 300))
+    JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 5))
+    JOBS_RETRY_BASE_SECONDS = float(os.environ.get('JOBS_RETRY_BASE_SECONDS', 10))
+    JOBS_RETRY_MAX_SECONDS = float(os.environ.get('JOBS_RETRY_MAX_SECONDS', 600))
+    BACKGROUND_EXPORTS = os.environ.get('BACKGROUND_EXPORTS', 'false').lower() == 'true'
+    EXPORT_DIR = os.environ.get('EXPORT_DIR') or os.path.abspath('instance/exports')
+
+    # Compiled templates shared by all workers (see templating.py); with
+    # TEMPLATE_WARMUP every template is loaded before the worker serves traffic
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR') or os.path.abspath('instance/jinja_cache')
+    TEMPLATE_WARMUP = os.environ.get('TEMPLATE_WARMUP', 'false').lower() == 'true'
+
+    # Rendered report results kept per worker (see report_cache.py); 0 disables
+    REPORT_CACHE_ENTRIES = int(os.environ.get('REPORT_CACHE_ENTRIES', 32))
+    REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+    # Standard reports generated nightly at SNAPSHOT_HOUR UTC (see snapshots.py),
+    # kept until SNAPSHOT_KEEP_DAYS after the end of their period
+    SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR') or os.path.abspath('instance/snapshots')
+    SNAPSHOT_HOUR = int(os.environ.get('SNAPSHOT_HOUR', 2))
+    SNAPSHOT_KEEP_DAYS = int(os.environ.get('SNAPSHOT_KEEP_DAYS', 100))
+
+    # Complaint intake (see intake.py): 'direct' files each submission in its
+    # own transaction; 'queued' acknowledges once it is on the local queue at
+    # INTAKE_PATH and intake.py files up to INTAKE_BATCH_SIZE per commit,
+    # waiting at most INTAKE_MAX_DELAY_MS for a group to fill
+    INTAKE_MODE = os.environ.get('INTAKE_MODE', 'direct')
+    INTAKE_PATH = os.environ.get('INTAKE_PATH') or os.path.abspath('instance/intake.db')
+    INTAKE_BATCH_SIZE = int(os.environ.get('INTAKE_BATCH_SIZE', 200))
+    INTAKE_MAX_DELAY_MS = float(os.environ.get('INTAKE_MAX_DELAY_MS', 50))
+
+    # Resolution targets per priority for the SLA report (see sla.py); each
+    # worker rebuilds its statistics from scratch every SLA_REBUILD_SECONDS
+    SLA_TARGET_HOURS = {
+        'high': float(os.environ.get('SLA_HIGH_HOURS', 48)),
+        'medium': float(os.environ.get('SLA_MEDIUM_HOURS', 168)),
+        'low': float(os.environ.get('SLA_LOW_HOURS', 336)),
+    }
+    SLA_REBUILD_SECONDS = int(os.environ.get('SLA_REBUILD_SECONDS', 3600))
+
+    # Hotspots page (see hotspots.py): rankings shown, and how long each
+    # worker reuses a ranking before summing the buckets again
+    HOTSPOT_TOP_K = int(os.environ.get('HOTSPOT_TOP_K', 20))
+    HOTSPOT_CACHE_SECONDS = float(os.environ.get('HOTSPOT_CACHE_SECONDS', 60))
+
+    # Spike alerts (see anomalies.py): each category's hourly submissions per
+    # locality against their running average (ALPHA is the weight of the last hour)
+    ANOMALY_DETECTION = os.environ.get('ANOMALY_DETECTION', 'true').lower() == 'true'
+    ANOMALY_ALPHA = float(os.environ.get('ANOMALY_ALPHA', 0.02))
+    ANOMALY_Z_THRESHOLD = float(os.environ.get('ANOMALY_Z_THRESHOLD', 4))
+    ANOMALY_MIN_COUNT = int(os.environ.get('ANOMALY_MIN_COUNT', 5))
+
+    # Complaint volume forecasts on the admin dashboard (see forecasting.py),
+    # refitted nightly from FORECAST_HISTORY_DAYS of history in FORECAST_WORKERS processes
+    FORECAST_HORIZON_DAYS = int(os.environ.get('FORECAST_HORIZON_DAYS', 7))
+    FORECAST_HISTORY_DAYS = int(os.environ.get('FORECAST_HISTORY_DAYS', 730))
+    FORECAST_WORKERS = int(os.environ.get('FORECAST_WORKERS', 2))
+
+    # Read models projected from the status update log (see projections.py):
+    # events per committed batch, per batch when rebuilding, and how long a gap
+    # in the log ids is waited for before it is skipped (not on SQLite)
+    PROJECTION_BATCH_SIZE = int(os.environ.get('PROJECTION_BATCH_SIZE', 1000))
+    PROJECTION_REBUILD_BATCH_SIZE = int(os.environ.get('PROJECTION_REBUILD_BATCH_SIZE', 20000))
+    PROJECTION_GAP_SECONDS = float(os.environ.get('PROJECTION_GAP_SECONDS', 5))
+    PROJECTION_POLL_SECONDS = float(os.environ.get('PROJECTION_POLL_SECONDS', 2))
+
+    # Closed complaints older than this are moved to the archive tables
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+
+    # PRAGMA statements run on every new SQLite connection (none by default)
+    SQLITE_PRAGMAS = {}
+
 class DevelopmentConfig(Config):
     DEBUG = True
 
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SLOW_QUERY_LOG = None
+    METRICS_MULTIPROC_DIR = None
+    TEMPLATE_CACHE_DIR = None
+
 class ProductionConfig(Config):
     DEBUG = False
+    METRICS_REQUIRE_TOKEN = os.environ.get('METRICS_REQUIRE_TOKEN', 'true').lower() == 'true'
+    TEMPLATE_WARMUP = os.environ.get('TEMPLATE_WARMUP', 'true').lower() == 'true'
+
+    # WAL lets readers proceed while a writer holds the lock; NORMAL sync is
+    # durable in WAL mode, and busy_timeout makes concurrent writers wait
+    # instead of raising "database is locked"
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 65536)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_BYTES', 268435456)),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'temp_store': 'MEMORY',
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = production_engine_options(Config.SQLALCHEMY_DATABASE_URI)
 
 config = {
     'development': DevelopmentConfig,
+    'testing': TestingConfig,
     'production': ProductionConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file
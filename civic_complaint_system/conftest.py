@@ -0,0 +1,62 @@
+import pytest
+from app import create_app
+from models import db, User, Complaint, StatusUpdate
+
+# Skip the script-style checks that need a browser or a running server
+collect_ignore = ['test_functional.py', 'test_sqlalchemy.py', 'test_sqlalchemy2.py', 'test_sqlalchemy3.py']
+
+@pytest.fixture
+def app():
+    """Flask app on an in-memory database with one user per role"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+
+        admin = User(name='Admin User', email='admin@example.com', role='admin', department='administration')
+        admin.set_password('Admin123!')
+        roads = User(name='Roads Officer', email='roads@example.com', role='municipal', department='roads')
+        roads.set_password('Officer123!')
+        water = User(name='Water Officer', email='water@example.com', role='municipal', department='water')
+        water.set_password('Officer123!')
+        citizen = User(name='Jane Citizen', email='citizen@example.com', role='citizen')
+        citizen.set_password('Citizen123!')
+        db.session.add_all([admin, roads, water, citizen])
+        db.session.commit()
+
+        yield app
+
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def login(client):
+    """Log the test client in as the given user"""
+    def do_login(email, password):
+        return client.post('/login', data={'email': email, 'password': password})
+    return do_login
+
+@pytest.fixture
+def add_complaint(app):
+    """Factory adding a complaint, by default a pothole reported to roads by the test citizen.
+
+    Keyword arguments are Complaint fields overriding those defaults, plus
+    ``email`` for the submitting user, ``submitted=True`` to add the
+    submission to the timeline (dated ``created_at``) and ``commit=False``
+    to leave it in the session.
+    """
+    def add(email='citizen@example.com', submitted=False, commit=True, **fields):
+        user = User.query.filter_by(email=email).first()
+        complaint = Complaint(**{'user_id': user.id, 'category': 'potholes', 'description': 'Pothole on the main road',
+                                 'address': 'MG Road, Bangalore', 'assigned_department': 'roads', **fields})
+        db.session.add(complaint)
+        if submitted:
+            when = {'timestamp': fields['created_at']} if 'created_at' in fields else {}
+            db.session.add(StatusUpdate(complaint=complaint, updated_by=user.id, new_status='submitted', **when))
+        if commit:
+            db.session.commit()
+        return complaint
+    return add
@@ -0,0 +1,35 @@
+import argparse
+import time
+from app import create_app
+from models import db
+from notifications import dispatch_once, outbox_counts
+
+def main():
+    parser = argparse.ArgumentParser(description='Deliver queued department notifications as digests')
+    parser.add_argument('--once', action='store_true', help='run one pass and exit (e.g. from cron)')
+    parser.add_argument('--interval', type=float, default=None,
+                        help='seconds to wait when nothing is due (default: NOTIFY_DISPATCH_INTERVAL)')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='notifications claimed per pass (default: NOTIFY_BATCH_SIZE)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        # Make sure the outbox table exists on databases created before it
+        db.create_all()
+        interval = args.interval if args.interval is not None else app.config['NOTIFY_DISPATCH_INTERVAL']
+
+        while True:
+            stats = dispatch_once(batch_size=args.batch_size)
+            if stats['claimed']:
+                print(f"Sent {stats['sent']} notifications in {stats['digests']} digests, "
+                      f"{stats['retrying']} to retry, {stats['dead']} given up")
+            if args.once:
+                print(f'Outbox: {outbox_counts()}')
+                return
+            # A full batch means more are probably due; keep going
+            if stats['claimed'] < (args.batch_size or app.config['NOTIFY_BATCH_SIZE']):
+                time.sleep(interval)
+
+if __name__ == '__main__':
+    main()
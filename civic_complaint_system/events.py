@@ -0,0 +1,214 @@
+"""Live status updates for Server-Sent Events streams.
+
+Each worker runs one StatusEventBus. Browsers subscribe through the stream
+endpoints in routes/events.py, each with a scope: one complaint, one
+department, one citizen's complaints, or everything (admins).
+
+The bus reads new status_updates rows with a single query and hands every
+row to every matching subscriber, so N open pages cost one query per
+change instead of N polling queries. It queries when a commit in this
+worker wrote status updates (see the session hooks at the bottom), and
+every EVENTS_POLL_SECONDS otherwise, so changes made by other workers or
+scripts are delivered too.
+
+Event ids are status_updates ids. A client that reconnects sends the last
+one it saw as Last-Event-ID, and the stream first replays what it missed
+from the database.
+"""
+import json
+import logging
+import queue
+import threading
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from models import Complaint, StatusUpdate, User
+
+logger = logging.getLogger(__name__)
+
+EVENT_COLUMNS = (
+    StatusUpdate.__table__.c.id,
+    StatusUpdate.__table__.c.complaint_id,
+    StatusUpdate.__table__.c.old_status,
+    StatusUpdate.__table__.c.new_status,
+    StatusUpdate.__table__.c.note,
+    StatusUpdate.__table__.c.timestamp,
+    StatusUpdate.__table__.c.updated_by,
+    User.__table__.c.name.label('updated_by_name'),
+    Complaint.__table__.c.assigned_department.label('department'),
+    Complaint.__table__.c.user_id,
+)
+
+def status_event_query(after_id, complaint_id=None, department=None, user_id=None):
+    """Status updates after ``after_id`` in a scope, oldest first"""
+    updates, complaints, users = StatusUpdate.__table__, Complaint.__table__, User.__table__
+    query = select(*EVENT_COLUMNS)\
+        .select_from(updates.join(complaints, complaints.c.id == updates.c.complaint_id)
+                     .outerjoin(users, users.c.id == updates.c.updated_by))\
+        .where(updates.c.id > after_id)
+    if complaint_id is not None:
+        query = query.where(updates.c.complaint_id == complaint_id)
+    if department is not None:
+        query = query.where(complaints.c.assigned_department == department)
+    if user_id is not None:
+        query = query.where(complaints.c.user_id == user_id)
+    return query.order_by(updates.c.id)
+
+def event_from_row(row):
+    event = dict(row._mapping)
+    if event['timestamp'] is not None:
+        event['timestamp'] = event['timestamp'].isoformat() + 'Z'
+    return event
+
+def format_event(event):
+    """One SSE message"""
+    return f"id: {event['id']}\nevent: status\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+class Subscription:
+    """One open stream: its scope and the queue its events wait in"""
+
+    def __init__(self, complaint_id=None, department=None, user_id=None, last_id=0, queue_size=100):
+        self.complaint_id = complaint_id
+        self.department = department
+        self.user_id = user_id
+        self.last_id = last_id
+        self.overflowed = False
+        self.events = queue.Queue(maxsize=queue_size)
+
+    def matches(self, event):
+        return (self.complaint_id is None or event['complaint_id'] == self.complaint_id) \
+            and (self.department is None or event['department'] == self.department) \
+            and (self.user_id is None or event['user_id'] == self.user_id)
+
+    def deliver(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            # A stalled client; its stream ends and it resumes from Last-Event-ID
+            self.overflowed = True
+
+    def next_event(self, timeout):
+        """The next unseen event, or None when ``timeout`` passes without one"""
+        while True:
+            try:
+                event = self.events.get(timeout=timeout)
+            except queue.Empty:
+                return None
+            # Replayed from the database already
+            if event['id'] > self.last_id:
+                self.last_id = event['id']
+                return event
+
+class StatusEventBus:
+    """Fans status updates out to the subscribers of one worker"""
+
+    def __init__(self, engine, max_subscribers=100, poll_seconds=2.0, fetch_limit=1000, queue_size=100):
+        self.engine = engine
+        self.max_subscribers = max_subscribers
+        self.poll_seconds = poll_seconds
+        self.fetch_limit = fetch_limit
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.last_id = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def subscribe(self, **scope):
+        """Register a stream, or return None if the worker is at its limit"""
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            if self.last_id is None:
+                # Start from now; anything older is replayed per stream
+                with self.engine.connect() as conn:
+                    self.last_id = conn.scalar(select(func.max(StatusUpdate.__table__.c.id))) or 0
+            subscription = Subscription(queue_size=self.queue_size, **scope)
+            self.subscribers.add(subscription)
+            if self.thread is None or not self.thread.is_alive():
+                # Started on first use, so it runs in the worker rather than a preforking master
+                self.thread = threading.Thread(target=self.run, name='status-events', daemon=True)
+                self.thread.start()
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+            if not self.subscribers:
+                self.last_id = None
+
+    def notify(self):
+        """New status updates were committed; fetch them without waiting for the next poll"""
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.poll_seconds or None)
+            self.wakeup.clear()
+            try:
+                self.fetch()
+            except Exception:
+                logger.exception('Fetching status events failed')
+
+    def fetch(self):
+        """Read status updates newer than the last one and deliver them"""
+        with self.lock:
+            if not self.subscribers or self.last_id is None:
+                return 0
+            after_id = self.last_id
+        with self.engine.connect() as conn:
+            rows = conn.execute(status_event_query(after_id).limit(self.fetch_limit)).all()
+        if not rows:
+            return 0
+        events = [event_from_row(row) for row in rows]
+        with self.lock:
+            if self.last_id is None:
+                return 0
+            self.last_id = max(self.last_id, events[-1]['id'])
+            subscribers = list(self.subscribers)
+        for event in events:
+            for subscription in subscribers:
+                if subscription.matches(event):
+                    subscription.deliver(event)
+        return len(events)
+
+def get_event_bus():
+    return current_app.extensions.get('status_events')
+
+def init_status_events(app, engine):
+    """Create this app's bus"""
+    if not app.config.get('EVENTS_ENABLED', True):
+        return None
+    bus = StatusEventBus(
+        engine,
+        max_subscribers=app.config['EVENTS_MAX_CONNECTIONS'],
+        poll_seconds=app.config.get('EVENTS_POLL_SECONDS', 2.0),
+        queue_size=app.config.get('EVENTS_QUEUE_SIZE', 100),
+    )
+    app.extensions['status_events'] = bus
+    return bus
+
+# Commits that wrote status updates, through the ORM or a Core insert like
+# bulk_update_status, wake the bus of the app they ran in
+
+@event.listens_for(Session, 'after_flush')
+def note_new_status_updates(session, flush_context):
+    if any(isinstance(instance, StatusUpdate) for instance in session.new):
+        session.info['status_updates_written'] = True
+
+@event.listens_for(Session, 'do_orm_execute')
+def note_status_update_inserts(orm_execute_state):
+    statement = orm_execute_state.statement
+    if orm_execute_state.is_insert and getattr(statement, 'table', None) is StatusUpdate.__table__:
+        orm_execute_state.session.info['status_updates_written'] = True
+
+@event.listens_for(Session, 'after_commit')
+def notify_status_event_bus(session):
+    if session.info.pop('status_updates_written', False) and has_app_context():
+        bus = current_app.extensions.get('status_events')
+        if bus is not None:
+            bus.notify()
+
+@event.listens_for(Session, 'after_rollback')
+def forget_status_updates(session):
+    session.info.pop('status_updates_written', None)
@@ -0,0 +1,206 @@
+"""CSV and Excel exports of the admin reports.
+
+Kept out of routes/admin.py so the export code, and openpyxl in
+particular, is only imported when a report is actually downloaded.
+"""
+import csv
+import io
+import os
+import uuid
+from datetime import datetime
+from flask import make_response
+from sqlalchemy import func
+from models import db, StatusUpdate, ArchivedStatusUpdate
+
+def count_status_updates(complaint):
+    """Count timeline entries for a hot or archived complaint"""
+    update_model = ArchivedStatusUpdate if complaint.is_archived else StatusUpdate
+    return update_model.query.filter_by(complaint_id=complaint.id).count()
+
+def status_update_counts(complaints, chunk_size=500):
+    """Timeline entries of many complaints at once, keyed by (is_archived, id)"""
+    counts = {}
+    for archived, update_model in ((False, StatusUpdate), (True, ArchivedStatusUpdate)):
+        ids = [c.id for c in complaints if c.is_archived == archived]
+        for offset in range(0, len(ids), chunk_size):
+            rows = db.session.query(update_model.complaint_id, func.count(update_model.id))\
+                             .filter(update_model.complaint_id.in_(ids[offset:offset + chunk_size]))\
+                             .group_by(update_model.complaint_id)
+            counts.update(((archived, complaint_id), count) for complaint_id, count in rows)
+    return counts
+
+def generate_csv_report(complaints, update_counts=None):
+    """Generate CSV report for complaints.
+
+    ``update_counts`` from status_update_counts() saves a query per complaint.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+
+    # Write header
+    writer.writerow([
+        'Complaint ID',
+        'Submission Date',
+        'Citizen Name',
+        'Citizen Email',
+        'Category',
+        'Priority',
+        'Address',
+        'Landmark',
+        'Description',
+        'Status',
+        'Assigned Officer',
+        'Department',
+        'Resolution Notes',
+        'Created At',
+        'Updated At',
+        'Resolved At',
+        'Status Updates Count'
+    ])
+
+    # Write data rows
+    for complaint in complaints:
+        # Get status updates count
+        if update_counts is None:
+            updates_count = count_status_updates(complaint)
+        else:
+            updates_count = update_counts.get((complaint.is_archived, complaint.id), 0)
+
+        writer.writerow([
+            complaint.id,
+            complaint.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            complaint.user.name,
+            complaint.user.email,
+            complaint.category,
+            complaint.priority,
+            complaint.address,
+            complaint.landmark or '',
+            complaint.description,
+            complaint.status,
+            complaint.assigned_officer_rel.name if complaint.assigned_officer_rel else 'Unassigned',
+            complaint.assigned_officer_rel.department if complaint.assigned_officer_rel else '',
+            complaint.resolution_notes or '',
+            complaint.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            complaint.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
+            complaint.resolved_at.strftime('%Y-%m-%d %H:%M:%S') if complaint.resolved_at else '',
+            updates_count
+        ])
+
+    # Create response
+    output.seek(0)
+    response = make_response(output.getvalue())
+    response.headers['Content-Type'] = 'text/csv'
+    response.headers['Content-Disposition'] = f'attachment; filename=complaints_report_{datetime.now().strftime("%Y-%m-%d")}.csv'
+
+    return response
+
+def generate_excel_report(complaints, update_counts=None):
+    """Generate Excel report for complaints (see generate_csv_report for ``update_counts``)"""
+    # openpyxl is only needed for this rarely used export, so it is not
+    # imported until the first Excel report is requested
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Complaints Report"
+
+    # Define styles
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+    center_align = Alignment(horizontal="center")
+
+    # Write header
+    headers = [
+        'Complaint ID',
+        'Submission Date',
+        'Citizen Name',
+        'Citizen Email',
+        'Category',
+        'Priority',
+        'Address',
+        'Landmark',
+        'Description',
+        'Status',
+        'Assigned Officer',
+        'Department',
+        'Resolution Notes',
+        'Created At',
+        'Updated At',
+        'Resolved At',
+        'Status Updates Count'
+    ]
+
+    for col_num, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col_num, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = center_align
+
+    # Write data rows
+    for row_num, complaint in enumerate(complaints, 2):
+        # Get status updates count
+        if update_counts is None:
+            updates_count = count_status_updates(complaint)
+        else:
+            updates_count = update_counts.get((complaint.is_archived, complaint.id), 0)
+
+        data = [
+            complaint.id,
+            complaint.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            complaint.user.name,
+            complaint.user.email,
+            complaint.category,
+            complaint.priority,
+            complaint.address,
+            complaint.landmark or '',
+            complaint.description,
+            complaint.status,
+            complaint.assigned_officer_rel.name if complaint.assigned_officer_rel else 'Unassigned',
+            complaint.assigned_officer_rel.department if complaint.assigned_officer_rel else '',
+            complaint.resolution_notes or '',
+            complaint.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            complaint.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
+            complaint.resolved_at.strftime('%Y-%m-%d %H:%M:%S') if complaint.resolved_at else '',
+            updates_count
+        ]
+
+        for col_num, value in enumerate(data, 1):
+            ws.cell(row=row_num, column=col_num, value=value)
+
+    # Auto-adjust column widths
+    for column in ws.columns:
+        max_length = 0
+        column_letter = column[0].column_letter
+        for cell in column:
+            try:
+                if len(str(cell.value)) > max_length:
+                    max_length = len(str(cell.value))
+            except:
+                pass
+        adjusted_width = min(max_length + 2, 50)  # Max width of 50
+        ws.column_dimensions[column_letter].width = adjusted_width
+
+    # Create response
+    output = io.BytesIO()
+    wb.save(output)
+    output.seek(0)
+
+    response = make_response(output.getvalue())
+    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    response.headers['Content-Disposition'] = f'attachment; filename=complaints_report_{datetime.now().strftime("%Y-%m-%d")}.xlsx'
+
+    return response
+
+REPORT_GENERATORS = {'csv': generate_csv_report, 'excel': generate_excel_report}
+
+def write_report(export_format, complaints, directory):
+    """Save a report as a file in ``directory``, for downloads built by a background job"""
+    response = REPORT_GENERATORS[export_format](complaints)
+    download_name = response.headers['Content-Disposition'].split('filename=', 1)[1]
+    filename = f'{uuid.uuid4().hex}_{download_name}'
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, filename), 'wb') as f:
+        f.write(response.get_data())
+    return {'filename': filename, 'download_name': download_name, 'mimetype': response.mimetype,
+            'rows': len(complaints)}
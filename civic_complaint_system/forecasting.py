@@ -0,0 +1,219 @@
+"""Forecasts of new complaints per department and category, for staffing.
+
+Each (department, category) pair gets a daily series of new complaints
+from created_at, archived complaints included. The series is fitted with
+additive Holt-Winters exponential smoothing: a damped level and trend,
+plus a day-of-week seasonal term. The smoothing parameters are picked
+from a small grid by one-step-ahead error. With more than a year of
+history the forecast is also scaled by how much volume changed over the
+same weeks last year, so the start of the monsoon shows up before it
+happens again.
+
+Series are fitted in a process pool (FORECAST_WORKERS) and the results
+replace the complaint_forecasts table, which the admin dashboard reads.
+Run it nightly:
+
+    python forecasting.py
+
+The dashboard also queues a refresh_forecasts background job (see
+jobs.py) the first time it is opened on a day without fresh forecasts.
+"""
+import math
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from multiprocessing import get_context
+from flask import current_app
+from sqlalchemy import func, select, union_all
+from models import db, Complaint, ArchivedComplaint, ComplaintForecast
+
+SEASON_LENGTH = 7
+# Smoothing parameters tried for every series: level, trend, day-of-week
+ALPHAS = (0.05, 0.1, 0.2, 0.4)
+BETAS = (0.0, 0.05)
+GAMMAS = (0.05, 0.15, 0.3)
+DAMPING = 0.9
+# Normal quantile of the 10th/90th percentile: an 80% range around the forecast
+INTERVAL_Z = 1.2816
+# Below this much history a series is forecast by its recent average
+MIN_HISTORY_DAYS = 4 * SEASON_LENGTH
+# Starting worker processes takes over a second; a series fits in about 15ms
+POOL_MIN_SERIES = 100
+
+# Building the series
+
+def parse_day(value):
+    """date() comes back as a string from SQLite and as a date elsewhere"""
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+def daily_series(history_days, today=None):
+    """{(department, category): [complaints per day]} for the ``history_days`` days before today"""
+    today = today or datetime.utcnow().date()
+    start = today - timedelta(days=history_days)
+
+    def counts(model):
+        day = func.date(model.created_at)
+        return (select(model.assigned_department.label('department'), model.category.label('category'),
+                       day.label('day'), func.count().label('complaints'))
+                .where(model.created_at >= start, model.created_at < today)
+                .group_by(model.assigned_department, model.category, day))
+
+    series = {}
+    for department, category, day, complaints in db.session.execute(
+            union_all(counts(Complaint), counts(ArchivedComplaint))):
+        values = series.setdefault((department or 'unassigned', category), [0] * history_days)
+        values[(parse_day(day) - start).days] += complaints
+
+    # Leading days before a series' first complaint are not history
+    for key, values in series.items():
+        first = next(i for i, value in enumerate(values) if value)
+        series[key] = values[first:]
+    return series
+
+# Fitting
+
+def holt_winters(values, alpha, beta, gamma, season_length=SEASON_LENGTH, damping=DAMPING):
+    """One pass of additive damped Holt-Winters; returns (sse, residuals, level, trend, seasonal)"""
+    first_season = values[:season_length]
+    level = sum(first_season) / season_length
+    trend = 0.0
+    weeks = len(values) // season_length
+    seasonal = [sum(values[w * season_length + i] for w in range(weeks)) / weeks - level
+                for i in range(season_length)]
+
+    sse = 0.0
+    residuals = []
+    for t in range(season_length, len(values)):
+        season = seasonal[t % season_length]
+        predicted = level + damping * trend + season
+        error = values[t] - predicted
+        sse += error * error
+        residuals.append(error)
+        previous_level = level
+        level = alpha * (values[t] - season) + (1 - alpha) * (previous_level + damping * trend)
+        trend = beta * (level - previous_level) + (1 - beta) * damping * trend
+        seasonal[t % season_length] = gamma * (values[t] - level) + (1 - gamma) * season
+    return sse, residuals, level, trend, seasonal
+
+def year_over_year(values, horizon):
+    """How volume changed from the four weeks before this date last year to the ``horizon`` days after it"""
+    if len(values) < 365 + 28:
+        return 1.0
+    before = values[-365 - 28:-365]
+    after = values[-365:-365 + horizon]
+    if sum(before) < 10 or sum(after) < 10:
+        return 1.0
+    factor = (sum(after) / len(after)) / (sum(before) / len(before))
+    return min(2.0, max(0.5, factor))
+
+def fit_series(item):
+    """Forecast one series; takes and returns plain data so it can run in a worker process"""
+    key, values, horizon = item
+    if len(values) < MIN_HISTORY_DAYS:
+        recent = values[-28:]
+        mean = sum(recent) / len(recent)
+        spread = INTERVAL_Z * math.sqrt(mean)  # Poisson-like spread for sparse counts
+        return key, 'mean', [(mean, max(0.0, mean - spread), mean + spread)] * horizon
+
+    best = min(((holt_winters(values, alpha, beta, gamma), alpha)
+                for alpha in ALPHAS for beta in BETAS for gamma in GAMMAS), key=lambda fit: fit[0][0])
+    (sse, residuals, level, trend, seasonal), alpha = best
+    sigma = math.sqrt(sse / len(residuals))
+    factor = year_over_year(values, horizon)
+
+    forecasts = []
+    damped = 0.0
+    for h in range(1, horizon + 1):
+        damped += DAMPING ** h
+        expected = max(0.0, (level + damped * trend + seasonal[(len(values) + h - 1) % SEASON_LENGTH]) * factor)
+        spread = INTERVAL_Z * sigma * factor * math.sqrt(1 + (h - 1) * alpha * alpha)
+        forecasts.append((expected, max(0.0, expected - spread), expected + spread))
+    return key, 'holt_winters', forecasts
+
+def fit_all(series, horizon, workers=1):
+    """Fit every series, in ``workers`` processes when there are enough series to pay for them"""
+    items = [(key, values, horizon) for key, values in series.items()]
+    if workers <= 1 or len(items) < POOL_MIN_SERIES:
+        return [fit_series(item) for item in items]
+    # spawn: forked children would inherit the app's database connections
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+        return list(pool.map(fit_series, items, chunksize=max(1, len(items) // (workers * 4))))
+
+def refresh_forecasts(today=None, workers=None):
+    """Fit all series and replace the stored forecasts; returns the number of series"""
+    config = current_app.config
+    today = today or datetime.utcnow().date()
+    horizon = config['FORECAST_HORIZON_DAYS']
+    series = daily_series(config['FORECAST_HISTORY_DAYS'], today)
+    results = fit_all(series, horizon, workers or config['FORECAST_WORKERS'])
+
+    now = datetime.utcnow()
+    rows = [{'department': department, 'category': category, 'day': today + timedelta(days=h),
+             'expected': expected, 'low': low, 'high': high, 'model': model, 'generated_at': now}
+            for (department, category), model, forecasts in results
+            for h, (expected, low, high) in enumerate(forecasts)]
+    table = ComplaintForecast.__table__
+    db.session.execute(table.delete())
+    if rows:
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+    return len(results)
+
+# Reading
+
+def forecast_generated_at():
+    return db.session.query(func.max(ComplaintForecast.generated_at)).scalar()
+
+def schedule_forecast_refresh(today=None):
+    """Queue today's refresh_forecasts job unless forecasts from today exist"""
+    from jobs import enqueue
+
+    today = today or datetime.utcnow().date()
+    generated_at = forecast_generated_at()
+    if generated_at is not None and generated_at.date() >= today:
+        return None
+    job = enqueue('refresh_forecasts', idempotency_key=f'refresh_forecasts:{today.isoformat()}')
+    db.session.commit()
+    return job
+
+def forecast_summary(days=7, today=None):
+    """Expected complaints over the next ``days`` days, per series and per day"""
+    today = today or datetime.utcnow().date()
+    rows = ComplaintForecast.query.filter(ComplaintForecast.day >= today,
+                                          ComplaintForecast.day < today + timedelta(days=days)).all()
+    series = {}
+    daily = {}
+    for row in rows:
+        entry = series.setdefault((row.department, row.category), {
+            'department': row.department, 'category': row.category, 'model': row.model,
+            'expected': 0.0, 'low': 0.0, 'high': 0.0,
+        })
+        total = daily.setdefault(row.day, {'date': row.day.isoformat(), 'expected': 0.0, 'low': 0.0, 'high': 0.0})
+        for field in ('expected', 'low', 'high'):
+            entry[field] += getattr(row, field)
+            total[field] += getattr(row, field)
+
+    # The last week's actual numbers, for comparison
+    week_ago = datetime.combine(today - timedelta(days=days), datetime.min.time())
+    recent = dict(((department or 'unassigned', category), count) for department, category, count in db.session.query(
+        Complaint.assigned_department, Complaint.category, func.count(Complaint.id))
+        .filter(Complaint.created_at >= week_ago, Complaint.created_at < datetime.combine(today, datetime.min.time()))
+        .group_by(Complaint.assigned_department, Complaint.category))
+    for key, entry in series.items():
+        entry['last_period'] = recent.get(key, 0)
+
+    return {
+        'series': sorted(series.values(), key=lambda entry: entry['expected'], reverse=True),
+        'daily': [daily[day] for day in sorted(daily)],
+        'generated_at': forecast_generated_at(),
+    }
+
+if __name__ == '__main__':
+    import argparse
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Refit the complaint volume forecasts')
+    parser.add_argument('--workers', type=int, default=None, help='fitting processes (default: FORECAST_WORKERS)')
+    args = parser.parse_args()
+    with create_app().app_context():
+        db.create_all()
+        print(f'Forecast {refresh_forecasts(workers=args.workers)} series')
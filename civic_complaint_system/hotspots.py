@@ -0,0 +1,127 @@
+"""Complaint hotspots: localities where one category of problem clusters.
+
+Every complaint is counted in an hourly bucket of hotspot_buckets under
+its normalised locality (see addresses.py) and category. The counts are
+kept up to date in the same transaction as the complaint changes. A
+window's hotspots come from summing its buckets, compared with the window
+before it to get a trend. Each worker caches the ranking of every window
+for HOTSPOT_CACHE_SECONDS, so page loads in between only read the cache.
+
+Buckets older than two of the longest window are no longer read:
+
+    python hotspots.py prune      # e.g. daily from cron
+    python hotspots.py rebuild    # recount everything, e.g. after an import
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, func, select
+from models import db, Complaint, ComplaintLocality, HotspotBucket, rebuild_hotspot_counts
+
+WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+}
+
+def window_start(window, now=None):
+    """First hourly bucket of the window ending with the current hour"""
+    now = now or datetime.utcnow()
+    return now.replace(minute=0, second=0, microsecond=0) - WINDOWS[window] + timedelta(hours=1)
+
+def trend(current, previous, threshold=0.25):
+    """'up', 'down' or 'steady' compared with the window before"""
+    if current > previous * (1 + threshold) and current - previous >= 2:
+        return 'up'
+    if current < previous * (1 - threshold) and previous - current >= 2:
+        return 'down'
+    return 'steady'
+
+def rank_hotspots(window, now=None):
+    """Every locality and category with complaints in the window, most complaints first"""
+    since = window_start(window, now)
+    previous_since = since - WINDOWS[window]
+    buckets = HotspotBucket.__table__
+    in_window = buckets.c.hour >= since
+    current = func.sum(case((in_window, buckets.c.count), else_=0))
+    previous = func.sum(case((in_window, 0), else_=buckets.c.count))
+    rows = db.session.execute(
+        select(buckets.c.locality, buckets.c.category, current.label('current'), previous.label('previous'))
+        .where(buckets.c.hour >= previous_since)
+        .group_by(buckets.c.locality, buckets.c.category)
+        .having(current > 0)
+        .order_by(current.desc(), buckets.c.locality, buckets.c.category)
+    ).all()
+    return [{
+        'locality': row.locality,
+        'category': row.category,
+        'count': int(row.current),
+        'previous': int(row.previous),
+        'trend': trend(row.current, row.previous),
+    } for row in rows]
+
+class HotspotCache:
+    """Rankings per window, recomputed at most every ``max_age`` seconds"""
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.rankings = {}
+
+    def ranking(self, window):
+        with self.lock:
+            cached = self.rankings.get(window)
+            if cached is None or time.monotonic() - cached[0] > self.max_age:
+                cached = self.rankings[window] = (time.monotonic(), rank_hotspots(window))
+            return cached[1]
+
+    def clear(self):
+        with self.lock:
+            self.rankings.clear()
+
+def get_hotspot_cache():
+    cache = current_app.extensions.get('hotspots')
+    if cache is None:
+        cache = current_app.extensions['hotspots'] = HotspotCache(current_app.config['HOTSPOT_CACHE_SECONDS'])
+    return cache
+
+def top_hotspots(window='7d', limit=None, category=None):
+    """The ``limit`` biggest hotspots in the window, optionally of one category"""
+    if window not in WINDOWS:
+        raise ValueError(f"Unknown hotspot window {window!r}; available: {', '.join(WINDOWS)}")
+    ranking = get_hotspot_cache().ranking(window)
+    if category:
+        ranking = [hotspot for hotspot in ranking if hotspot['category'] == category]
+    return ranking[:limit or current_app.config['HOTSPOT_TOP_K']]
+
+def ensure_hotspot_counts():
+    """Count the existing complaints once, on databases created before the hotspot buckets"""
+    if (db.session.query(ComplaintLocality.complaint_id).first() is None
+            and db.session.query(Complaint.id).first() is not None):
+        rebuild_hotspot_counts(db.session.connection())
+        db.session.commit()
+
+def prune_hotspot_buckets(now=None):
+    """Delete buckets older than any window reads; returns how many"""
+    cutoff = window_start(max(WINDOWS, key=WINDOWS.get), now) - max(WINDOWS.values())
+    table = HotspotBucket.__table__
+    deleted = db.session.execute(table.delete().where(table.c.hour < cutoff)).rowcount
+    db.session.commit()
+    return deleted
+
+if __name__ == '__main__':
+    import sys
+    from app import create_app
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ('prune', 'rebuild'):
+        sys.exit('usage: python hotspots.py prune|rebuild')
+    with create_app().app_context():
+        db.create_all()
+        if command == 'prune':
+            print(f'Deleted {prune_hotspot_buckets()} old hotspot buckets')
+        else:
+            counted = rebuild_hotspot_counts(db.session.connection())
+            db.session.commit()
+            print(f'Counted {counted} complaints into hotspot buckets')
@@ -0,0 +1,193 @@
+"""Per-request SQL query count and latency instrumentation.
+
+SQLAlchemy cursor events count every statement and time it; Flask request
+hooks attach the totals to the request and fold them into rolling
+per-endpoint histograms that admins can view at /admin/performance.
+In debug mode the totals are also returned as response headers.
+
+Everything is kept in process memory, so each worker reports its own
+traffic. Recording costs two perf_counter() calls per statement and one
+short locked update per request.
+"""
+import threading
+import time
+from bisect import bisect_left
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# Histogram upper bounds; the last bucket catches everything above
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+QUERY_COUNT_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100]
+
+class RequestQueryStats:
+    """SQL totals for the request being served"""
+    __slots__ = ('started', 'count', 'total_time', 'slowest_time', 'slowest_statement')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total_time += duration
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+class Histogram:
+    """Fixed-bucket histogram with approximate percentiles"""
+    __slots__ = ('bounds', 'counts', 'total', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.total += other.total
+        self.sum += other.sum
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations"""
+        if not self.total:
+            return 0
+        threshold = fraction * self.total
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return self.bounds[i] if i < len(self.bounds) else float('inf')
+        return float('inf')
+
+class EndpointWindow:
+    """Per-endpoint aggregates for one time slot"""
+    __slots__ = ('latency', 'queries', 'sql_time', 'max_queries', 'slowest_time', 'slowest_statement')
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS_MS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.sql_time = 0.0
+        self.max_queries = 0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+
+    def observe(self, latency_ms, stats):
+        self.latency.observe(latency_ms)
+        self.queries.observe(stats.count)
+        self.sql_time += stats.total_time
+        self.max_queries = max(self.max_queries, stats.count)
+        if stats.slowest_time > self.slowest_time:
+            self.slowest_time = stats.slowest_time
+            self.slowest_statement = stats.slowest_statement
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.queries.merge(other.queries)
+        self.sql_time += other.sql_time
+        self.max_queries = max(self.max_queries, other.max_queries)
+        if other.slowest_time > self.slowest_time:
+            self.slowest_time = other.slowest_time
+            self.slowest_statement = other.slowest_statement
+
+class RollingEndpointStats:
+    """Per-endpoint histograms over a rolling window made of fixed time slots"""
+
+    def __init__(self, window_seconds=3600, slots=12):
+        self.slot_seconds = max(1, window_seconds // slots)
+        self.slots = slots
+        self.lock = threading.Lock()
+        # slot index -> (slot start, {endpoint: EndpointWindow})
+        self.windows = {}
+
+    def observe(self, endpoint, latency_ms, stats, now=None):
+        now = time.time() if now is None else now
+        slot_start = int(now // self.slot_seconds) * self.slot_seconds
+        index = int(now // self.slot_seconds) % self.slots
+        with self.lock:
+            start, endpoints = self.windows.get(index, (None, None))
+            if start != slot_start:
+                endpoints = {}
+                self.windows[index] = (slot_start, endpoints)
+            window = endpoints.get(endpoint)
+            if window is None:
+                window = endpoints[endpoint] = EndpointWindow()
+            window.observe(latency_ms, stats)
+
+    def snapshot(self, now=None):
+        """Merge the slots still inside the window, returning {endpoint: EndpointWindow}"""
+        now = time.time() if now is None else now
+        oldest = now - self.slot_seconds * self.slots
+        merged = {}
+        with self.lock:
+            for start, endpoints in self.windows.values():
+                if start <= oldest:
+                    continue
+                for endpoint, window in endpoints.items():
+                    merged.setdefault(endpoint, EndpointWindow()).merge(window)
+        return merged
+
+def current_query_stats():
+    """Return the RequestQueryStats of the current request, if any"""
+    if has_request_context():
+        return g.get('sql_stats')
+    return None
+
+def install_query_listeners(engine):
+    """Time every statement executed on the engine"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's own context: a statement that fails gets no after_cursor_execute
+        if context is not None:
+            context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_start', None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        stats = current_query_stats()
+        if stats is not None:
+            stats.record(statement, duration)
+
+def init_instrumentation(app, engine):
+    """Register the engine listeners and request hooks for an app"""
+    if not app.config.get('SQL_INSTRUMENTATION', True):
+        return
+
+    endpoint_stats = RollingEndpointStats(app.config.get('SQL_STATS_WINDOW_SECONDS', 3600))
+    app.extensions['sql_stats'] = endpoint_stats
+    install_query_listeners(engine)
+
+    @app.before_request
+    def start_query_stats():
+        g.sql_stats = RequestQueryStats()
+
+    @app.after_request
+    def record_query_stats(response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+
+        latency_ms = (time.perf_counter() - stats.started) * 1000
+        endpoint_stats.observe(request.endpoint or 'unmatched', latency_ms, stats)
+
+        headers_enabled = app.config.get('SQL_STATS_HEADERS')
+        if headers_enabled or (headers_enabled is None and app.debug):
+            response.headers['X-SQL-Query-Count'] = str(stats.count)
+            response.headers['X-SQL-Time-Ms'] = f'{stats.total_time * 1000:.2f}'
+            response.headers['X-SQL-Slowest-Ms'] = f'{stats.slowest_time * 1000:.2f}'
+            response.headers['Server-Timing'] = f'sql;dur={stats.total_time * 1000:.2f};desc="{stats.count} queries"'
+        return response
@@ -0,0 +1,258 @@
+"""Queued complaint intake: acknowledge at once, file in groups.
+
+After a storm citizens submit hundreds of complaints a minute. Filing one
+takes a flush, auto-assignment, the counter and hotspot listeners and a
+commit, and on SQLite every commit is an fsync under the database-wide
+write lock, so submissions queue up behind each other.
+
+With INTAKE_MODE = 'queued', a validated submission is instead written to
+a local SQLite queue (INTAKE_PATH, WAL with synchronous=FULL) and the
+citizen is answered once that one-row commit is on disk. A single writer
+then files the queued submissions into the main database, up to
+INTAKE_BATCH_SIZE complaints per transaction, waiting at most
+INTAKE_MAX_DELAY_MS for a group to fill:
+
+    python intake.py
+
+The writer's position in the queue is an IntakeCheckpoint row in the main
+database, moved in the same transaction as the complaints it files, so a
+crash at any point neither loses nor duplicates a submission. Filed rows
+are then deleted from the queue. A submission that cannot be filed (e.g.
+its user was deleted meanwhile) is moved to intake_failed with the error.
+
+The queue is local to one host: every host running web workers in queued
+mode needs its own writer. Each queue has a random id, which names its
+checkpoint.
+"""
+import time
+import uuid
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import (Column, DateTime, Integer, MetaData, String, Table, Text, create_engine, event, func,
+                        select)
+from sqlalchemy.exc import OperationalError
+from models import db, IntakeCheckpoint, insert_ignore
+
+metadata = MetaData()
+
+intake_meta = Table(
+    'intake_meta', metadata,
+    Column('key', String(50), primary_key=True),
+    Column('value', String(100), nullable=False),
+)
+
+submissions = Table(
+    'intake_submissions', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('reference', String(32), nullable=False, unique=True),
+    Column('user_id', Integer, nullable=False, index=True),
+    Column('category', String(50), nullable=False),
+    Column('description', Text, nullable=False),
+    Column('address', String(255), nullable=False),
+    Column('landmark', String(255), nullable=True),
+    Column('priority', String(20), nullable=False),
+    Column('image_filename', String(255), nullable=True),
+    Column('received_at', DateTime, nullable=False),
+    # Ids are never reused, even once the queue has been emptied
+    sqlite_autoincrement=True,
+)
+
+failed = Table(
+    'intake_failed', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('reference', String(32), nullable=False, unique=True),
+    Column('user_id', Integer, nullable=False),
+    Column('payload', Text, nullable=False),
+    Column('error', Text, nullable=False),
+    Column('failed_at', DateTime, nullable=False),
+)
+
+SUBMISSION_FIELDS = ('user_id', 'category', 'description', 'address', 'landmark', 'priority', 'image_filename')
+
+def intake_queued():
+    return current_app.config['INTAKE_MODE'] == 'queued'
+
+def get_intake_engine():
+    """This process's engine for the local queue, creating the queue on first use"""
+    engine = current_app.extensions.get('intake_engine')
+    if engine is None:
+        engine = create_engine(f"sqlite:///{current_app.config['INTAKE_PATH']}")
+
+        @event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            # An acknowledged submission must survive a power cut
+            for pragma in ('journal_mode=WAL', 'synchronous=FULL', 'busy_timeout=10000'):
+                cursor.execute(f'PRAGMA {pragma}')
+            cursor.close()
+
+        metadata.create_all(engine)
+        with engine.begin() as connection:
+            insert_ignore(connection, intake_meta, {'key': 'queue_id', 'value': uuid.uuid4().hex}, ['key'])
+        current_app.extensions['intake_engine'] = engine
+    return engine
+
+def queue_id(connection):
+    return connection.execute(select(intake_meta.c.value).where(intake_meta.c.key == 'queue_id')).scalar()
+
+# Web workers
+
+def enqueue_submission(user_id, category, description, address, landmark, priority, image_filename=None):
+    """Durably queue a validated complaint; returns its reference"""
+    reference = uuid.uuid4().hex
+    with get_intake_engine().begin() as connection:
+        connection.execute(submissions.insert(), {
+            'reference': reference, 'user_id': user_id, 'category': category, 'description': description,
+            'address': address, 'landmark': landmark or None, 'priority': priority,
+            'image_filename': image_filename, 'received_at': datetime.utcnow(),
+        })
+    return reference
+
+def pending_submissions(user_id):
+    """How many of a citizen's submissions are queued but not filed yet"""
+    if not intake_queued():
+        return 0
+    with get_intake_engine().connect() as connection:
+        position = checkpoint_position(queue_id(connection))
+        return connection.execute(select(func.count()).select_from(submissions)
+                                  .where(submissions.c.user_id == user_id, submissions.c.id > position)).scalar()
+
+# Writer
+
+def checkpoint_position(queue):
+    checkpoint = db.session.get(IntakeCheckpoint, queue)
+    return checkpoint.position if checkpoint else 0
+
+def load_checkpoint(queue):
+    """The queue's checkpoint row, created at position 0 the first time"""
+    checkpoint = db.session.get(IntakeCheckpoint, queue)
+    if checkpoint is None:
+        checkpoint = IntakeCheckpoint(queue_id=queue, position=0, filed=0, failed=0)
+        db.session.add(checkpoint)
+        db.session.commit()
+    return checkpoint
+
+def advance_checkpoint(queue, position, new_position, filed=0, failed=0):
+    """Move the checkpoint on if it is still at ``position``; False if another writer moved it"""
+    table = IntakeCheckpoint.__table__
+    return db.session.execute(
+        table.update().where(table.c.queue_id == queue, table.c.position == position)
+        .values(position=new_position, filed=table.c.filed + filed, failed=table.c.failed + failed,
+                updated_at=datetime.utcnow())
+    ).rowcount == 1
+
+def file_submission(row):
+    from routes.complaints import submit_complaint
+
+    return submit_complaint(row.user_id, row.category, row.description, row.address, row.landmark, row.priority,
+                            row.image_filename, created_at=row.received_at)
+
+def file_batch(queue, position, rows):
+    """File rows in one transaction; returns how many, or None if another writer got there first"""
+    for row in rows:
+        file_submission(row)
+    if not advance_checkpoint(queue, position, rows[-1].id, filed=len(rows)):
+        db.session.rollback()
+        return None
+    db.session.commit()
+    return len(rows)
+
+def file_one_by_one(queue, position, rows, engine):
+    """After a failed batch: file each row on its own and set aside the ones that still fail"""
+    filed = 0
+    for row in rows:
+        try:
+            result = file_batch(queue, position, [row])
+            if result is None:
+                return filed
+            filed += result
+        except OperationalError:
+            # The database itself is unavailable, not this submission at fault
+            db.session.rollback()
+            raise
+        except Exception as error:
+            db.session.rollback()
+            current_app.logger.warning('Intake submission %s could not be filed: %s', row.reference, error)
+            # Recorded before the checkpoint moves past it, as the row is deleted from the
+            # queue after that; a writer that crashed in between records it again, once
+            with engine.begin() as connection:
+                insert_ignore(connection, failed, {
+                    'reference': row.reference, 'user_id': row.user_id,
+                    'payload': repr({field: getattr(row, field) for field in SUBMISSION_FIELDS}),
+                    'error': str(error)[:2000], 'failed_at': datetime.utcnow(),
+                }, ['reference'])
+            if not advance_checkpoint(queue, position, row.id, failed=1):
+                db.session.rollback()
+                return filed
+            db.session.commit()
+        position = row.id
+    return filed
+
+def drain_intake(batch_size=None, max_delay_ms=None):
+    """File one group of queued submissions; returns how many were filed.
+
+    A group is taken once it is full or its oldest submission has waited
+    ``max_delay_ms``; otherwise nothing is filed and 0 is returned.
+    """
+    config = current_app.config
+    batch_size = batch_size or config['INTAKE_BATCH_SIZE']
+    max_delay_ms = config['INTAKE_MAX_DELAY_MS'] if max_delay_ms is None else max_delay_ms
+    engine = get_intake_engine()
+    with engine.connect() as connection:
+        queue = queue_id(connection)
+        position = load_checkpoint(queue).position
+        rows = connection.execute(select(submissions).where(submissions.c.id > position)
+                                  .order_by(submissions.c.id).limit(batch_size)).all()
+    if not rows:
+        return 0
+    if len(rows) < batch_size and (datetime.utcnow() - rows[0].received_at).total_seconds() * 1000 < max_delay_ms:
+        db.session.rollback()
+        return 0
+
+    try:
+        filed = file_batch(queue, position, rows)
+    except OperationalError:
+        db.session.rollback()
+        raise
+    except Exception:
+        db.session.rollback()
+        filed = file_one_by_one(queue, position, rows, engine)
+    if filed is None:
+        return 0
+
+    # Filed rows are behind the checkpoint; deleting them only keeps the queue small
+    with engine.begin() as connection:
+        connection.execute(submissions.delete().where(submissions.c.id <= checkpoint_position(queue)))
+    db.session.commit()
+    return filed
+
+def run_writer(stop=None, once=False, log=print):
+    """File queued submissions until ``stop`` is set (or the queue is empty, with ``once``)"""
+    poll = current_app.config['INTAKE_MAX_DELAY_MS'] / 1000 / 4
+    while stop is None or not stop.is_set():
+        try:
+            filed = drain_intake(max_delay_ms=0 if once else None)
+        except OperationalError as error:
+            # E.g. the main database is locked or down; the queue keeps everything until it is back
+            if once:
+                raise
+            log(f'Database unavailable, retrying: {error}')
+            time.sleep(1)
+            continue
+        if filed:
+            log(f'Filed {filed} complaints')
+        elif once:
+            return
+        else:
+            time.sleep(poll)
+
+if __name__ == '__main__':
+    import argparse
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='File complaints from the local intake queue')
+    parser.add_argument('--once', action='store_true', help='file everything queued now and exit')
+    args = parser.parse_args()
+    with create_app().app_context():
+        db.create_all()
+        run_writer(once=args.once)
@@ -0,0 +1,280 @@
+"""Durable background jobs kept in the application database.
+
+Anything too slow for a request is registered as a task and enqueued by
+the view, which returns at once:
+
+    @task('export_report', timeout=600)
+    def export_report(export_format, ...):
+        ...
+
+    job = enqueue('export_report', {'export_format': 'csv'}, priority=10,
+                  idempotency_key=f'export:{user.id}:{digest}')
+    db.session.commit()
+
+Jobs are rows in the jobs table, so enqueueing is part of the caller's
+transaction and no broker is needed. Workers run as a separate process:
+
+    python run_jobs.py                       # JOBS_WORKERS threads
+    python run_jobs.py --mode process -w 4   # four worker processes
+    python run_jobs.py --once                # run what is due, then exit
+
+A worker claims the highest priority due job and holds it for the job's
+visibility timeout. If the worker dies, the job becomes visible again when
+that timeout passes and another worker takes it, so a task may run more
+than once and should be safe to repeat. A failing task is retried with
+exponential backoff until max_attempts, then marked failed.
+"""
+import importlib
+import json
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, select
+from models import db, Job, insert_ignore
+from notifications import retry_delay
+
+# Modules whose tasks workers load before claiming jobs
+TASK_MODULES = ('tasks',)
+
+TASKS = {}
+
+class Task:
+    def __init__(self, name, func, max_attempts=None, timeout=None):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+def task(name=None, max_attempts=None, timeout=None):
+    """Register a function as a task; it gets the job's payload as keyword arguments.
+
+    ``timeout`` is the visibility timeout in seconds: the task must finish
+    within it or another worker will start it again.
+    """
+    def decorator(func):
+        task_name = name or func.__name__
+        TASKS[task_name] = Task(task_name, func, max_attempts, timeout)
+        return func
+    return decorator
+
+def load_tasks():
+    for module in TASK_MODULES:
+        importlib.import_module(module)
+
+# Enqueueing
+
+def enqueue(name, payload=None, priority=0, idempotency_key=None, delay=0, max_attempts=None,
+            timeout=None, created_by=None, reuse_finished=True):
+    """Add a job in the current transaction and return it.
+
+    If a job with the same idempotency key exists, that job is returned
+    instead and nothing is added. With ``reuse_finished=False`` only a job
+    still queued or running is returned; a finished one gives up its key to
+    the new job, e.g. so a failed or outdated export can be asked for again.
+    """
+    if idempotency_key is not None:
+        existing = Job.query.filter_by(idempotency_key=idempotency_key).first()
+        if existing is not None:
+            if reuse_finished or existing.status in ('queued', 'running'):
+                return existing
+            existing.idempotency_key = None
+            db.session.flush()
+
+    config = current_app.config
+    registered = TASKS.get(name)
+    values = dict(
+        name=name,
+        payload=json.dumps(payload or {}, default=str),
+        priority=priority,
+        status='queued',
+        attempts=0,
+        max_attempts=max_attempts or (registered and registered.max_attempts) or config['JOBS_MAX_ATTEMPTS'],
+        visibility_timeout=timeout or (registered and registered.timeout) or config['JOBS_VISIBILITY_TIMEOUT'],
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+        idempotency_key=idempotency_key,
+        created_by=created_by,
+    )
+    if idempotency_key is not None:
+        # A request enqueueing the same job at the same moment may get in first; its job is returned then
+        insert_ignore(db.session.connection(), Job.__table__, values, ['idempotency_key'])
+        return Job.query.filter_by(idempotency_key=idempotency_key).one()
+    job = Job(**values)
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+def job_status(job):
+    """What the status API reports about a job"""
+    return {
+        'id': job.id,
+        'name': job.name,
+        'status': job.status,
+        'priority': job.priority,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.last_error,
+        'created_at': job.created_at,
+        'run_at': job.run_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
+
+def job_counts():
+    """Jobs per status"""
+    return dict(db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status).all())
+
+# Running
+
+def claim_next():
+    """Take the highest priority due job for this worker, or None"""
+    table = Job.__table__
+    now = datetime.utcnow()
+    due = or_(and_(table.c.status == 'queued', table.c.run_at <= now),
+              and_(table.c.status == 'running', table.c.locked_until < now))
+
+    # Jobs whose worker died on their last attempt are not tried again
+    db.session.execute(
+        table.update()
+        .where(table.c.status == 'running', table.c.locked_until < now, table.c.attempts >= table.c.max_attempts)
+        .values(status='failed', finished_at=now, claim_token=None, locked_until=None,
+                last_error='Visibility timeout expired on the last attempt'))
+
+    while True:
+        candidate = db.session.execute(
+            select(table.c.id, table.c.visibility_timeout).where(due)
+            .order_by(table.c.priority.desc(), table.c.run_at, table.c.id).limit(1)
+        ).first()
+        if candidate is None:
+            db.session.commit()
+            return None
+
+        # Only one worker's update matches ``due``; the others look again
+        token = uuid.uuid4().hex
+        claimed = db.session.execute(
+            table.update().where(table.c.id == candidate.id, due)
+            .values(status='running', claim_token=token, attempts=table.c.attempts + 1, started_at=now,
+                    locked_until=now + timedelta(seconds=candidate.visibility_timeout))
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.execute(
+                select(table.c.id, table.c.name, table.c.payload, table.c.attempts, table.c.max_attempts,
+                       table.c.claim_token).where(table.c.id == candidate.id)
+            ).first()
+
+def finish(job, **values):
+    """Record a job's outcome, unless its lease expired and another worker took it"""
+    table = Job.__table__
+    values.update(claim_token=None, locked_until=None)
+    finished = db.session.execute(
+        table.update().where(table.c.id == job.id, table.c.claim_token == job.claim_token).values(**values)
+    ).rowcount
+    db.session.commit()
+    if not finished:
+        current_app.logger.warning('Job %s outlived its visibility timeout; result discarded', job.id)
+    return bool(finished)
+
+def run_job(job):
+    """Run a claimed job and record its result; returns its new status"""
+    config = current_app.config
+    registered = TASKS.get(job.name)
+    try:
+        if registered is None:
+            raise LookupError(f'No task named {job.name!r}')
+        result = registered.func(**json.loads(job.payload))
+    except Exception as error:
+        db.session.rollback()
+        now = datetime.utcnow()
+        values = {'last_error': traceback.format_exc()[-2000:]}
+        if registered is None or job.attempts >= job.max_attempts:
+            values.update(status='failed', finished_at=now)
+        else:
+            values.update(status='queued', run_at=now + timedelta(seconds=retry_delay(
+                job.attempts, config['JOBS_RETRY_BASE_SECONDS'], config['JOBS_RETRY_MAX_SECONDS'])))
+        current_app.logger.warning('Job %s (%s) attempt %s failed: %s', job.id, job.name, job.attempts, error)
+        finish(job, **values)
+        return values['status']
+
+    db.session.commit()
+    finish(job, status='succeeded', finished_at=datetime.utcnow(),
+           result=json.dumps(result, default=str) if result is not None else None, last_error=None)
+    return 'succeeded'
+
+def run_pending(limit=None):
+    """Run due jobs one after another in the current app context; returns how many ran"""
+    load_tasks()
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
+
+# Worker pool
+
+def work(app, stop, once=False):
+    """One worker: claim and run jobs until ``stop`` is set (or, with ``once``, nothing is due)"""
+    poll_seconds = app.config['JOBS_POLL_SECONDS']
+    with app.app_context():
+        try:
+            while not stop.is_set():
+                try:
+                    job = claim_next()
+                except Exception:
+                    # e.g. the database is briefly locked or unreachable; keep the worker alive
+                    db.session.rollback()
+                    current_app.logger.exception('Could not claim a job')
+                    stop.wait(poll_seconds)
+                    continue
+                if job is None:
+                    if once:
+                        return
+                    stop.wait(poll_seconds)
+                    continue
+                run_job(job)
+        finally:
+            db.session.remove()
+
+def run_threads(app, workers, stop=None, once=False):
+    """Run ``workers`` worker threads on one app until they stop"""
+    load_tasks()
+    stop = stop or threading.Event()
+    threads = [threading.Thread(target=work, args=(app, stop, once), name=f'job-worker-{n}', daemon=True)
+               for n in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=1)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+def worker_process(config_name, threads, once):
+    """Entry point of one worker process; each builds its own app and connections"""
+    from app import create_app
+    run_threads(create_app(config_name), threads, once=once)
+
+def run_processes(config_name, workers, threads=1, once=False):
+    """Run ``workers`` worker processes with ``threads`` worker threads each"""
+    import multiprocessing
+
+    # spawn rather than fork: a forked child would share the parent's database connections
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=worker_process, args=(config_name, threads, once),
+                                 name=f'job-worker-{n}') for n in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
@@ -0,0 +1,352 @@
+"""Prometheus text-format metrics.
+
+A small in-process registry of counters, histograms and per-process gauges
+rendered at /metrics. Request latency is recorded per blueprint and
+endpoint by request hooks; uploads and report exports call observe_upload
+and observe_export. Backlog gauges are read from the open_complaint_counts
+table, which is maintained alongside complaint changes, so a scrape never
+counts the complaints table and never writes. On a database created before
+that table, count the open complaints once with:
+
+    python metrics.py rebuild
+
+With several worker processes (gunicorn), set METRICS_MULTIPROC_DIR to a
+directory shared by the workers and emptied on deploy: each worker writes
+its samples there at most every METRICS_FLUSH_SECONDS, and a scrape served
+by any worker sums the counters and histograms of all of them.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, time as day_time
+from flask import current_app, g, request
+from instrumentation import LATENCY_BUCKETS_MS
+
+REQUEST_SECONDS_BUCKETS = [bound / 1000 for bound in LATENCY_BUCKETS_MS]
+UPLOAD_BYTES_BUCKETS = [10240, 51200, 102400, 262144, 524288, 1048576, 2097152, 5242880]
+UPLOAD_SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1]
+EXPORT_SECONDS_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+EXPORT_ROWS_BUCKETS = [10, 100, 1000, 5000, 10000, 50000, 100000]
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class Metric:
+    """Named metric whose samples are keyed by a tuple of label values"""
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=REQUEST_SECONDS_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = list(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            # Per-bucket counts followed by the running sum
+            sample = self.values.get(key)
+            if sample is None:
+                sample = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            sample[bisect_left(self.buckets, value)] += 1
+            sample[-1] += value
+
+class Gauge(Metric):
+    """Per-process gauge whose value is read from a callback when sampled"""
+    kind = 'gauge'
+
+    def __init__(self, registry, name, documentation, function):
+        super().__init__(registry, name, documentation)
+        self.function = function
+
+def merge_values(kind, merged, values):
+    for key, value in values:
+        key = tuple(key)
+        if kind == 'counter':
+            merged[key] = merged.get(key, 0) + value
+        elif key in merged:
+            merged[key] = [a + b for a, b in zip(merged[key], value)]
+        else:
+            merged[key] = list(value)
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+def format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """Registry shared by the request hooks and instrumented code paths"""
+
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = []
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.last_flush = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=REQUEST_SECONDS_BUCKETS):
+        return self.register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, function):
+        return self.register(Gauge(self, name, documentation, function))
+
+    def add_collector(self, collector):
+        """Register a callable returning [(name, kind, documentation, [(labels, value)])] at scrape time"""
+        self.collectors.append(collector)
+
+    def state(self):
+        """JSON-serialisable samples of this process"""
+        state = {'pid': os.getpid(), 'metrics': {}}
+        with self.lock:
+            for metric in self.metrics.values():
+                if metric.kind == 'gauge':
+                    continue
+                state['metrics'][metric.name] = [[list(key), list(value) if isinstance(value, list) else value]
+                                                 for key, value in metric.values.items()]
+        for metric in self.metrics.values():
+            if metric.kind == 'gauge':
+                value = metric.function()
+                if value is not None:
+                    state['metrics'][metric.name] = [[[], value]]
+        return state
+
+    def flush(self, force=False):
+        """Write this process's samples to the shared directory"""
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_flush < self.flush_interval:
+            return
+        self.last_flush = now
+        path = os.path.join(self.directory, f'metrics_{os.getpid()}.json')
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.state(), f)
+        os.replace(temp_path, path)
+
+    def process_states(self):
+        """Samples of every worker: this one live, the others from their last flush"""
+        states = [self.state()]
+        if not self.directory:
+            return states
+        own_file = f'metrics_{os.getpid()}.json'
+        for filename in os.listdir(self.directory):
+            if not filename.startswith('metrics_') or not filename.endswith('.json') or filename == own_file:
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    states.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return states
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        states = self.process_states()
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+
+            if metric.kind == 'gauge':
+                # Per-process values; workers that have exited are left out
+                for state in states:
+                    if state is not states[0] and not process_alive(state['pid']):
+                        continue
+                    for _, value in state['metrics'].get(metric.name, []):
+                        lines.append(f'{metric.name}{format_labels((), (), [("pid", state["pid"])])} {format_value(value)}')
+                continue
+
+            # Counters and histograms of exited workers still count towards the totals
+            merged = {}
+            for state in states:
+                merge_values(metric.kind, merged, state['metrics'].get(metric.name, []))
+
+            for key, value in sorted(merged.items()):
+                if metric.kind == 'counter':
+                    lines.append(f'{metric.name}_total{format_labels(metric.labelnames, key)} {format_value(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + [float('inf')], value[:-1]):
+                    cumulative += count
+                    le = [('le', format_value(float(bound)))]
+                    lines.append(f'{metric.name}_bucket{format_labels(metric.labelnames, key, le)} {cumulative}')
+                lines.append(f'{metric.name}_sum{format_labels(metric.labelnames, key)} {format_value(value[-1])}')
+                lines.append(f'{metric.name}_count{format_labels(metric.labelnames, key)} {cumulative}')
+
+        for collector in self.collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{format_labels(list(labels), list(labels.values()))} {format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+def backlog_metrics():
+    """Open complaint gauges from the maintained counts table"""
+    from models import db, OpenComplaintCount
+
+    rows = db.session.query(OpenComplaintCount).filter(OpenComplaintCount.count > 0).all()
+
+    by_department = {}
+    unassigned = 0
+    by_day = {}
+    for row in rows:
+        key = (row.department or 'none', row.status)
+        by_department[key] = by_department.get(key, 0) + row.count
+        if not row.assigned:
+            unassigned += row.count
+        by_day[row.created_day] = by_day.get(row.created_day, 0) + row.count
+
+    # Median age at day resolution, taking each complaint as created at midday
+    median_age = 0.0
+    total = sum(by_day.values())
+    cumulative = 0
+    for day in sorted(by_day):
+        cumulative += by_day[day]
+        if cumulative * 2 >= total:
+            created = datetime.combine(day, day_time(12))
+            median_age = max(0.0, (datetime.utcnow() - created).total_seconds())
+            break
+
+    return [
+        ('civic_open_complaints', 'gauge', 'Open complaints by department and status',
+         [({'department': department, 'status': status}, count)
+          for (department, status), count in sorted(by_department.items())]),
+        ('civic_unassigned_complaints', 'gauge', 'Open complaints with no assigned officer',
+         [({}, unassigned)]),
+        ('civic_open_complaint_median_age_seconds', 'gauge', 'Median age of open complaints',
+         [({}, median_age)]),
+    ]
+
+def pool_gauge(engine, method):
+    """Callback reading one QueuePool statistic, None for pools without it"""
+    def read():
+        function = getattr(engine.pool, method, None)
+        return function() if callable(function) else None
+    return read
+
+def get_metrics():
+    """Registry of the current app, or None if metrics are disabled"""
+    return current_app.extensions.get('metrics')
+
+def observe_upload(size_bytes, seconds):
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.metrics['civic_upload_size_bytes'].observe(size_bytes)
+        metrics.metrics['civic_upload_duration_seconds'].observe(seconds)
+
+def observe_export(export_format, rows, seconds):
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.metrics['civic_export_duration_seconds'].observe(seconds, format=export_format)
+        metrics.metrics['civic_export_rows'].observe(rows, format=export_format)
+
+def observe_report_cache(result):
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.metrics['civic_report_cache_lookups'].inc(result=result)
+
+def init_metrics(app, engine):
+    """Create the registry for an app and register the request hooks"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return None
+
+    metrics = MetricsRegistry(app.config.get('METRICS_MULTIPROC_DIR'),
+                              app.config.get('METRICS_FLUSH_SECONDS', 5))
+    request_seconds = metrics.histogram('civic_http_request_duration_seconds', 'Request latency',
+                                        ('blueprint', 'endpoint'))
+    requests_total = metrics.counter('civic_http_requests', 'Requests served',
+                                     ('blueprint', 'endpoint', 'status'))
+    metrics.histogram('civic_upload_size_bytes', 'Size of uploaded complaint images', buckets=UPLOAD_BYTES_BUCKETS)
+    metrics.histogram('civic_upload_duration_seconds', 'Time to store an uploaded image',
+                      buckets=UPLOAD_SECONDS_BUCKETS)
+    metrics.histogram('civic_export_duration_seconds', 'Time to build a report export', ('format',),
+                      buckets=EXPORT_SECONDS_BUCKETS)
+    metrics.histogram('civic_export_rows', 'Rows in a report export', ('format',), buckets=EXPORT_ROWS_BUCKETS)
+    metrics.counter('civic_report_cache_lookups', 'Report page renders by result cache outcome', ('result',))
+    metrics.gauge('civic_db_pool_size', 'Connections kept in the pool', pool_gauge(engine, 'size'))
+    metrics.gauge('civic_db_pool_checked_out', 'Pool connections in use', pool_gauge(engine, 'checkedout'))
+    metrics.gauge('civic_db_pool_overflow', 'Connections opened beyond the pool size', pool_gauge(engine, 'overflow'))
+    metrics.add_collector(backlog_metrics)
+    app.extensions['metrics'] = metrics
+    if metrics.directory:
+        atexit.register(metrics.flush, force=True)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        labels = {'blueprint': request.blueprint or 'app', 'endpoint': request.endpoint or 'unmatched'}
+        request_seconds.observe(time.perf_counter() - started, **labels)
+        requests_total.inc(status=response.status_code, **labels)
+        metrics.flush()
+        return response
+
+    return metrics
+
+if __name__ == '__main__':
+    import sys
+    from app import create_app
+    from models import db, rebuild_open_counts
+
+    if sys.argv[1:] != ['rebuild']:
+        sys.exit('usage: python metrics.py rebuild')
+    with create_app().app_context():
+        db.create_all()
+        counted = rebuild_open_counts(db.session.connection())
+        db.session.commit()
+        print(f'Counted {counted} open complaints for the backlog gauges')
@@ -0,0 +1,87 @@
+"""Rebuild the complaints and status_updates tables with SQLite AUTOINCREMENT.
+
+Without it SQLite hands out the highest id again once that row has been
+archived and deleted, so a new complaint could take the id of an archived
+one and a new status update could land behind a projection's checkpoint.
+Databases created before the models asked for AUTOINCREMENT are rebuilt
+here, each table in one transaction: rows are copied with their ids, the
+model's indexes recreated, and the id sequence started after the highest
+id in the hot and archive tables.
+
+    python migrate_autoincrement.py
+"""
+from sqlalchemy import MetaData, Table, func, select, text
+from models import db, User, Complaint, StatusUpdate, ArchivedComplaint, ArchivedStatusUpdate
+from migrate_coded_columns import copy_without_index
+
+# Table -> its archive table, whose ids must not be handed out again
+AUTOINCREMENT_TABLES = {
+    Complaint.__table__: ArchivedComplaint.__table__,
+    StatusUpdate.__table__: ArchivedStatusUpdate.__table__,
+}
+
+def needs_migration(conn, table):
+    """True if the table exists and was created without AUTOINCREMENT"""
+    sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                       {'name': table.name}).scalar()
+    return sql is not None and 'AUTOINCREMENT' not in sql.upper()
+
+def highest_id(conn, table):
+    if not conn.dialect.has_table(conn, table.name):
+        return 0
+    return conn.execute(select(func.max(table.c.id))).scalar() or 0
+
+def migrate_table(conn, table, archive_table, log=print):
+    """Rebuild one table in a single transaction"""
+    temp_name = f'{table.name}__autoincrement'
+    columns = [column.name for column in table.columns]
+
+    with conn.begin():
+        metadata = MetaData()
+        metadata.reflect(bind=conn, only=[User.__tablename__, Complaint.__tablename__])  # foreign key targets
+        new_table = Table(temp_name, metadata, *[copy_without_index(column) for column in table.columns],
+                          sqlite_autoincrement=True)
+        new_table.create(conn)
+        old_table = Table(table.name, MetaData(), autoload_with=conn)
+        copied = conn.execute(new_table.insert().from_select(
+            columns, select(*[old_table.c[name] for name in columns]).order_by(old_table.c.id))).rowcount
+        last_id = max(highest_id(conn, table), highest_id(conn, archive_table))
+        old_table.drop(conn)
+        conn.exec_driver_sql(f'ALTER TABLE {temp_name} RENAME TO {table.name}')
+        for index in table.indexes:
+            index.create(conn)
+        conn.execute(text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': table.name})
+        conn.execute(text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                     {'name': table.name, 'seq': last_id})
+    log(f'{table.name}: {copied} rows copied, new ids start after {last_id}')
+
+def migrate_database(engine, log=print):
+    """Rebuild every table that still reuses ids"""
+    if engine.dialect.name != 'sqlite':
+        raise RuntimeError('migrate_autoincrement only applies to SQLite databases')
+
+    migrated = []
+    with engine.connect() as conn:
+        # The old tables are dropped while other tables still refer to them
+        foreign_keys = conn.exec_driver_sql('PRAGMA foreign_keys').scalar()
+        conn.exec_driver_sql('PRAGMA foreign_keys = OFF')
+        conn.commit()
+        for table, archive_table in AUTOINCREMENT_TABLES.items():
+            pending = needs_migration(conn, table)
+            conn.commit()
+            if pending:
+                migrate_table(conn, table, archive_table, log)
+                migrated.append(table.name)
+        conn.exec_driver_sql(f'PRAGMA foreign_keys = {foreign_keys}')
+        conn.commit()
+    return migrated
+
+def main():
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        migrated = migrate_database(db.engine)
+        print(f"Migrated tables: {', '.join(migrated) if migrated else 'none, already up to date'}")
+
+if __name__ == '__main__':
+    main()
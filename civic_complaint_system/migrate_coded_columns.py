@@ -0,0 +1,129 @@
+"""Convert status/priority/category/department/role columns from VARCHAR to SMALLINT codes.
+
+Each table is rebuilt: rows are copied in id order, in batches, into a new
+table with the coded schema, then the old table is swapped out in one
+transaction. An interrupted run resumes from the last copied id.
+
+    python migrate_coded_columns.py --batch-size 5000
+"""
+import argparse
+from sqlalchemy import MetaData, Table, case, func, inspect, select, String, Text
+from codes import VOCABULARIES
+from models import db, User, Complaint, ArchivedComplaint
+
+# Table -> {column: vocabulary}
+CODED_COLUMNS = {
+    User.__table__: {'role': 'role'},
+    Complaint.__table__: {'assigned_department': 'department', 'category': 'category',
+                          'status': 'status', 'priority': 'priority'},
+    ArchivedComplaint.__table__: {'assigned_department': 'department', 'category': 'category',
+                                  'status': 'status', 'priority': 'priority'},
+}
+
+def needs_migration(conn, table):
+    """True if the table exists and still stores its coded columns as strings"""
+    inspector = inspect(conn)
+    if not inspector.has_table(table.name):
+        return False
+    column_types = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+    return any(isinstance(column_types.get(name), (String, Text)) for name in CODED_COLUMNS[table])
+
+def find_unknown_values(conn, old_table, columns):
+    """Return {column: [values]} for stored values missing from the vocabularies"""
+    unknown = {}
+    for name, kind in columns.items():
+        values = conn.execute(select(old_table.c[name]).distinct()).scalars().all()
+        missing = [value for value in values if value is not None and value not in VOCABULARIES[kind]]
+        if missing:
+            unknown[name] = missing
+    return unknown
+
+def copy_without_index(column):
+    """Copy a column definition, leaving index creation to the final swap"""
+    copy = column._copy()
+    copy.index = None
+    copy.unique = None
+    return copy
+
+def migrate_table(engine, table, batch_size, log=print):
+    """Rebuild one table with coded columns, copying rows in batches"""
+    columns = CODED_COLUMNS[table]
+    temp_name = f'{table.name}__coded'
+
+    with engine.connect() as conn:
+        old_table = Table(table.name, MetaData(), autoload_with=conn)
+        unknown = find_unknown_values(conn, old_table, columns)
+    if unknown:
+        raise ValueError(f'{table.name} has values with no code: {unknown}; fix the rows or extend codes.VOCABULARIES')
+
+    # Target table with the model's column types, created without indexes so
+    # index names don't clash with the ones on the old table
+    metadata = MetaData()
+    metadata.reflect(bind=engine, only=[User.__tablename__])  # foreign key targets
+    new_table = Table(temp_name, metadata, *[copy_without_index(column) for column in table.columns],
+                      sqlite_autoincrement=table.dialect_options['sqlite']['autoincrement'])
+    new_table.create(engine, checkfirst=True)
+
+    source_columns = []
+    for column in table.columns:
+        if column.name in columns:
+            codes = VOCABULARIES[columns[column.name]]
+            source_columns.append(case(codes, value=old_table.c[column.name], else_=None))
+        else:
+            source_columns.append(old_table.c[column.name])
+
+    with engine.connect() as conn:
+        last_id = conn.execute(select(func.max(new_table.c.id))).scalar() or 0
+        total = conn.execute(select(func.count()).select_from(old_table).where(old_table.c.id > last_id)).scalar()
+    if last_id:
+        log(f'{table.name}: resuming after id {last_id}')
+
+    copied = 0
+    while True:
+        with engine.begin() as conn:
+            batch = select(*source_columns).where(old_table.c.id > last_id).order_by(old_table.c.id).limit(batch_size)
+            result = conn.execute(new_table.insert().from_select([c.name for c in table.columns], batch))
+            if not result.rowcount:
+                break
+            copied += result.rowcount
+            last_id = conn.execute(select(func.max(new_table.c.id))).scalar()
+        log(f'{table.name}: {copied}/{total} rows converted')
+
+    # Swap tables and rebuild the model's indexes in one transaction
+    with engine.begin() as conn:
+        old_table.drop(conn)
+        conn.exec_driver_sql(f'ALTER TABLE {temp_name} RENAME TO {table.name}')
+        for index in table.indexes:
+            index.create(conn)
+    log(f'{table.name}: migrated')
+
+def migrate_database(engine, batch_size=5000, log=print):
+    """Migrate every table that still has string-typed coded columns"""
+    if engine.dialect.name != 'sqlite':
+        raise RuntimeError('migrate_coded_columns only supports SQLite databases')
+
+    migrated = []
+    for table in CODED_COLUMNS:
+        with engine.connect() as conn:
+            pending = needs_migration(conn, table)
+        if pending:
+            migrate_table(engine, table, batch_size, log)
+            migrated.append(table.name)
+    return migrated
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert low-cardinality string columns to small-integer codes')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows copied per transaction')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        migrated = migrate_database(db.engine, args.batch_size)
+        print(f"Migrated tables: {', '.join(migrated) if migrated else 'none, already up to date'}")
+        # Reclaim the pages freed by the old VARCHAR tables
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.exec_driver_sql('VACUUM')
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,10 @@ from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import Index
+from sqlalchemy import Index, event, inspect, select
+from sqlalchemy.orm import Session
+from codes import CodedString
+from addresses import locality_key
 
 db = SQLAlchemy()
 
@@ -13,7 +16,7 @@ class User(UserMixin, db.Model):
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
-    role = db.Column(db.String(20), nullable=False, default='citizen')
+    role = db.Column(CodedString('role'), nullable=False, default='citizen')
     department = db.Column(db.String(50), nullable=True)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -44,15 +47,15 @@ class Complaint(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    assigned_department = db.Column(db.String(50), nullable=True)
+    assigned_department = db.Column(CodedString('department'), nullable=True)
     assigned_officer = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Keep for backward compatibility
-    category = db.Column(db.String(50), nullable=False)
+    category = db.Column(CodedString('category'), nullable=False)
     description = db.Column(db.Text, nullable=False)
     address = db.Column(db.String(255), nullable=False)
     landmark = db.Column(db.String(255), nullable=True)
     image_filename = db.Column(db.String(255), nullable=True)
-    status = db.Column(db.String(20), default='submitted')
-    priority = db.Column(db.String(10), default='medium')
+    status = db.Column(CodedString('status'), default='submitted')
+    priority = db.Column(CodedString('priority'), default='medium')
     resolution_notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -61,12 +64,16 @@ class Complaint(db.Model):
     # Relationships
     status_updates = db.relationship('StatusUpdate', backref='complaint', lazy=True, cascade='all, delete-orphan')
 
+    is_archived = False
+
     # Indexes for better query performance
     __table_args__ = (
         Index('idx_status_priority', 'status', 'priority'),
         Index('idx_category_status', 'category', 'status'),
         Index('idx_department_status', 'assigned_department', 'status'),
         Index('idx_assigned_status', 'assigned_officer', 'status'),
+        # Ids of archived complaints are never handed out again (see archive.py)
+        {'sqlite_autoincrement': True},
     )
 
     def get_status_history(self):
@@ -76,7 +83,7 @@ class Complaint(db.Model):
     def add_status_update(self, updated_by, old_status, new_status, note=None):
         """Add a new status update to the timeline"""
         update = StatusUpdate(
-            complaint_id=self.id,
+            complaint=self,
             updated_by=updated_by,
             old_status=old_status,
             new_status=new_status,
@@ -105,14 +112,703 @@ class StatusUpdate(db.Model):
     note = db.Column(db.Text, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
+    # Ids only ever grow, even after the newest rows are archived (see projections.py)
+    __table_args__ = {'sqlite_autoincrement': True}
+
     def __repr__(self):
         return f'<StatusUpdate {self.id}: {self.old_status} -> {self.new_status}>'
 
+class ArchivedComplaint(db.Model):
+    """Closed complaint moved out of the hot complaints table (see archive.py)"""
+    __tablename__ = 'complaints_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    assigned_department = db.Column(CodedString('department'), nullable=True)
+    assigned_officer = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    category = db.Column(CodedString('category'), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    address = db.Column(db.String(255), nullable=False)
+    landmark = db.Column(db.String(255), nullable=True)
+    image_filename = db.Column(db.String(255), nullable=True)
+    status = db.Column(CodedString('status'))
+    priority = db.Column(CodedString('priority'))
+    resolution_notes = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, index=True)
+    updated_at = db.Column(db.DateTime)
+    resolved_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    user = db.relationship('User', foreign_keys=[user_id])
+    assigned_officer_rel = db.relationship('User', foreign_keys=[assigned_officer])
+    status_updates = db.relationship('ArchivedStatusUpdate', backref='complaint', lazy=True)
+
+    is_archived = True
+
+    def get_status_history(self):
+        """Return all archived status updates ordered by timestamp"""
+        return ArchivedStatusUpdate.query.filter_by(complaint_id=self.id)\
+            .order_by(ArchivedStatusUpdate.timestamp.desc()).all()
+
+    def __repr__(self):
+        return f'<ArchivedComplaint {self.id}: {self.category}>'
+
+class ArchivedStatusUpdate(db.Model):
+    __tablename__ = 'status_updates_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    complaint_id = db.Column(db.Integer, db.ForeignKey('complaints_archive.id'), nullable=False, index=True)
+    updated_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    old_status = db.Column(db.String(20), nullable=True)
+    new_status = db.Column(db.String(20), nullable=False)
+    note = db.Column(db.Text, nullable=True)
+    timestamp = db.Column(db.DateTime)
+
+    updater = db.relationship('User', foreign_keys=[updated_by])
+
+    def __repr__(self):
+        return f'<ArchivedStatusUpdate {self.id}: {self.old_status} -> {self.new_status}>'
+
+class ImportCheckpoint(db.Model):
+    """Progress of a bulk import, committed together with each imported chunk"""
+    __tablename__ = 'import_checkpoints'
+
+    source = db.Column(db.String(255), primary_key=True)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    inserted = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Boolean, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ImportCheckpoint {self.source}: {self.rows_done} rows>'
+
+class IntakeCheckpoint(db.Model):
+    """How far the intake writer has filed one local intake queue (see intake.py).
+
+    Committed in the same transaction as the complaints it files, so a
+    submission is filed exactly once even if the writer crashes.
+    """
+    __tablename__ = 'intake_checkpoints'
+
+    queue_id = db.Column(db.String(32), primary_key=True)
+    # Id of the last intake submission filed
+    position = db.Column(db.Integer, nullable=False, default=0)
+    filed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<IntakeCheckpoint {self.queue_id}: {self.position}>'
+
+class ReferenceValue(db.Model):
+    """A category, department, status, priority or role (see reference.py).
+
+    ``code`` is the value's CodedString code. Admins can add categories and
+    departments; the other kinds follow the code.
+    """
+    __tablename__ = 'reference_values'
+
+    kind = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.String(50), primary_key=True)
+    code = db.Column(db.Integer, nullable=False)
+    label = db.Column(db.String(100), nullable=False)
+    # Department complaints of a category are assigned to
+    department = db.Column(db.String(50), nullable=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'code', name='uq_reference_code'),
+    )
+
+    def __repr__(self):
+        return f'<ReferenceValue {self.kind}:{self.value}>'
+
+class ReferenceVersion(db.Model):
+    """Bumped by every change to reference_values, so workers know to reload them"""
+    __tablename__ = 'reference_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ReferenceVersion {self.version}>'
+
+class ProjectionCheckpoint(db.Model):
+    """How far a projection has read the status update log (see projections.py).
+
+    Committed together with the read model changes of each batch, and only
+    if ``position`` has not moved in the meantime, so two runners never
+    apply the same events twice.
+    """
+    __tablename__ = 'projection_checkpoints'
+
+    name = db.Column(db.String(50), primary_key=True)
+    # Id of the last status update applied
+    position = db.Column(db.Integer, nullable=False, default=0)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    events = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    rebuilt_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ProjectionCheckpoint {self.name}: {self.position}>'
+
+class DepartmentQueueEntry(db.Model):
+    """An open complaint waiting in its department's queue (projection)"""
+    __tablename__ = 'projection_department_queue'
+
+    complaint_id = db.Column(db.Integer, primary_key=True)
+    department = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    queued_at = db.Column(db.DateTime, nullable=False)
+    last_event_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('idx_department_queue', 'department', 'status', 'queued_at'),
+    )
+
+    def __repr__(self):
+        return f'<DepartmentQueueEntry {self.department}: {self.complaint_id} ({self.status})>'
+
+class CitizenSummary(db.Model):
+    """A citizen's complaints per current status, archive included (projection)"""
+    __tablename__ = 'projection_citizen_summaries'
+
+    user_id = db.Column(db.Integer, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    submitted = db.Column(db.Integer, nullable=False, default=0)
+    in_progress = db.Column(db.Integer, nullable=False, default=0)
+    resolved = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    last_activity_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<CitizenSummary {self.user_id}: {self.total}>'
+
+class ComplaintLifecycle(db.Model):
+    """When a complaint was submitted, started and closed (projection)"""
+    __tablename__ = 'projection_lifecycles'
+
+    complaint_id = db.Column(db.Integer, primary_key=True)
+    department = db.Column(db.String(50), nullable=True, index=True)
+    status = db.Column(db.String(20), nullable=False)
+    submitted_at = db.Column(db.DateTime, nullable=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    closed_at = db.Column(db.DateTime, nullable=True)
+    reopened = db.Column(db.Integer, nullable=False, default=0)
+    # Status changes, and timeline notes that leave the status as it was
+    transitions = db.Column(db.Integer, nullable=False, default=0)
+    notes = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ComplaintLifecycle {self.complaint_id}: {self.status}>'
+
+class OpenComplaintCount(db.Model):
+    """Number of open complaints per department, status, assignment and creation day.
+
+    Maintained in the same transaction as the complaint changes (see
+    adjust_open_counts) so monitoring can report the backlog without
+    counting the complaints table.
+    """
+    __tablename__ = 'open_complaint_counts'
+
+    department = db.Column(db.String(50), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    assigned = db.Column(db.Boolean, primary_key=True)
+    created_day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<OpenComplaintCount {self.department}/{self.status}: {self.count}>'
+
+class ComplaintLocality(db.Model):
+    """Normalised locality of a complaint's address (see addresses.py), for lookups by locality"""
+    __tablename__ = 'complaint_localities'
+
+    complaint_id = db.Column(db.Integer, db.ForeignKey('complaints.id'), primary_key=True)
+    locality = db.Column(db.String(120), nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<ComplaintLocality {self.complaint_id}: {self.locality}>'
+
+class HotspotBucket(db.Model):
+    """Number of complaints per locality, category and creation hour.
+
+    Maintained in the same transaction as the complaint changes (see
+    adjust_hotspot_counts); hotspots.py sums the buckets of a time window
+    instead of grouping the complaints by address.
+    """
+    __tablename__ = 'hotspot_buckets'
+
+    locality = db.Column(db.String(120), primary_key=True)
+    category = db.Column(db.String(30), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('idx_hotspot_buckets_hour', 'hour'),
+    )
+
+    def __repr__(self):
+        return f'<HotspotBucket {self.locality}/{self.category} {self.hour}: {self.count}>'
+
+class AnomalyState(db.Model):
+    """Running statistics of hourly submissions per category and locality (see anomalies.py).
+
+    ``count`` is the number of complaints in ``hour`` so far. ``mean`` and
+    ``variance`` are exponentially weighted over the hours before it, so
+    each new complaint updates one row instead of reading the history.
+    """
+    __tablename__ = 'anomaly_states'
+
+    category = db.Column(db.String(30), primary_key=True)
+    locality = db.Column(db.String(120), primary_key=True)
+    hour = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    mean = db.Column(db.Float, nullable=False, default=0.0)
+    variance = db.Column(db.Float, nullable=False, default=0.0)
+    # Completed hours folded into mean and variance
+    hours = db.Column(db.Integer, nullable=False, default=0)
+    alerted_hour = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<AnomalyState {self.category}/{self.locality} {self.hour}: {self.count}>'
+
+class AnomalyAlert(db.Model):
+    """A burst of one category of complaints from one locality"""
+    __tablename__ = 'anomaly_alerts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(30), nullable=False)
+    locality = db.Column(db.String(120), nullable=False)
+    department = db.Column(db.String(50), nullable=True)
+    hour = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    expected = db.Column(db.Float, nullable=False)
+    z_score = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('category', 'locality', 'hour', name='uq_anomaly_alert_hour'),
+    )
+
+    def __repr__(self):
+        return f'<AnomalyAlert {self.category}/{self.locality} {self.hour}: {self.count}>'
+
+class ComplaintForecast(db.Model):
+    """Expected new complaints per department, category and day (see forecasting.py).
+
+    Replaced as a whole by every forecast run, so all workers show the same
+    numbers without fitting anything themselves.
+    """
+    __tablename__ = 'complaint_forecasts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    department = db.Column(db.String(50), nullable=False)
+    category = db.Column(db.String(30), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    expected = db.Column(db.Float, nullable=False)
+    low = db.Column(db.Float, nullable=False)
+    high = db.Column(db.Float, nullable=False)
+    model = db.Column(db.String(20), nullable=False)
+    generated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('department', 'category', 'day', name='uq_forecast_series_day'),
+    )
+
+    def __repr__(self):
+        return f'<ComplaintForecast {self.department}/{self.category} {self.day}: {self.expected:.1f}>'
+
+class ReportSnapshot(db.Model):
+    """A standard report file generated off-peak (see snapshots.py).
+
+    One per period, department, format and date range. The file lives in
+    SNAPSHOT_DIR and is served as is, with its SHA-256 as the ETag.
+    """
+    __tablename__ = 'report_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(20), nullable=False)
+    # 'all' for the report over every department
+    department = db.Column(db.String(50), nullable=False)
+    export_format = db.Column(db.String(10), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    filename = db.Column(db.String(200), nullable=False)
+    download_name = db.Column(db.String(200), nullable=False)
+    mimetype = db.Column(db.String(100), nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    rows = db.Column(db.Integer, nullable=False)
+    generated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('period', 'department', 'export_format', 'start_date', name='uq_report_snapshot'),
+    )
+
+    def __repr__(self):
+        return f'<ReportSnapshot {self.period}/{self.department} {self.start_date} {self.export_format}>'
+
+class NotificationOutbox(db.Model):
+    """A notification waiting to be delivered (see notifications.py).
+
+    Written in the same transaction as the change it reports, so a
+    notification exists exactly when the change was committed. The
+    dispatcher delivers pending rows in digests per department and
+    recipient, retrying with backoff until NOTIFY_MAX_ATTEMPTS.
+    """
+    __tablename__ = 'notification_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Same notification enqueued twice (e.g. a double-clicked button) is stored once
+    dedupe_key = db.Column(db.String(200), unique=True, nullable=False)
+    kind = db.Column(db.String(40), nullable=False)
+    department = db.Column(db.String(50), nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+    complaint_id = db.Column(db.Integer, nullable=True)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Set while a dispatcher holds the row, so two dispatchers never send it twice
+    claim_token = db.Column(db.String(32), nullable=True, index=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    digest_id = db.Column(db.String(40), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<NotificationOutbox {self.id}: {self.kind} to {self.recipient} ({self.status})>'
+
+class Job(db.Model):
+    """A unit of background work (see jobs.py).
+
+    Views enqueue jobs and return at once; run_jobs.py workers claim them
+    by priority, hold them for visibility_timeout seconds and retry
+    failures with backoff until max_attempts.
+    """
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    # Higher runs first
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # The same request enqueued twice (e.g. a double-clicked button) gets one job
+    idempotency_key = db.Column(db.String(200), unique=True, nullable=True)
+    # Set while a worker holds the job; once locked_until passes, a crashed
+    # worker's job is taken again
+    claim_token = db.Column(db.String(32), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    visibility_timeout = db.Column(db.Integer, nullable=False)
+    result = db.Column(db.Text, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_jobs_due', 'status', 'priority', 'run_at'),
+    )
+
+    def __repr__(self):
+        return f'<Job {self.id}: {self.name} ({self.status})>'
+
+# Inserts that concurrent writers can race on. SQLite and PostgreSQL settle
+# the race with INSERT ... ON CONFLICT; other databases check first.
+def conflict_insert(connection):
+    """The dialect's insert() with ON CONFLICT support, or None"""
+    if connection.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert
+
+def key_clause(table, row, keys):
+    return [table.c[key] == row[key] for key in keys]
+
+def insert_ignore(connection, table, rows, keys):
+    """Insert the rows (a dict or a list of them) whose ``keys`` are not in the table yet.
+
+    Returns how many were inserted; rows a concurrent writer got in first are skipped.
+    """
+    insert = conflict_insert(connection)
+    if insert is not None:
+        statement = insert(table).on_conflict_do_nothing(index_elements=[table.c[key] for key in keys])
+        return connection.execute(statement, rows).rowcount
+    inserted = 0
+    for row in [rows] if isinstance(rows, dict) else rows:
+        if connection.execute(select(table.c[keys[0]]).where(*key_clause(table, row, keys))).first() is None:
+            connection.execute(table.insert(), row)
+            inserted += 1
+    return inserted
+
+def insert_or_increment(connection, table, rows, keys, column='count'):
+    """Add each row's ``column`` to the row with the same ``keys``, inserting the rows that are missing"""
+    insert = conflict_insert(connection)
+    if insert is not None:
+        statement = insert(table)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c[key] for key in keys],
+            set_={column: table.c[column] + statement.excluded[column]},
+        ), rows)
+        return
+    for row in rows:
+        updated = connection.execute(
+            table.update().where(*key_clause(table, row, keys)).values({column: table.c[column] + row[column]})
+        ).rowcount
+        if not updated:
+            connection.execute(table.insert().values(**row))
+
+# Helper functions for the maintained open complaint counts
+OPEN_STATUSES = ('submitted', 'in_progress')
+COUNTED_COLUMNS = ('assigned_department', 'status', 'assigned_officer', 'created_at')
+
+def open_count_key(department, status, assigned_officer, created_at):
+    """Counter row a complaint belongs to, or None if it is closed"""
+    if status not in OPEN_STATUSES:
+        return None
+    return (department or '', status, assigned_officer is not None, (created_at or datetime.utcnow()).date())
+
+def add_delta(deltas, key, amount):
+    if key is not None:
+        deltas[key] = deltas.get(key, 0) + amount
+
+def adjust_open_counts(connection, deltas):
+    """Add {key: delta} to the open complaint counts on the given connection"""
+    rows = [{'department': department, 'status': status, 'assigned': assigned,
+             'created_day': created_day, 'count': delta}
+            for (department, status, assigned, created_day), delta in deltas.items() if delta]
+    if not rows:
+        return
+
+    insert_or_increment(connection, OpenComplaintCount.__table__, rows,
+                        ['department', 'status', 'assigned', 'created_day'])
+
+def rebuild_open_counts(connection):
+    """Recount the open complaints from scratch, e.g. after changes made outside the app"""
+    complaints = Complaint.__table__
+    deltas = {}
+    result = connection.execute(
+        select(complaints.c.assigned_department, complaints.c.status,
+               complaints.c.assigned_officer, complaints.c.created_at)
+        .where(complaints.c.status.in_(OPEN_STATUSES))
+    )
+    for row in result:
+        add_delta(deltas, open_count_key(*row), 1)
+
+    connection.execute(OpenComplaintCount.__table__.delete())
+    adjust_open_counts(connection, deltas)
+    return sum(deltas.values())
+
+@event.listens_for(Session, 'before_flush')
+def collect_open_count_changes(session, flush_context, instances):
+    """Work out how pending complaint changes move the open complaint counts"""
+    deltas = {}
+    for complaint in session.new:
+        if isinstance(complaint, Complaint):
+            add_delta(deltas, open_count_key(complaint.assigned_department, complaint.status or 'submitted',
+                                             complaint.assigned_officer, complaint.created_at), 1)
+
+    for complaint in list(session.dirty) + list(session.deleted):
+        if not isinstance(complaint, Complaint):
+            continue
+        state = inspect(complaint)
+        histories = [state.attrs[name].history for name in COUNTED_COLUMNS]
+        if complaint not in session.deleted and not any(history.added for history in histories):
+            continue
+
+        old = []
+        for name, history in zip(COUNTED_COLUMNS, histories):
+            if history.deleted:
+                old.append(history.deleted[0])
+            elif history.unchanged:
+                old.append(history.unchanged[0])
+            else:
+                old = None
+                break
+        if old is None:
+            # The previous value was never loaded; read it before it is overwritten
+            complaints = Complaint.__table__
+            with session.no_autoflush:
+                old = session.connection().execute(
+                    select(*[complaints.c[name] for name in COUNTED_COLUMNS])
+                    .where(complaints.c.id == complaint.id)
+                ).one()
+        add_delta(deltas, open_count_key(*old), -1)
+
+        if complaint not in session.deleted:
+            add_delta(deltas, open_count_key(complaint.assigned_department, complaint.status,
+                                             complaint.assigned_officer, complaint.created_at), 1)
+
+    session.info['open_count_deltas'] = deltas
+
+@event.listens_for(Session, 'after_flush')
+def apply_open_count_changes(session, flush_context):
+    deltas = session.info.pop('open_count_deltas', None)
+    if deltas:
+        adjust_open_counts(session.connection(), deltas)
+
+# Helper functions for the maintained hotspot counts
+HOTSPOT_COLUMNS = ('address', 'category', 'created_at')
+
+def hotspot_key(address, category, created_at):
+    """Hotspot bucket a complaint is counted in"""
+    return (locality_key(address), category, (created_at or datetime.utcnow()).replace(minute=0, second=0,
+                                                                                       microsecond=0))
+
+def adjust_hotspot_counts(connection, deltas, localities=None):
+    """Add {key: delta} to the hotspot buckets and record {complaint_id: locality} on the given connection"""
+    if localities:
+        table = ComplaintLocality.__table__
+        connection.execute(table.delete().where(table.c.complaint_id.in_(list(localities))))
+        connection.execute(table.insert(), [{'complaint_id': complaint_id, 'locality': locality}
+                                            for complaint_id, locality in localities.items()])
+
+    rows = [{'locality': locality, 'category': category, 'hour': hour, 'count': delta}
+            for (locality, category, hour), delta in deltas.items() if delta]
+    if not rows:
+        return
+
+    insert_or_increment(connection, HotspotBucket.__table__, rows, ['locality', 'category', 'hour'])
+
+def rebuild_hotspot_counts(connection):
+    """Recompute localities and hotspot buckets from scratch, e.g. for complaints added before them"""
+    complaints = Complaint.__table__
+    deltas = {}
+    localities = {}
+    for complaint_id, address, category, created_at in connection.execute(
+        select(complaints.c.id, complaints.c.address, complaints.c.category, complaints.c.created_at)
+    ):
+        key = hotspot_key(address, category, created_at)
+        add_delta(deltas, key, 1)
+        localities[complaint_id] = key[0]
+
+    connection.execute(ComplaintLocality.__table__.delete())
+    connection.execute(HotspotBucket.__table__.delete())
+    adjust_hotspot_counts(connection, deltas, localities)
+    return len(localities)
+
+@event.listens_for(Session, 'before_flush')
+def collect_hotspot_changes(session, flush_context, instances):
+    """Work out how pending address and category changes move the hotspot counts"""
+    deltas = {}
+    localities = {}
+    for complaint in list(session.dirty) + list(session.deleted):
+        if not isinstance(complaint, Complaint):
+            continue
+        state = inspect(complaint)
+        histories = [state.attrs[name].history for name in HOTSPOT_COLUMNS]
+        if complaint not in session.deleted and not any(history.added for history in histories):
+            continue
+
+        old = []
+        for history in histories:
+            if history.deleted:
+                old.append(history.deleted[0])
+            elif history.unchanged:
+                old.append(history.unchanged[0])
+            else:
+                old = None
+                break
+        if old is None:
+            # The previous value was never loaded; read it before it is overwritten
+            complaints = Complaint.__table__
+            with session.no_autoflush:
+                old = session.connection().execute(
+                    select(*[complaints.c[name] for name in HOTSPOT_COLUMNS])
+                    .where(complaints.c.id == complaint.id)
+                ).one()
+        add_delta(deltas, hotspot_key(*old), -1)
+
+        if complaint in session.deleted:
+            # Must go before the complaint row it refers to
+            table = ComplaintLocality.__table__
+            session.connection().execute(table.delete().where(table.c.complaint_id == complaint.id))
+        else:
+            key = hotspot_key(complaint.address, complaint.category, complaint.created_at)
+            add_delta(deltas, key, 1)
+            localities[complaint.id] = key[0]
+
+    # New complaints are counted after the flush, once they have an id
+    session.info['hotspot_changes'] = (deltas, localities)
+
+@event.listens_for(Session, 'after_flush')
+def apply_hotspot_changes(session, flush_context):
+    deltas, localities = session.info.pop('hotspot_changes', ({}, {}))
+    for complaint in session.new:
+        if isinstance(complaint, Complaint):
+            key = hotspot_key(complaint.address, complaint.category, complaint.created_at)
+            add_delta(deltas, key, 1)
+            localities[complaint.id] = key[0]
+    if deltas or localities:
+        adjust_hotspot_counts(session.connection(), deltas, localities)
+
+# Helper functions for status changes
+def bulk_update_status(complaints, new_status, updated_by, note=None):
+    """Apply one status change to many complaints with set-based statements.
+
+    ``complaints`` is a list of (id, old_status) pairs. Mirrors
+    Complaint.add_status_update and edit_complaint: timestamps are bumped,
+    resolved_at is set on resolution and resolution notes are cleared when
+    moving to any other status. The caller commits.
+    """
+    if not complaints:
+        return 0
+
+    now = datetime.utcnow()
+    complaint_ids = [complaint_id for complaint_id, _ in complaints]
+    values = {'status': new_status, 'updated_at': now}
+    if new_status == 'resolved':
+        values['resolved_at'] = now
+    else:
+        values['resolution_notes'] = None
+
+    table = Complaint.__table__
+    old_statuses = dict(complaints)
+    deltas = {}
+    for complaint_id, department, officer, created_at in db.session.execute(
+        select(table.c.id, table.c.assigned_department, table.c.assigned_officer, table.c.created_at)
+        .where(table.c.id.in_(complaint_ids))
+    ):
+        add_delta(deltas, open_count_key(department, old_statuses[complaint_id], officer, created_at), -1)
+        add_delta(deltas, open_count_key(department, new_status, officer, created_at), 1)
+
+    db.session.execute(table.update().where(table.c.id.in_(complaint_ids)).values(**values))
+    adjust_open_counts(db.session.connection(), deltas)
+    db.session.execute(StatusUpdate.__table__.insert(), [{
+        'complaint_id': complaint_id,
+        'updated_by': updated_by,
+        'old_status': old_status,
+        'new_status': new_status,
+        'note': note,
+        'timestamp': now,
+    } for complaint_id, old_status in complaints])
+
+    return len(complaints)
+
 # Helper functions for auto-assignment
 def get_auto_assignment_department(category):
     """Get department for a given complaint category"""
-    from config import Config
-    return Config.CATEGORY_DEPARTMENT_MAP.get(category, 'general')
+    from reference import get_reference_data
+    return get_reference_data().department_for(category)
 
 def find_best_officer_for_assignment(department):
     """Find the municipal officer with the fewest active complaints in a department"""
@@ -143,3 +839,16 @@ def find_best_officer_for_assignment(department):
 
     # Return officer with fewest active complaints
     return min(officer_counts, key=lambda x: x[1])[0]
+
+# Helper functions for database connections
+def install_sqlite_pragmas(engine, pragmas):
+    """Run the given PRAGMA statements on every new SQLite connection"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
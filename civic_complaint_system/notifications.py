@@ -0,0 +1,243 @@
+"""Department notifications through a transactional outbox.
+
+Views add NotificationOutbox rows in the same transaction as the change
+they report, so a notification exists exactly when that change was
+committed. A dispatcher process delivers them:
+
+    python dispatch_notifications.py            # keep dispatching
+    python dispatch_notifications.py --once     # one pass, e.g. from cron
+
+Each pass claims due rows, groups them by department and recipient, and
+sends every group as one digest through the channel named by
+NOTIFY_CHANNEL. The built-in channels are 'file' (JSON lines, for
+development), 'smtp' (e.g. a local debug server on port 1025) and
+'webhook'. register_channel adds others.
+
+A failed digest is retried with exponential backoff. After
+NOTIFY_MAX_ATTEMPTS failures its rows are marked dead. Delivery is at
+least once. Every digest carries an id derived from its rows, so a
+receiver can drop a repeat if a dispatcher dies between sending and
+recording it.
+"""
+import hashlib
+import json
+import os
+import random
+import smtplib
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from urllib.request import Request, urlopen
+from flask import current_app
+from sqlalchemy import or_, select
+from models import db, NotificationOutbox, User, insert_ignore
+
+# Channels
+
+class FileChannel:
+    """Appends each digest to a JSON-lines file"""
+
+    def __init__(self, config):
+        self.path = config['NOTIFY_FILE_PATH']
+
+    def send(self, digest):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(digest, default=str) + '\n')
+
+class SmtpChannel:
+    """Sends each digest as a plain-text email"""
+
+    def __init__(self, config):
+        self.host = config['NOTIFY_SMTP_HOST']
+        self.port = config['NOTIFY_SMTP_PORT']
+        self.sender = config['NOTIFY_MAIL_FROM']
+        self.timeout = config['NOTIFY_TIMEOUT']
+
+    def send(self, digest):
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = digest['recipient']
+        message['Subject'] = digest['subject']
+        message['Message-ID'] = f"<{digest['digest_id']}@civic-complaints>"
+        message.set_content(digest['text'])
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.send_message(message)
+
+class WebhookChannel:
+    """POSTs each digest as JSON; any non-2xx answer counts as a failure"""
+
+    def __init__(self, config):
+        self.url = config['NOTIFY_WEBHOOK_URL']
+        self.timeout = config['NOTIFY_TIMEOUT']
+
+    def send(self, digest):
+        request = Request(self.url, data=json.dumps(digest, default=str).encode(), method='POST',
+                          headers={'Content-Type': 'application/json', 'Idempotency-Key': digest['digest_id']})
+        with urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+CHANNELS = {'file': FileChannel, 'smtp': SmtpChannel, 'webhook': WebhookChannel}
+
+def register_channel(name, channel_class):
+    """Make a channel available as NOTIFY_CHANNEL=<name>; it gets app.config and has send(digest)"""
+    CHANNELS[name] = channel_class
+
+def get_channel(config=None):
+    config = config or current_app.config
+    name = config['NOTIFY_CHANNEL']
+    if name not in CHANNELS:
+        raise ValueError(f"Unknown NOTIFY_CHANNEL {name!r}; available: {', '.join(CHANNELS)}")
+    return CHANNELS[name](config)
+
+# Enqueueing
+
+def enqueue_notification(kind, department, recipient, payload, dedupe_key, complaint_id=None):
+    """Add a notification to the outbox in the current transaction.
+
+    Returns False if one with the same dedupe key already exists.
+    """
+    table = NotificationOutbox.__table__
+    now = datetime.utcnow()
+    row = {'dedupe_key': dedupe_key, 'kind': kind, 'department': department, 'recipient': recipient,
+           'complaint_id': complaint_id, 'payload': json.dumps(payload, default=str), 'status': 'pending',
+           'attempts': 0, 'next_attempt_at': now, 'created_at': now}
+
+    return insert_ignore(db.session.connection(), table, row, ['dedupe_key']) > 0
+
+def department_officers(department):
+    """Active officers who receive a department's notifications"""
+    return User.query.filter_by(role='municipal', department=department, is_active=True).all()
+
+def notify_department_officers(complaint, officers, requested_by, note=None):
+    """Queue a pending-work reminder about a complaint for the given officers.
+
+    At most one reminder per complaint and officer per day. Returns the
+    number of reminders queued.
+    """
+    payload = {
+        'complaint_id': complaint.id,
+        'category': complaint.category,
+        'priority': complaint.priority,
+        'status': complaint.status,
+        'address': complaint.address,
+        'created_at': complaint.created_at,
+        'requested_by': requested_by.name,
+        'note': note,
+    }
+    today = datetime.utcnow().date().isoformat()
+    return sum(enqueue_notification('department_reminder', complaint.assigned_department, officer.email, payload,
+                                    f'department_reminder:{complaint.id}:{officer.id}:{today}', complaint.id)
+               for officer in officers)
+
+# Dispatching
+
+def retry_delay(attempts, base, cap):
+    """Exponential backoff with jitter, so failed digests don't retry in lockstep"""
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+def claim_due(limit, lease_seconds):
+    """Take up to ``limit`` due notifications for this dispatcher, oldest first"""
+    table = NotificationOutbox.__table__
+    now = datetime.utcnow()
+    free = or_(table.c.locked_until.is_(None), table.c.locked_until < now)
+    ids = db.session.execute(
+        select(table.c.id)
+        .where(table.c.status == 'pending', table.c.next_attempt_at <= now, free)
+        .order_by(table.c.id).limit(limit)
+    ).scalars().all()
+    if not ids:
+        return []
+
+    # Rows another dispatcher claimed in the meantime no longer match ``free``
+    token = uuid.uuid4().hex
+    db.session.execute(table.update().where(table.c.id.in_(ids), free)
+                       .values(claim_token=token, locked_until=now + timedelta(seconds=lease_seconds)))
+    db.session.commit()
+    # Plain rows: ORM objects would be expired, and reloaded one by one, by every digest's commit
+    return db.session.execute(
+        select(table.c.id, table.c.kind, table.c.department, table.c.recipient, table.c.payload, table.c.attempts)
+        .where(table.c.claim_token == token).order_by(table.c.id)
+    ).all()
+
+def describe_item(item):
+    """One digest line for a notification payload"""
+    if item['kind'] == 'complaint_spike':
+        return (f"Spike: {item['count']} {item['category']} complaints from {item['locality']} "
+                f"since {item['hour']} (usually {item['expected']:.1f} an hour)")
+    return (f"#{item['complaint_id']} [{item['priority']}] {item['category']} at {item['address']} "
+            f"({item['status']}), requested by {item['requested_by']}"
+            + (f": {item['note']}" if item.get('note') else ''))
+
+def build_digest(department, recipient, notifications):
+    """One message covering several notifications for the same recipient"""
+    items = [dict(json.loads(notification.payload), kind=notification.kind) for notification in notifications]
+    digest_id = hashlib.sha1(','.join(str(n.id) for n in notifications).encode()).hexdigest()
+    count = len(items)
+    subject = f"{count} complaint{'s need' if count != 1 else ' needs'} attention in the {department} department"
+    if any(item['kind'] == 'complaint_spike' for item in items):
+        subject = f'Complaint spike: {subject}'
+    lines = [describe_item(item) for item in items]
+    return {
+        'digest_id': digest_id,
+        'department': department,
+        'recipient': recipient,
+        'subject': subject,
+        'text': '\n'.join(lines),
+        'items': items,
+    }
+
+def dispatch_once(channel=None, batch_size=None):
+    """Deliver one batch of due notifications as digests.
+
+    Returns counts of notifications sent, scheduled for retry and given
+    up on, and of digests sent.
+    """
+    config = current_app.config
+    channel = channel or get_channel(config)
+    batch_size = batch_size or config['NOTIFY_BATCH_SIZE']
+    stats = {'claimed': 0, 'digests': 0, 'sent': 0, 'retrying': 0, 'dead': 0}
+    table = NotificationOutbox.__table__
+
+    notifications = claim_due(batch_size, config['NOTIFY_LEASE_SECONDS'])
+    stats['claimed'] = len(notifications)
+    groups = {}
+    for notification in notifications:
+        groups.setdefault((notification.department, notification.recipient), []).append(notification)
+
+    for (department, recipient), group in groups.items():
+        digest = build_digest(department, recipient, group)
+        try:
+            channel.send(digest)
+        except Exception as error:
+            now = datetime.utcnow()
+            for notification in group:
+                attempts = notification.attempts + 1
+                values = {'attempts': attempts, 'last_error': f'{type(error).__name__}: {error}'[:500],
+                          'claim_token': None, 'locked_until': None}
+                if attempts >= config['NOTIFY_MAX_ATTEMPTS']:
+                    values['status'] = 'dead'
+                    stats['dead'] += 1
+                else:
+                    values['next_attempt_at'] = now + timedelta(seconds=retry_delay(
+                        attempts, config['NOTIFY_RETRY_BASE_SECONDS'], config['NOTIFY_RETRY_MAX_SECONDS']))
+                    stats['retrying'] += 1
+                db.session.execute(table.update().where(table.c.id == notification.id).values(**values))
+            current_app.logger.warning('Notification digest to %s failed: %s', recipient, error)
+        else:
+            # One statement for the whole digest rather than one UPDATE per row
+            db.session.execute(
+                table.update().where(table.c.id.in_([notification.id for notification in group]))
+                .values(status='sent', sent_at=datetime.utcnow(), digest_id=digest['digest_id'],
+                        claim_token=None, locked_until=None))
+            stats['digests'] += 1
+            stats['sent'] += len(group)
+        db.session.commit()
+
+    return stats
+
+def outbox_counts():
+    """Notifications per outbox status"""
+    return dict(db.session.query(NotificationOutbox.status, db.func.count(NotificationOutbox.id))
+                .group_by(NotificationOutbox.status).all())
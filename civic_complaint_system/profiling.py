@@ -0,0 +1,169 @@
+"""On-demand profiling of single requests.
+
+A request is profiled when an admin adds ?_profile=1 to the URL, or when it
+carries an X-Profile-Token header signed with the app's SECRET_KEY (for
+pages that can't be opened as an admin, e.g. from curl):
+
+    python profiling.py token
+
+The request runs under cProfile, and self time is split between template
+rendering (Jinja), the database (SQLAlchemy and the driver), the app's own
+view code and the framework. Each profile is saved as a pstats file, with a
+JSON summary next to it, in PROFILE_DIR. Admins list and download them at
+/admin/profiles.
+
+Requests without the query parameter or header only pay for one dict
+lookup each in request.args and request.headers; cProfile and pstats are
+not even imported until the first profiled request.
+"""
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from flask import g, request
+from flask_login import current_user
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+TOKEN_HEADER = 'X-Profile-Token'
+QUERY_PARAMETER = '_profile'
+CATEGORIES = ('templates', 'database', 'view', 'framework')
+
+def token_serializer(secret_key):
+    return URLSafeTimedSerializer(secret_key, salt='request-profile')
+
+def make_profile_token(secret_key):
+    """Signed token that enables profiling through the X-Profile-Token header"""
+    return token_serializer(secret_key).dumps('profile')
+
+def valid_profile_token(secret_key, token, max_age):
+    try:
+        return token_serializer(secret_key).loads(token, max_age=max_age) == 'profile'
+    except BadSignature:
+        return False
+
+def categorise(filename, function_name):
+    """Which part of the request a function's self time belongs to"""
+    if filename.endswith('.html') or '/jinja2/' in filename or '/markupsafe/' in filename:
+        return 'templates'
+    if '/sqlalchemy/' in filename or '/flask_sqlalchemy/' in filename or 'sqlite3' in function_name \
+            or '/sqlite3/' in filename:
+        return 'database'
+    if filename.startswith(APP_ROOT) and '/site-packages/' not in filename:
+        return 'view'
+    return 'framework'
+
+def summarise_profile(stats, limit=25):
+    """Self time per category and the functions with the most cumulative time"""
+    breakdown = dict.fromkeys(CATEGORIES, 0.0)
+    functions = []
+    for (filename, line, name), (_, calls, self_time, cumulative, _) in stats.stats.items():
+        breakdown[categorise(filename, name)] += self_time
+        functions.append({
+            'function': name,
+            'location': f'{os.path.relpath(filename, APP_ROOT) if filename.startswith(APP_ROOT) else filename}:{line}',
+            'calls': calls,
+            'self_ms': round(self_time * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        })
+    functions.sort(key=lambda function: function['cumulative_ms'], reverse=True)
+    return {name: round(seconds * 1000, 3) for name, seconds in breakdown.items()}, functions[:limit]
+
+def list_profiles(directory):
+    """Summaries of the saved profiles, newest first"""
+    if not directory or not os.path.isdir(directory):
+        return []
+    profiles = []
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda profile: profile['id'], reverse=True)
+
+def prune_profiles(directory, keep):
+    """Delete the oldest profiles beyond the newest ``keep``"""
+    for profile in list_profiles(directory)[keep:]:
+        for extension in ('.prof', '.json'):
+            path = os.path.join(directory, profile['id'] + extension)
+            if os.path.exists(path):
+                os.remove(path)
+
+def profiling_requested(app):
+    """True if this request asked to be profiled and is allowed to"""
+    if request.args.get(QUERY_PARAMETER):
+        return current_user.is_authenticated and current_user.is_admin()
+    token = request.headers.get(TOKEN_HEADER)
+    if token:
+        return valid_profile_token(app.config['SECRET_KEY'], token, app.config.get('PROFILE_TOKEN_MAX_AGE', 3600))
+    return False
+
+def init_profiling(app):
+    """Register the request hooks that start and save profiles"""
+    if not app.config.get('PROFILING_ENABLED', True):
+        return
+
+    @app.before_request
+    def start_profile():
+        if QUERY_PARAMETER not in request.args and TOKEN_HEADER not in request.headers:
+            return
+        if not profiling_requested(app):
+            return
+        import cProfile
+        g.profiler = cProfile.Profile()
+        g.profile_started = time.perf_counter()
+        g.profiler.enable()
+
+    @app.after_request
+    def save_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        duration_ms = (time.perf_counter() - g.pop('profile_started')) * 1000
+
+        directory = app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        endpoint = request.endpoint or 'unmatched'
+        profile_id = f"{datetime.utcnow():%Y%m%d%H%M%S%f}_{re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)}"
+        profiler.dump_stats(os.path.join(directory, profile_id + '.prof'))
+
+        import pstats
+        breakdown, functions = summarise_profile(pstats.Stats(profiler))
+        summary = {
+            'id': profile_id,
+            'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'user': current_user.email if current_user.is_authenticated else None,
+            'duration_ms': round(duration_ms, 2),
+            'breakdown_ms': breakdown,
+            'top_functions': functions,
+        }
+        with open(os.path.join(directory, profile_id + '.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+        prune_profiles(directory, app.config.get('PROFILE_MAX_FILES', 200))
+
+        response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    @app.teardown_request
+    def stop_unsaved_profile(exception):
+        # after_request is skipped when the view raises
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['token']:
+        sys.exit('Usage: python profiling.py token')
+    from config import config
+    app_config = config[os.environ.get('FLASK_ENV', 'default')]
+    print(make_profile_token(app_config.SECRET_KEY))
@@ -0,0 +1,402 @@
+"""Read models projected from the status update log.
+
+Status updates are only ever appended (archiving moves them to
+status_updates_archive with their ids), so their ids give every change
+to a complaint a sequence number. A projection reads the log in id order
+and maintains its own tables from it:
+
+- department_queue: the open complaints waiting in each department
+- citizen_summary: each citizen's complaints per current status
+- lifecycle: when each complaint was submitted, started and closed
+
+Timeline notes that keep the status (reassignments, department
+notifications) are events too; projections tell them apart by
+old_status == new_status.
+
+Each projection has a row in projection_checkpoints with the id of the
+last event it applied. A batch of events and the new position are
+committed together, and only if the position has not moved since the
+batch was read. Every commit is therefore a consistent snapshot of the
+read model that later runs continue from, and concurrent runners never
+apply an event twice. Reads catch up first, so they see every committed
+change.
+
+A projection whose ``version`` changed, or whose data is in doubt, is
+rebuilt from the whole log (archive included) in one transaction, with
+large batches:
+
+    python projections.py rebuild [name ...]
+    python projections.py run --follow      # keep the read models current
+
+On databases that hand out ids before commit (PostgreSQL), a transaction
+can commit after one with a later id. A gap in the ids followed by an
+event from the last PROJECTION_GAP_SECONDS is therefore waited for rather
+than skipped.
+"""
+import heapq
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select
+from models import (db, StatusUpdate, Complaint, ArchivedStatusUpdate, ArchivedComplaint, ProjectionCheckpoint,
+                    DepartmentQueueEntry, CitizenSummary, ComplaintLifecycle, insert_ignore)
+
+OPEN_STATUSES = ('submitted', 'in_progress')
+CLOSED_STATUSES = ('resolved', 'rejected')
+STATUSES = OPEN_STATUSES + CLOSED_STATUSES
+# Ids per IN (...) list
+CHUNK_SIZE = 500
+
+PROJECTIONS = {}
+
+def register_projection(projection_class):
+    """Class decorator adding a projection to the ones catch_up and rebuild run"""
+    PROJECTIONS[projection_class.name] = projection_class()
+    return projection_class
+
+def chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def load_rows(connection, table, ids):
+    """{id: row dict} for the rows of ``table`` whose primary key is in ``ids``"""
+    key = table.primary_key.columns.values()[0]
+    rows = {}
+    for chunk in chunks(ids):
+        for row in connection.execute(select(table).where(key.in_(chunk))):
+            rows[row._mapping[key.name]] = dict(row._mapping)
+    return rows
+
+def replace_rows(connection, table, ids, rows):
+    """Delete the rows with the given primary keys and insert ``rows`` in their place"""
+    key = table.primary_key.columns.values()[0]
+    for chunk in chunks(ids):
+        connection.execute(table.delete().where(key.in_(chunk)))
+    if rows:
+        connection.execute(table.insert(), rows)
+
+class Projection:
+    """A read model kept up to date from the status update log.
+
+    ``apply`` gets a batch of events, oldest first, and writes its changes
+    on the connection. ``tables`` are emptied before a rebuild. Bump
+    ``version`` when ``apply`` changes meaning; the next run rebuilds.
+    """
+    name = None
+    version = 1
+    tables = ()
+
+    def apply(self, connection, events):
+        raise NotImplementedError
+
+    def reset(self, connection):
+        for table in self.tables:
+            connection.execute(table.delete())
+
+@register_projection
+class DepartmentQueue(Projection):
+    name = 'department_queue'
+    tables = (DepartmentQueueEntry.__table__,)
+
+    def apply(self, connection, events):
+        table = DepartmentQueueEntry.__table__
+        entries = load_rows(connection, table, {event.complaint_id for event in events})
+        ids = set(entries)
+        for event in events:
+            ids.add(event.complaint_id)
+            entry = entries.get(event.complaint_id)
+            if event.new_status in OPEN_STATUSES:
+                if entry is None:
+                    # Submitted, or reopened: queued from now
+                    entry = entries[event.complaint_id] = {
+                        'complaint_id': event.complaint_id, 'department': event.department or 'unassigned',
+                        'queued_at': event.timestamp,
+                    }
+                entry.update(status=event.new_status, last_event_at=event.timestamp)
+            elif event.new_status in CLOSED_STATUSES:
+                entries[event.complaint_id] = None
+        replace_rows(connection, table, ids, [entry for entry in entries.values() if entry])
+
+@register_projection
+class CitizenSummaries(Projection):
+    name = 'citizen_summary'
+    tables = (CitizenSummary.__table__,)
+
+    def apply(self, connection, events):
+        table = CitizenSummary.__table__
+        summaries = load_rows(connection, table, {event.user_id for event in events})
+        for event in events:
+            summary = summaries.get(event.user_id)
+            if summary is None:
+                summary = summaries[event.user_id] = dict({status: 0 for status in STATUSES}, user_id=event.user_id,
+                                                          total=0, last_activity_at=None)
+            if event.old_status != event.new_status:
+                if event.old_status is None:
+                    summary['total'] += 1
+                elif event.old_status in STATUSES:
+                    summary[event.old_status] -= 1
+                if event.new_status in STATUSES:
+                    summary[event.new_status] += 1
+            if summary['last_activity_at'] is None or event.timestamp > summary['last_activity_at']:
+                summary['last_activity_at'] = event.timestamp
+        replace_rows(connection, table, summaries, list(summaries.values()))
+
+@register_projection
+class Lifecycles(Projection):
+    name = 'lifecycle'
+    tables = (ComplaintLifecycle.__table__,)
+
+    def apply(self, connection, events):
+        table = ComplaintLifecycle.__table__
+        lifecycles = load_rows(connection, table, {event.complaint_id for event in events})
+        for event in events:
+            lifecycle = lifecycles.get(event.complaint_id)
+            if lifecycle is None:
+                lifecycle = lifecycles[event.complaint_id] = {
+                    'complaint_id': event.complaint_id, 'department': event.department, 'status': event.new_status,
+                    'submitted_at': None, 'started_at': None, 'closed_at': None,
+                    'reopened': 0, 'transitions': 0, 'notes': 0,
+                }
+            if event.old_status == event.new_status:
+                lifecycle['notes'] += 1
+                continue
+            lifecycle['transitions'] += 1
+            if event.old_status is None:
+                lifecycle['submitted_at'] = event.timestamp
+            if event.new_status == 'in_progress' and lifecycle['started_at'] is None:
+                lifecycle['started_at'] = event.timestamp
+            if event.new_status in CLOSED_STATUSES:
+                lifecycle['closed_at'] = event.timestamp
+            elif event.old_status in CLOSED_STATUSES:
+                lifecycle['reopened'] += 1
+                lifecycle['closed_at'] = None
+            lifecycle['status'] = event.new_status
+        replace_rows(connection, table, lifecycles, list(lifecycles.values()))
+
+# Reading the log
+
+def log_query(updates, complaints, after, limit):
+    return (select(updates.c.id, updates.c.complaint_id, updates.c.old_status, updates.c.new_status,
+                   updates.c.timestamp, complaints.c.assigned_department.label('department'), complaints.c.user_id)
+            .select_from(updates.join(complaints, complaints.c.id == updates.c.complaint_id))
+            .where(updates.c.id > after).order_by(updates.c.id).limit(limit))
+
+def read_events(connection, after, limit):
+    """The next ``limit`` events after id ``after``, from the live and archived logs"""
+    live = connection.execute(log_query(StatusUpdate.__table__, Complaint.__table__, after, limit)).all()
+    archived = connection.execute(
+        log_query(ArchivedStatusUpdate.__table__, ArchivedComplaint.__table__, after, limit)).all()
+    if not archived:
+        return live
+    return list(heapq.merge(live, archived, key=lambda event: event.id))[:limit]
+
+def settled(events, after, connection, gap_seconds):
+    """The events up to the first gap in the ids that a running transaction may still fill"""
+    if connection.dialect.name == 'sqlite' or not gap_seconds:
+        return events  # one writer at a time: ids are committed in order
+    recent = datetime.utcnow() - timedelta(seconds=gap_seconds)
+    previous = after
+    for index, event in enumerate(events):
+        if event.id != previous + 1 and event.timestamp and event.timestamp > recent:
+            return events[:index]
+        previous = event.id
+    return events
+
+# Running projections
+
+def load_checkpoint(connection, projection):
+    """The projection's checkpoint row, and whether it was created just now"""
+    table = ProjectionCheckpoint.__table__
+    row = connection.execute(select(table).where(table.c.name == projection.name)).first()
+    if row is not None:
+        return row, False
+    # Two first reads at once must not both insert the row
+    row = {'name': projection.name, 'position': 0, 'version': projection.version, 'events': 0,
+           'updated_at': datetime.utcnow()}
+    created = insert_ignore(connection, table, row, ['name']) > 0
+    return connection.execute(select(table).where(table.c.name == projection.name)).one(), created
+
+def advance_checkpoint(connection, name, position, new_position, events, **values):
+    """Move the checkpoint on if it is still at ``position``; False if another runner moved it"""
+    table = ProjectionCheckpoint.__table__
+    return connection.execute(
+        table.update().where(table.c.name == name, table.c.position == position)
+        .values(position=new_position, events=table.c.events + events, updated_at=datetime.utcnow(), **values)
+    ).rowcount == 1
+
+def run_projection(projection, batch_size=None, gap_seconds=None):
+    """Apply the events after the projection's checkpoint; returns how many"""
+    config = current_app.config
+    batch_size = batch_size or config['PROJECTION_BATCH_SIZE']
+    gap_seconds = config['PROJECTION_GAP_SECONDS'] if gap_seconds is None else gap_seconds
+    checkpoint, created = load_checkpoint(db.session.connection(), projection)
+    if checkpoint.version != projection.version:
+        db.session.rollback()
+        return rebuild_projection(projection)
+
+    applied = 0
+    position = checkpoint.position
+    while True:
+        connection = db.session.connection()
+        events = settled(read_events(connection, position, batch_size), position, connection, gap_seconds)
+        if not events:
+            # Reads catch up before every page; committing with nothing to apply would expire
+            # everything the request has loaded and make each read a write transaction
+            if created:
+                db.session.commit()
+            return applied
+        projection.apply(connection, events)
+        if not advance_checkpoint(connection, projection.name, position, events[-1].id, len(events)):
+            # Another runner applied these events first; what it wrote stands
+            db.session.rollback()
+            return applied
+        db.session.commit()
+        applied += len(events)
+        position = events[-1].id
+        if len(events) < batch_size:
+            return applied
+
+def rebuild_projection(projection, batch_size=None):
+    """Recompute a projection from the whole log in one transaction; returns the number of events"""
+    batch_size = batch_size or current_app.config['PROJECTION_REBUILD_BATCH_SIZE']
+    connection = db.session.connection()
+    checkpoint, _ = load_checkpoint(connection, projection)
+    projection.reset(connection)
+
+    position = 0
+    applied = 0
+    while True:
+        events = read_events(connection, position, batch_size)
+        if not events:
+            break
+        projection.apply(connection, events)
+        position = events[-1].id
+        applied += len(events)
+
+    table = ProjectionCheckpoint.__table__
+    updated = connection.execute(
+        table.update().where(table.c.name == projection.name, table.c.position == checkpoint.position)
+        .values(position=position, version=projection.version, events=applied, updated_at=datetime.utcnow(),
+                rebuilt_at=datetime.utcnow())
+    ).rowcount
+    if updated != 1:
+        db.session.rollback()
+        raise RuntimeError(f'Projection {projection.name!r} advanced during its rebuild; run it again')
+    db.session.commit()
+    return applied
+
+def selected(names):
+    unknown = [name for name in names or () if name not in PROJECTIONS]
+    if unknown:
+        raise ValueError(f"Unknown projection {unknown[0]!r}; available: {', '.join(PROJECTIONS)}")
+    return [PROJECTIONS[name] for name in names] if names else list(PROJECTIONS.values())
+
+def catch_up(*names):
+    """Bring the named projections (default: all) up to date; returns {name: events applied}"""
+    return {projection.name: run_projection(projection) for projection in selected(names)}
+
+def rebuild(*names):
+    return {projection.name: rebuild_projection(projection) for projection in selected(names)}
+
+def projection_status():
+    """Each projection's checkpoint and how many events it is behind"""
+    latest = max(db.session.query(db.func.max(StatusUpdate.id)).scalar() or 0,
+                 db.session.query(db.func.max(ArchivedStatusUpdate.id)).scalar() or 0)
+    checkpoints = {checkpoint.name: checkpoint for checkpoint in ProjectionCheckpoint.query.all()}
+    status = []
+    for name, projection in PROJECTIONS.items():
+        checkpoint = checkpoints.get(name)
+        position = checkpoint.position if checkpoint else 0
+        status.append({
+            'name': name,
+            'position': position,
+            'behind': max(0, latest - position),
+            'events': checkpoint.events if checkpoint else 0,
+            'stale_version': checkpoint is not None and checkpoint.version != projection.version,
+            'updated_at': checkpoint.updated_at if checkpoint else None,
+            'rebuilt_at': checkpoint.rebuilt_at if checkpoint else None,
+        })
+    return status
+
+# Read models
+
+def citizen_summary(user_id):
+    """Counts of a citizen's complaints per status, archived ones included"""
+    catch_up('citizen_summary')
+    summary = db.session.get(CitizenSummary, user_id)
+    counts = {status: getattr(summary, status) if summary else 0 for status in STATUSES}
+    counts['total'] = summary.total if summary else 0
+    counts['open'] = counts['submitted'] + counts['in_progress']
+    return counts
+
+def department_queue(department):
+    """Open complaints waiting in a department, per status, and the longest wait"""
+    catch_up('department_queue')
+    rows = db.session.query(DepartmentQueueEntry.status, db.func.count(), db.func.min(DepartmentQueueEntry.queued_at))\
+        .filter(DepartmentQueueEntry.department == department)\
+        .group_by(DepartmentQueueEntry.status).all()
+    queue = {status: 0 for status in OPEN_STATUSES}
+    oldest = None
+    for status, count, queued_at in rows:
+        queue[status] = count
+        if queued_at is not None and (oldest is None or queued_at < oldest):
+            oldest = queued_at
+    queue['open'] = sum(queue[status] for status in OPEN_STATUSES)
+    queue['oldest_queued_at'] = oldest
+    return queue
+
+def lifecycle_durations():
+    """Median hours from submission to start and to closing, and reopen counts, per department"""
+    from sla import percentile
+
+    catch_up('lifecycle')
+    departments = {}
+    for department, submitted_at, started_at, closed_at, reopened in db.session.query(
+        ComplaintLifecycle.department, ComplaintLifecycle.submitted_at, ComplaintLifecycle.started_at,
+        ComplaintLifecycle.closed_at, ComplaintLifecycle.reopened,
+    ).filter(ComplaintLifecycle.submitted_at.isnot(None)):
+        entry = departments.setdefault(department or 'unassigned',
+                                       {'to_start': [], 'to_close': [], 'complaints': 0, 'reopened': 0})
+        entry['complaints'] += 1
+        entry['reopened'] += 1 if reopened else 0
+        if started_at is not None:
+            entry['to_start'].append((started_at - submitted_at).total_seconds() / 3600)
+        if closed_at is not None:
+            entry['to_close'].append((closed_at - submitted_at).total_seconds() / 3600)
+
+    return [{
+        'department': department,
+        'complaints': entry['complaints'],
+        'reopened': entry['reopened'],
+        'closed': len(entry['to_close']),
+        'hours_to_start': percentile(sorted(entry['to_start']), 0.5),
+        'hours_to_close': percentile(sorted(entry['to_close']), 0.5),
+    } for department, entry in sorted(departments.items())]
+
+if __name__ == '__main__':
+    import argparse
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Update or rebuild the status log projections')
+    parser.add_argument('command', choices=('run', 'rebuild'))
+    parser.add_argument('names', nargs='*', help=f"projections (default: all of {', '.join(PROJECTIONS)})")
+    parser.add_argument('--follow', action='store_true', help='with run: keep applying new events')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        if args.command == 'rebuild':
+            started = time.perf_counter()
+            for name, events in rebuild(*args.names).items():
+                print(f'Rebuilt {name} from {events} events')
+            print(f'Took {time.perf_counter() - started:.2f}s')
+        else:
+            while True:
+                for name, events in catch_up(*args.names).items():
+                    if events or not args.follow:
+                        print(f'{name}: applied {events} events')
+                if not args.follow:
+                    break
+                time.sleep(app.config['PROJECTION_POLL_SECONDS'])
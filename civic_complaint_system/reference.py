@@ -0,0 +1,201 @@
+"""Categories, departments, statuses, priorities and roles, loaded once per worker.
+
+The values, their display names and the department each category is
+assigned to live in the reference_values table, seeded on first use from
+the codes.py vocabularies and CATEGORY_DEPARTMENT_MAP. Admins can add and
+rename categories and departments on the Reference Data page without a
+deploy; statuses, priorities and roles are part of the workflow code and
+only their labels are stored.
+
+Each worker keeps one ReferenceData snapshot in app.extensions, so form
+validation, auto-assignment, filter dropdowns and the name filters are
+plain dict lookups. Every change bumps reference_version. A worker reads
+that single row at most every REFERENCE_CHECK_SECONDS and reloads the
+table when it has moved; the worker that made the change reloads at once.
+New values get the next free code of their kind, and their codes are
+registered with codes.py so CodedString columns can store them.
+"""
+import re
+import threading
+import time
+from flask import current_app
+from sqlalchemy import func, select, update
+import codes
+from models import db, ReferenceValue, ReferenceVersion, insert_ignore
+
+KINDS = ('category', 'department', 'status', 'priority', 'role')
+# Statuses, priorities and roles drive the workflow; only their labels can change
+EDITABLE_KINDS = ('category', 'department')
+
+# Seed data: value and label in display order
+DEFAULTS = {
+    'category': [
+        ('potholes', 'Potholes & Road Damage'),
+        ('streetlight', 'Street Light Issues'),
+        ('garbage', 'Garbage Collection'),
+        ('water_supply', 'Water Supply Issues'),
+        ('drainage', 'Drainage Problems'),
+        ('other', 'Other Issues'),
+    ],
+    'department': [
+        ('roads', 'Roads & Transportation'),
+        ('water', 'Water Supply & Drainage'),
+        ('sanitation', 'Sanitation & Waste Management'),
+        ('general', 'General Administration'),
+        ('administration', 'System Administration'),
+    ],
+    'status': [
+        ('submitted', 'Submitted'),
+        ('in_progress', 'In Progress'),
+        ('resolved', 'Resolved'),
+        ('rejected', 'Rejected'),
+    ],
+    'priority': [
+        ('high', 'High'),
+        ('medium', 'Medium'),
+        ('low', 'Low'),
+    ],
+    'role': [
+        ('citizen', 'Citizen'),
+        ('municipal', 'Municipal Officer'),
+        ('admin', 'Administrator'),
+    ],
+}
+
+VALUE_PATTERN = re.compile(r'^[a-z][a-z0-9_]{1,29}$')
+
+class ReferenceData:
+    """One version of the reference data; never changed once loaded"""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.labels = {kind: {} for kind in KINDS}
+        self.category_departments = {}
+        for row in sorted(rows, key=lambda r: (r.position, r.code)):
+            self.labels[row.kind][row.value] = row.label
+            if row.kind == 'category':
+                self.category_departments[row.value] = row.department
+        # value -> label, in display order
+        self.categories = self.labels['category']
+        self.departments = self.labels['department']
+        self.statuses = self.labels['status']
+        self.priorities = self.labels['priority']
+        self.roles = self.labels['role']
+
+    def label(self, kind, value):
+        """Display name of a value; unknown values are title-cased"""
+        label = self.labels[kind].get(value)
+        if label is None and value:
+            label = value.replace('_', ' ').title()
+        return label
+
+    def department_for(self, category):
+        """Department a new complaint of ``category`` is assigned to"""
+        return self.category_departments.get(category) or 'general'
+
+# Loading
+
+def current_version(connection):
+    return connection.execute(select(ReferenceVersion.version).where(ReferenceVersion.id == 1)).scalar()
+
+def seed_reference_data(connection):
+    """Insert the default values missing from the table, e.g. on a new database"""
+    category_departments = current_app.config['CATEGORY_DEPARTMENT_MAP']
+    rows = [{'kind': kind, 'value': value, 'code': codes.VOCABULARIES[kind][value], 'label': label,
+             'department': category_departments.get(value) if kind == 'category' else None,
+             'position': position}
+            for kind, values in DEFAULTS.items() for position, (value, label) in enumerate(values, 1)]
+    # Concurrent seeders insert each value once
+    insert_ignore(connection, ReferenceValue.__table__, rows, ['kind', 'value'])
+    insert_ignore(connection, ReferenceVersion.__table__, [{'id': 1, 'version': 1}], ['id'])
+
+def load_reference_data():
+    """Read the whole table, seeding it first if needed, and register any new codes"""
+    connection = db.session.connection()
+    version = current_version(connection)
+    if version is None:
+        seed_reference_data(connection)
+        db.session.commit()
+        connection = db.session.connection()
+        version = current_version(connection)
+    rows = connection.execute(select(ReferenceValue.__table__)).all()
+    for row in rows:
+        codes.register_value(row.kind, row.value, row.code)
+    return ReferenceData(version, rows)
+
+class RegistryState:
+    def __init__(self, data, checked_at):
+        self.data = data
+        self.checked_at = checked_at
+
+_lock = threading.Lock()
+
+def get_reference_data():
+    """This worker's reference data, reloaded if another worker changed it"""
+    state = current_app.extensions.get('reference_data')
+    now = time.monotonic()
+    if state is not None and now - state.checked_at < current_app.config['REFERENCE_CHECK_SECONDS']:
+        return state.data
+    with _lock:
+        state = current_app.extensions.get('reference_data')
+        if state is not None and now - state.checked_at < current_app.config['REFERENCE_CHECK_SECONDS']:
+            return state.data
+        if state is None or current_version(db.session.connection()) != state.data.version:
+            data = load_reference_data()
+        else:
+            data = state.data
+        current_app.extensions['reference_data'] = RegistryState(data, now)
+        return data
+
+def invalidate_reference_data():
+    current_app.extensions.pop('reference_data', None)
+
+def load_unknown_code(kind, code):
+    """codes.py hook for a code added by another worker since this one loaded the table"""
+    row = db.session.connection().execute(
+        select(ReferenceValue.value).where(ReferenceValue.kind == kind, ReferenceValue.code == code)).first()
+    if row is None:
+        return False
+    codes.register_value(kind, row.value, code)
+    return True
+
+codes.unknown_code_hook = load_unknown_code
+
+# Editing
+
+def validate_reference_form(kind, data, reference):
+    """Validate a new or renamed category or department"""
+    errors = []
+    value = data.get('value', '').strip().lower()
+    label = data.get('label', '').strip()
+
+    if kind not in EDITABLE_KINDS:
+        errors.append('Only categories and departments can be edited')
+    if not VALUE_PATTERN.match(value):
+        errors.append('Code must be 2-30 lowercase letters, digits or underscores, starting with a letter')
+    if not label or len(label) > 100:
+        errors.append('Name must be between 1 and 100 characters long')
+    if kind == 'category' and data.get('department') not in reference.departments:
+        errors.append('Please select the department this category is assigned to')
+    return errors
+
+def save_reference_value(kind, value, label, department=None):
+    """Add or rename a value, bump the version and reload this worker's copy"""
+    value = value.strip().lower()
+    row = db.session.get(ReferenceValue, (kind, value))
+    if row is None:
+        code, position = db.session.query(func.max(ReferenceValue.code), func.max(ReferenceValue.position))\
+                                   .filter_by(kind=kind).one()
+        # Never reuse a code this process knows, even one it has not seen in the table
+        code = max(code or 0, *codes.VOCABULARIES[kind].values()) + 1
+        row = ReferenceValue(kind=kind, value=value, code=code, position=(position or 0) + 1)
+        db.session.add(row)
+    row.label = label.strip()
+    if kind == 'category':
+        row.department = department
+    db.session.execute(update(ReferenceVersion).where(ReferenceVersion.id == 1)
+                       .values(version=ReferenceVersion.version + 1))
+    db.session.commit()
+    codes.register_value(kind, value, row.code)
+    invalidate_reference_data()
+    return row
@@ -0,0 +1,98 @@
+"""Cache of rendered report results, keyed by the report filters.
+
+Admins rerun the same few report filters (last 30 days, one department)
+many times a day. Each worker keeps the rendered results of recent filter
+combinations in an LRU cache bounded by REPORT_CACHE_ENTRIES and
+REPORT_CACHE_MAX_BYTES.
+
+An entry is stored with a stamp of the complaints it covers: their number,
+latest updated_at and highest id, archive included when the report
+includes it. Before an entry is served the stamp is read again with one
+aggregate query over the same filters. A new complaint in the range, a
+status change (which bumps updated_at), an archive move or a deletion
+changes the stamp of the reports covering that complaint, and only of
+those. Reports of other departments, categories or dates stay cached.
+"""
+import threading
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import func
+from models import Complaint, ArchivedComplaint
+from reference import get_reference_data
+
+def report_key(start_date, end_date, status_filter, category_filter, department_filter, include_archived):
+    """Normalised filters: dates, not times, and 'all' for any unknown filter value.
+
+    The reference data version is part of the key, as results show category names.
+    """
+    return (start_date.date().isoformat() if start_date else None,
+            end_date.date().isoformat() if end_date else None,
+            status_filter or 'all', category_filter or 'all', department_filter or 'all', bool(include_archived),
+            get_reference_data().version)
+
+def data_stamp(start_date, end_date, status_filter, category_filter, department_filter, include_archived):
+    """Changes whenever a complaint matching the filters is added, changed or removed"""
+    from routes.admin import build_report_query
+
+    filters = (start_date, end_date, status_filter, category_filter, department_filter)
+    models = (Complaint, ArchivedComplaint) if include_archived else (Complaint,)
+    return tuple(tuple(build_report_query(model, *filters)
+                       .with_entities(func.count(model.id), func.max(model.updated_at), func.max(model.id))
+                       .order_by(None).one())
+                 for model in models)
+
+class ReportCache:
+    """Least recently used entries, at most ``max_entries`` of them and ``max_bytes`` in total"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.stats = {'hits': 0, 'stale': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key, stamp):
+        """The cached value, or None if there is none or its data has changed since"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            if entry[0] != stamp:
+                self.stats['stale'] += 1
+                self.discard(key)
+                return None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def put(self, key, stamp, value, size):
+        with self.lock:
+            self.discard(key)
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (stamp, value, size)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.stats['evictions'] += 1
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+def get_report_cache():
+    """This worker's cache, or None if REPORT_CACHE_ENTRIES is 0"""
+    cache = current_app.extensions.get('report_cache')
+    if cache is None and current_app.config['REPORT_CACHE_ENTRIES']:
+        cache = current_app.extensions['report_cache'] = ReportCache(current_app.config['REPORT_CACHE_ENTRIES'],
+                                                                     current_app.config['REPORT_CACHE_MAX_BYTES'])
+    return cache
@@ -5,6 +5,7 @@ auth_bp = Blueprint('auth', __name__)
 main_bp = Blueprint('main', __name__)
 complaints_bp = Blueprint('complaints', __name__)
 admin_bp = Blueprint('admin', __name__)
+api_bp = Blueprint('api', __name__)
 
 # Import routes to register them with blueprints
 from . import auth
@@ -12,3 +13,6 @@ from . import main
 from . import complaints
 from . import admin
 from . import notify
+from . import performance
+from . import api
+from . import events
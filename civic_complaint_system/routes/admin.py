@@ -1,14 +1,24 @@
-import csv
-import io
+import hashlib
+import json
+import time
 from datetime import datetime, timedelta
-from flask import render_template, request, redirect, url_for, flash, make_response, current_app
+from flask import render_template, request, redirect, url_for, flash, current_app, abort, send_from_directory
 from flask_login import login_required, current_user
-from models import db, Complaint, User, StatusUpdate
+from markupsafe import Markup
+from models import db, Complaint, User, ArchivedComplaint, Job, ComplaintLocality, ReportSnapshot
 from routes import admin_bp
 from routes.auth import role_required
-from sqlalchemy import func, and_, or_, case
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+from metrics import observe_export, observe_report_cache
+from jobs import enqueue, job_status
+from sla import DIMENSIONS as SLA_DIMENSIONS, get_sla_analytics
+from hotspots import WINDOWS as HOTSPOT_WINDOWS, ensure_hotspot_counts, top_hotspots
+from forecasting import forecast_summary, schedule_forecast_refresh
+from anomalies import recent_alerts
+from projections import PROJECTIONS, catch_up, lifecycle_durations, projection_status
+from report_cache import data_stamp, get_report_cache, report_key
+from snapshots import find_snapshot, latest_snapshots, schedule_report_snapshots
+from reference import get_reference_data, save_reference_value, validate_reference_form
+from sqlalchemy import func, and_, or_, case, select
 
 def validate_user_form(data, user_id=None):
     """Validate user form data"""
@@ -33,7 +43,7 @@ def validate_user_form(data, user_id=None):
         if query.first():
             errors.append('Email already exists')
 
-    if role not in ['citizen', 'municipal', 'admin']:
+    if role not in get_reference_data().roles:
         errors.append('Invalid role selected')
 
     if role == 'municipal' and not department:
@@ -129,6 +139,11 @@ def admin_dashboard():
     unassigned_count = Complaint.query.filter_by(assigned_officer=None)\
         .filter(Complaint.status.in_(['submitted', 'in_progress'])).count()
 
+    # Expected volume for the next days; refitted by a nightly background job
+    schedule_forecast_refresh()
+    forecast = forecast_summary(current_app.config['FORECAST_HORIZON_DAYS'])
+    spike_alerts = recent_alerts()
+
     return render_template('admin_dashboard.html',
                          # User stats
                          total_users=total_users,
@@ -152,6 +167,9 @@ def admin_dashboard():
                          resolution_trends=resolution_trends,
                          rejected_trends=rejected_trends,
                          in_progress_trends=in_progress_trends,
+                         # Forecast
+                         forecast=forecast,
+                         spike_alerts=spike_alerts,
                          unassigned_count=unassigned_count)
 
 @admin_bp.route('/admin/users')
@@ -271,6 +289,7 @@ def reports():
     status_filter = request.args.get('status', 'all')
     category_filter = request.args.get('category', 'all')
     department_filter = request.args.get('department', 'all')
+    include_archived = request.args.get('include_archived') == '1'
 
     # Parse dates
     if start_date:
@@ -280,7 +299,8 @@ def reports():
             start_date = None
             flash('Invalid start date format', 'danger')
     else:
-        start_date = datetime.utcnow() - timedelta(days=30)  # Default to last 30 days
+        # Default to the last 30 days, from midnight so that the cache key is stable all day
+        start_date = (datetime.utcnow() - timedelta(days=30)).replace(hour=0, minute=0, second=0, microsecond=0)
 
     if end_date:
         try:
@@ -290,198 +310,218 @@ def reports():
             end_date = None
             flash('Invalid end date format', 'danger')
     else:
-        end_date = datetime.utcnow()
-
-    # Build query
-    query = Complaint.query.filter(
-        Complaint.created_at >= start_date,
-        Complaint.created_at <= end_date
-    )
-
-    # Apply filters
-    if status_filter != 'all':
-        query = query.filter_by(status=status_filter)
-
-    if category_filter != 'all':
-        query = query.filter_by(category=category_filter)
-
-    if department_filter != 'all':
-        query = query.filter(Complaint.assigned_department == department_filter)
-
-    complaints = query.order_by(Complaint.created_at.desc()).all()
+        end_date = datetime.utcnow().replace(hour=23, minute=59, second=59, microsecond=0)
+
+    filters = (start_date, end_date, status_filter, category_filter, department_filter)
+
+    # Check if CSV or Excel export is requested
+    export_format = request.args.get('export')
+    if export_format in ('csv', 'excel'):
+        # Standard periods were generated overnight; only custom filters are built now
+        snapshot = find_snapshot(export_format, *filters, include_archived)
+        if snapshot is not None:
+            return redirect(url_for('admin.download_snapshot', id=snapshot.id))
+
+    if export_format in ('csv', 'excel') and current_app.config['BACKGROUND_EXPORTS']:
+        # Built by a job worker; the status page offers the download when it is ready
+        payload = {'export_format': export_format, 'start_date': start_date.isoformat(),
+                   'end_date': end_date.isoformat(), 'status_filter': status_filter,
+                   'category_filter': category_filter, 'department_filter': department_filter,
+                   'include_archived': include_archived}
+        digest = hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        # A repeated click joins the export in progress; once it has finished, asking
+        # again builds a new file from the current data
+        job = enqueue('export_report', payload, priority=10, created_by=current_user.id,
+                      idempotency_key=f'export_report:{current_user.id}:{digest}', reuse_finished=False)
+        db.session.commit()
+        return redirect(url_for('admin.job_status_page', id=job.id))
+
+    if export_format in ('csv', 'excel'):
+        from exports import generate_csv_report, generate_excel_report
+        complaints = report_complaints(*filters, include_archived)
+        started = time.perf_counter()
+        if export_format == 'csv':
+            response = generate_csv_report(complaints)
+        else:
+            response = generate_excel_report(complaints)
+        observe_export(export_format, len(complaints), time.perf_counter() - started)
+        return response
 
     # Get available options for filters
-    departments = db.session.query(User.department)\
-                           .filter(User.department.isnot(None))\
-                           .distinct().all()
-    departments = [dept[0] for dept in departments]
-
-    # Check if CSV export is requested
-    if request.args.get('export') == 'csv':
-        return generate_csv_report(complaints)
-
-    # Check if Excel export is requested
-    if request.args.get('export') == 'excel':
-        return generate_excel_report(complaints)
+    departments = list(get_reference_data().departments)
+
+    # Rendered results are reused until a complaint they cover changes; the
+    # stamp is read first, so a change during rendering makes the entry stale
+    cache = get_report_cache()
+    key = report_key(*filters, include_archived)
+    stamp = data_stamp(*filters, include_archived) if cache else None
+    results = cache.get(key, stamp) if cache else None
+    observe_report_cache('hit' if results is not None else 'miss' if cache else 'disabled')
+    if results is None:
+        results = Markup(render_template('report_results.html',
+                                         complaints=report_complaints(*filters, include_archived)))
+        if cache:
+            cache.put(key, stamp, results, len(results))
+
+    schedule_report_snapshots()
 
     return render_template('reports.html',
-                         complaints=complaints,
+                         results=results,
+                         snapshots=latest_snapshots(),
                          start_date=start_date.strftime('%Y-%m-%d') if start_date else '',
                          end_date=end_date.strftime('%Y-%m-%d') if end_date else '',
                          status_filter=status_filter,
                          category_filter=category_filter,
                          department_filter=department_filter,
+                         include_archived=include_archived,
                          departments=departments)
 
-def generate_csv_report(complaints):
-    """Generate CSV report for complaints"""
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    # Write header
-    writer.writerow([
-        'Complaint ID',
-        'Submission Date',
-        'Citizen Name',
-        'Citizen Email',
-        'Category',
-        'Priority',
-        'Address',
-        'Landmark',
-        'Description',
-        'Status',
-        'Assigned Officer',
-        'Department',
-        'Resolution Notes',
-        'Created At',
-        'Updated At',
-        'Resolved At',
-        'Status Updates Count'
-    ])
-
-    # Write data rows
-    for complaint in complaints:
-        # Get status updates count
-        updates_count = StatusUpdate.query.filter_by(complaint_id=complaint.id).count()
-
-        writer.writerow([
-            complaint.id,
-            complaint.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            complaint.user.name,
-            complaint.user.email,
-            complaint.category,
-            complaint.priority,
-            complaint.address,
-            complaint.landmark or '',
-            complaint.description,
-            complaint.status,
-            complaint.assigned_officer.name if complaint.assigned_officer else 'Unassigned',
-            complaint.assigned_officer.department if complaint.assigned_officer else '',
-            complaint.resolution_notes or '',
-            complaint.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            complaint.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
-            complaint.resolved_at.strftime('%Y-%m-%d %H:%M:%S') if complaint.resolved_at else '',
-            updates_count
-        ])
-
-    # Create response
-    output.seek(0)
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = f'attachment; filename=complaints_report_{datetime.now().strftime("%Y-%m-%d")}.csv'
-
-    return response
-
-def generate_excel_report(complaints):
-    """Generate Excel report for complaints"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Complaints Report"
-
-    # Define styles
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-    center_align = Alignment(horizontal="center")
-
-    # Write header
-    headers = [
-        'Complaint ID',
-        'Submission Date',
-        'Citizen Name',
-        'Citizen Email',
-        'Category',
-        'Priority',
-        'Address',
-        'Landmark',
-        'Description',
-        'Status',
-        'Assigned Officer',
-        'Department',
-        'Resolution Notes',
-        'Created At',
-        'Updated At',
-        'Resolved At',
-        'Status Updates Count'
-    ]
-
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = center_align
-
-    # Write data rows
-    for row_num, complaint in enumerate(complaints, 2):
-        # Get status updates count
-        updates_count = StatusUpdate.query.filter_by(complaint_id=complaint.id).count()
-
-        data = [
-            complaint.id,
-            complaint.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            complaint.user.name,
-            complaint.user.email,
-            complaint.category,
-            complaint.priority,
-            complaint.address,
-            complaint.landmark or '',
-            complaint.description,
-            complaint.status,
-            complaint.assigned_officer.name if complaint.assigned_officer else 'Unassigned',
-            complaint.assigned_officer.department if complaint.assigned_officer else '',
-            complaint.resolution_notes or '',
-            complaint.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            complaint.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
-            complaint.resolved_at.strftime('%Y-%m-%d %H:%M:%S') if complaint.resolved_at else '',
-            updates_count
-        ]
-
-        for col_num, value in enumerate(data, 1):
-            ws.cell(row=row_num, column=col_num, value=value)
-
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
+@admin_bp.route('/admin/reports/snapshots/<int:id>')
+@login_required
+@role_required('admin')
+def download_snapshot(id):
+    """A report generated overnight, sent straight from its file"""
+    snapshot = ReportSnapshot.query.get_or_404(id)
+    return send_from_directory(current_app.config['SNAPSHOT_DIR'], snapshot.filename, as_attachment=True,
+                               download_name=snapshot.download_name, mimetype=snapshot.mimetype,
+                               etag=snapshot.sha256)
+
+@admin_bp.route('/admin/sla')
+@login_required
+@role_required('admin')
+def sla_report():
+    """Time-to-resolution percentiles and SLA breaches by department, category, priority or week"""
+    dimension = request.args.get('by', 'department')
+    if dimension not in SLA_DIMENSIONS:
+        dimension = 'department'
+    analytics = get_sla_analytics()
+    return render_template('sla.html',
+                         rows=analytics.report(dimension),
+                         overall=next(iter(analytics.report('all')), None),
+                         dimension=dimension,
+                         dimensions=SLA_DIMENSIONS,
+                         targets=current_app.config['SLA_TARGET_HOURS'])
+
+@admin_bp.route('/admin/hotspots')
+@login_required
+@role_required('admin')
+def hotspots():
+    """Localities where complaints of one category cluster, with their trend"""
+    window = request.args.get('window', '7d')
+    if window not in HOTSPOT_WINDOWS:
+        window = '7d'
+    category_filter = request.args.get('category', 'all')
+    ensure_hotspot_counts()
+    return render_template('hotspots.html',
+                         hotspots=top_hotspots(window, category=None if category_filter == 'all' else category_filter),
+                         window=window,
+                         windows=list(HOTSPOT_WINDOWS),
+                         category_filter=category_filter)
+
+@admin_bp.route('/admin/projections')
+@login_required
+@role_required('admin')
+def projections():
+    """Status log projections: how far each has read, and the lifecycle read model"""
+    catch_up()
+    return render_template('projections.html',
+                         projections=projection_status(),
+                         lifecycles=lifecycle_durations())
+
+@admin_bp.route('/admin/projections/rebuild', methods=['POST'])
+@login_required
+@role_required('admin')
+def rebuild_projections():
+    """Queue a rebuild of one projection, or all of them, from the whole log"""
+    name = request.form.get('name')
+    if name and name not in PROJECTIONS:
+        abort(404)
+    names = [name] if name else []
+    enqueue('rebuild_projections', {'names': names}, created_by=current_user.id,
+            idempotency_key=f"rebuild_projections:{name or 'all'}:{datetime.utcnow():%Y-%m-%dT%H:%M}")
+    db.session.commit()
+    flash(f"Rebuild of {name or 'all projections'} queued; the background workers will run it.", 'info')
+    return redirect(url_for('admin.projections'))
+
+@admin_bp.route('/admin/reference', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def reference_data():
+    """Add or rename complaint categories and departments"""
+    reference = get_reference_data()
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        errors = validate_reference_form(kind, request.form, reference)
+        if errors:
+            for error in errors:
+                flash(error, 'danger')
+        else:
             try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)  # Max width of 50
-        ws.column_dimensions[column_letter].width = adjusted_width
+                save_reference_value(kind, request.form['value'], request.form['label'],
+                                     request.form.get('department'))
+                flash(f"{kind.title()} {request.form['value'].strip().lower()} saved.", 'success')
+            except Exception as e:
+                db.session.rollback()
+                flash('Failed to save. Please try again.', 'danger')
+        return redirect(url_for('admin.reference_data'))
+
+    return render_template('reference_data.html', reference=reference)
+
+def report_complaints(start_date, end_date, status_filter, category_filter, department_filter, include_archived):
+    """Complaints matching the report filters, newest first"""
+    filters = (start_date, end_date, status_filter, category_filter, department_filter)
+    complaints = build_report_query(Complaint, *filters).order_by(Complaint.created_at.desc()).all()
+
+    # The archive is only read when explicitly requested
+    if include_archived:
+        archived = build_report_query(ArchivedComplaint, *filters).order_by(ArchivedComplaint.created_at.desc()).all()
+        complaints = sorted(complaints + archived, key=lambda c: c.created_at, reverse=True)
+    return complaints
+
+def build_report_query(model, start_date, end_date, status_filter, category_filter, department_filter):
+    """Apply the report filters to a query over Complaint or ArchivedComplaint"""
+    query = model.query.filter(
+        model.created_at >= start_date,
+        model.created_at <= end_date
+    )
+
+    # Apply filters
+    if status_filter != 'all':
+        query = query.filter_by(status=status_filter)
 
-    # Create response
-    from io import BytesIO
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
+    if category_filter != 'all':
+        query = query.filter_by(category=category_filter)
 
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=complaints_report_{datetime.now().strftime("%Y-%m-%d")}.xlsx'
+    if department_filter != 'all':
+        query = query.filter(model.assigned_department == department_filter)
+
+    return query
 
-    return response
+def get_own_job_or_404(id):
+    """A background job started by the current admin"""
+    job = db.session.get(Job, id)
+    if job is None or job.created_by != current_user.id:
+        abort(404)
+    return job
+
+@admin_bp.route('/admin/jobs/<int:id>')
+@login_required
+@role_required('admin')
+def job_status_page(id):
+    """Progress of a background report export; reloads itself until the job is done"""
+    job = get_own_job_or_404(id)
+    return render_template('job_status.html', job=job_status(job))
+
+@admin_bp.route('/admin/jobs/<int:id>/download')
+@login_required
+@role_required('admin')
+def download_job_result(id):
+    """The file a finished report export job wrote"""
+    result = job_status(get_own_job_or_404(id))['result']
+    if not result or 'filename' not in result:
+        abort(404)
+    return send_from_directory(current_app.config['EXPORT_DIR'], result['filename'], as_attachment=True,
+                               download_name=result['download_name'], mimetype=result['mimetype'])
 
 @admin_bp.route('/admin/complaints')
 @login_required
@@ -491,10 +531,16 @@ def all_complaints():
     status_filter = request.args.get('status', 'all')
     category_filter = request.args.get('category', 'all')
     department_filter = request.args.get('department', 'all')
+    locality_filter = request.args.get('locality')
 
     # Build query
     query = Complaint.query
 
+    # Complaints of one hotspot, through the locality index
+    if locality_filter:
+        query = query.filter(Complaint.id.in_(
+            select(ComplaintLocality.complaint_id).where(ComplaintLocality.locality == locality_filter)))
+
     # Apply filters
     if status_filter != 'all':
         query = query.filter_by(status=status_filter)
@@ -508,14 +554,12 @@ def all_complaints():
     complaints = query.order_by(Complaint.created_at.desc()).all()
 
     # Get available options for filters
-    departments = db.session.query(User.department)\
-                           .filter(User.department.isnot(None))\
-                           .distinct().all()
-    departments = [dept[0] for dept in departments]
+    departments = list(get_reference_data().departments)
 
     return render_template('all_complaints.html',
                          complaints=complaints,
                          status_filter=status_filter,
                          category_filter=category_filter,
                          department_filter=department_filter,
+                         locality_filter=locality_filter,
                          departments=departments)
\ No newline at end of file
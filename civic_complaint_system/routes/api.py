@@ -0,0 +1,367 @@
+"""JSON API for the mobile field app, mounted at /api/v1.
+
+Clients get a token from POST /api/v1/tokens and send it as
+"Authorization: Bearer <token>" on every request, so no session cookie is
+needed (a logged-in browser session works too). Tokens are signed with
+SECRET_KEY, expire after API_TOKEN_MAX_AGE seconds and stop working when
+the user's password changes or the account is deactivated.
+
+Lists use cursor pagination: each page carries next_cursor, passed back as
+?cursor= to get the following page, so pages stay stable while complaints
+are added. ?fields=id,status,updated_at limits the columns returned, and
+only those columns are read from the database.
+
+Access follows the HTML views: citizens see their own complaints, officers
+their department's and admins all of them.
+"""
+import base64
+import hashlib
+import json
+from datetime import date, datetime
+from functools import wraps
+from flask import current_app, request, url_for
+from flask_login import current_user
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import and_, case, func, or_
+from werkzeug.exceptions import BadRequest, HTTPException
+from models import db, Complaint, StatusUpdate, User, ArchivedStatusUpdate, Job
+from routes import api_bp
+from routes.complaints import (validate_complaint_form, save_complaint_image, remove_complaint_image, submit_complaint,
+                               can_view_complaint)
+from archive import get_complaint_or_archived
+from jobs import job_status
+from intake import intake_queued, enqueue_submission
+from reference import get_reference_data
+
+# Fields a client can ask for, with the column each one is read from
+COMPLAINT_FIELDS = {
+    'id': Complaint.id,
+    'user_id': Complaint.user_id,
+    'category': Complaint.category,
+    'description': Complaint.description,
+    'address': Complaint.address,
+    'landmark': Complaint.landmark,
+    'image_filename': Complaint.image_filename,
+    'status': Complaint.status,
+    'priority': Complaint.priority,
+    'assigned_department': Complaint.assigned_department,
+    'assigned_officer': Complaint.assigned_officer,
+    'resolution_notes': Complaint.resolution_notes,
+    'created_at': Complaint.created_at,
+    'updated_at': Complaint.updated_at,
+    'resolved_at': Complaint.resolved_at,
+}
+TIMELINE_FIELDS = ('id', 'old_status', 'new_status', 'note', 'timestamp', 'updated_by', 'updated_by_name')
+
+# Token handling
+
+def token_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='api-token')
+
+def password_fingerprint(user):
+    """Changes whenever the password does, which revokes older tokens"""
+    return hashlib.sha256(user.password_hash.encode()).hexdigest()[:16]
+
+def make_api_token(user):
+    return token_serializer().dumps({'id': user.id, 'pw': password_fingerprint(user)})
+
+def load_api_user(request):
+    """Flask-Login request loader: the user named by a bearer token on API requests"""
+    if request.blueprint != 'api':
+        return None
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        payload = token_serializer().loads(token, max_age=current_app.config['API_TOKEN_MAX_AGE'])
+    except BadSignature:
+        return None
+    user = db.session.get(User, payload.get('id'))
+    if user is None or not user.is_active or payload.get('pw') != password_fingerprint(user):
+        return None
+    return user
+
+# Responses
+
+def to_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat() + 'Z'
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serialisable')
+
+def api_response(data, status=200, headers=None):
+    """Compact JSON: no whitespace between tokens and UTF-8 instead of \\u escapes"""
+    body = json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=to_json)
+    return current_app.response_class(body, status=status, headers=headers, mimetype='application/json')
+
+def api_error(status, message, details=None):
+    error = {'status': status, 'message': message}
+    if details:
+        error['details'] = details
+    headers = {'WWW-Authenticate': 'Bearer'} if status == 401 else None
+    return api_response({'error': error}, status, headers)
+
+@api_bp.errorhandler(HTTPException)
+def handle_http_error(error):
+    return api_error(error.code, error.description)
+
+def api_role_required(required_roles=None):
+    """Like role_required, but answers 401/403 in JSON instead of redirecting"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_user.is_authenticated:
+                return api_error(401, 'Authentication required')
+            roles = required_roles if isinstance(required_roles, list) else [required_roles]
+            if required_roles and current_user.role not in roles:
+                return api_error(403, 'You do not have permission to access this resource')
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+# Request parsing
+
+def requested_fields(available, default=None):
+    """Fields named by ?fields=, in the order given"""
+    value = request.args.get('fields')
+    if not value:
+        return list(default or available)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return fields
+
+def page_size():
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    return max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+
+def encode_cursor(created_at, complaint_id):
+    raw = f'{created_at.isoformat()}|{complaint_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, complaint_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(complaint_id)
+    except ValueError:
+        raise BadRequest('Invalid cursor')
+
+def parse_datetime_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.rstrip('Z'))
+    except ValueError:
+        raise BadRequest(f'{name} must be an ISO 8601 timestamp')
+
+def visible_complaints(query):
+    """Restrict a complaints query to what the current user may see"""
+    if current_user.role == 'citizen':
+        return query.filter(Complaint.user_id == current_user.id)
+    if current_user.role == 'municipal':
+        return query.filter(Complaint.assigned_department == current_user.department)
+    return query
+
+def complaint_dict(complaint, fields):
+    return {field: getattr(complaint, field) for field in fields}
+
+# Endpoints
+
+@api_bp.route('/tokens', methods=['POST'])
+def create_token():
+    """Exchange email and password for a bearer token"""
+    data = request.get_json(silent=True) or request.form
+    email = (data.get('email') or '').strip().lower()
+    password = data.get('password') or ''
+    user = User.query.filter_by(email=email).first() if email else None
+    if not user or not user.check_password(password):
+        return api_error(401, 'Invalid email or password')
+    if not user.is_active:
+        return api_error(403, 'Your account has been deactivated. Please contact administrator.')
+
+    user.last_login = datetime.utcnow()
+    db.session.commit()
+    return api_response({'token': make_api_token(user), 'expires_in': current_app.config['API_TOKEN_MAX_AGE'],
+                         'user': {'id': user.id, 'name': user.name, 'role': user.role,
+                                  'department': user.department}}, 201)
+
+@api_bp.route('/complaints')
+@api_role_required()
+def list_complaints():
+    """Complaints visible to the user, newest first.
+
+    Filters: status, category, priority, department (admins only) and
+    updated_since, for clients that sync changes.
+    """
+    fields = requested_fields(COMPLAINT_FIELDS)
+    limit = page_size()
+
+    # The cursor needs created_at and id even when the client didn't ask for them
+    columns = [COMPLAINT_FIELDS[field] for field in fields]
+    query = visible_complaints(db.session.query(*columns, Complaint.created_at.label('_created_at'),
+                                                Complaint.id.label('_id')))
+
+    reference = get_reference_data()
+    for name, column, valid in (('status', Complaint.status, reference.statuses),
+                                ('category', Complaint.category, reference.categories),
+                                ('priority', Complaint.priority, reference.priorities)):
+        value = request.args.get(name)
+        if value:
+            if value not in valid:
+                raise BadRequest(f"{name} must be one of: {', '.join(valid)}")
+            query = query.filter(column == value)
+    department = request.args.get('department')
+    if department and current_user.is_admin():
+        query = query.filter(Complaint.assigned_department == department)
+    updated_since = parse_datetime_arg('updated_since')
+    if updated_since:
+        query = query.filter(Complaint.updated_at > updated_since)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        created_at, complaint_id = decode_cursor(cursor)
+        query = query.filter(or_(Complaint.created_at < created_at,
+                                 and_(Complaint.created_at == created_at, Complaint.id < complaint_id)))
+
+    rows = query.order_by(Complaint.created_at.desc(), Complaint.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]._created_at, rows[limit - 1]._id) if len(rows) > limit else None
+    return api_response({
+        'data': [dict(zip(fields, row)) for row in rows[:limit]],
+        'next_cursor': next_cursor,
+    })
+
+@api_bp.route('/complaints', methods=['POST'])
+@api_role_required('citizen')
+def create_complaint():
+    """Submit a complaint as JSON, or as multipart form data with an image"""
+    data = request.get_json(silent=True) or request.form
+    category = data.get('category')
+    description = data.get('description')
+    address = data.get('address')
+    landmark = (data.get('landmark') or '').strip()
+    priority = data.get('priority') or 'medium'
+
+    errors = validate_complaint_form({
+        'category': category,
+        'description': description,
+        'address': address,
+        'priority': priority
+    })
+    image_filename = None
+    file = request.files.get('image')
+    if not errors and file and file.filename != '':
+        image_filename, error = save_complaint_image(file)
+        if error:
+            errors.append(error)
+    if errors:
+        return api_error(400, 'Invalid complaint', errors)
+
+    if intake_queued():
+        # Accepted but not filed yet: there is no complaint id to point to
+        try:
+            reference = enqueue_submission(current_user.id, category, description, address, landmark, priority,
+                                           image_filename)
+        except Exception:
+            remove_complaint_image(image_filename)
+            return api_error(500, 'Failed to submit complaint. Please try again.')
+        return api_response({'data': {'reference': reference, 'status': 'queued',
+                                      'assigned_department': get_reference_data().department_for(category)}}, 202)
+
+    try:
+        complaint = submit_complaint(current_user.id, category, description, address, landmark,
+                                     priority, image_filename)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        remove_complaint_image(image_filename)
+        return api_error(500, 'Failed to submit complaint. Please try again.')
+
+    location = url_for('api.get_complaint', id=complaint.id)
+    return api_response({'data': complaint_dict(complaint, COMPLAINT_FIELDS)}, 201, {'Location': location})
+
+@api_bp.route('/complaints/<int:id>')
+@api_role_required()
+def get_complaint(id):
+    """One complaint, including archived ones"""
+    fields = requested_fields(COMPLAINT_FIELDS)
+    complaint = get_complaint_or_archived(id)
+    if complaint is None:
+        return api_error(404, 'Complaint not found')
+    if not can_view_complaint(current_user, complaint):
+        return api_error(403, 'You do not have permission to view this complaint')
+    return api_response({'data': complaint_dict(complaint, fields)})
+
+@api_bp.route('/complaints/<int:id>/timeline')
+@api_role_required()
+def complaint_timeline(id):
+    """Status updates of a complaint, newest first"""
+    fields = requested_fields(TIMELINE_FIELDS)
+    complaint = get_complaint_or_archived(id)
+    if complaint is None:
+        return api_error(404, 'Complaint not found')
+    if not can_view_complaint(current_user, complaint):
+        return api_error(403, 'You do not have permission to view this complaint')
+
+    update = ArchivedStatusUpdate if complaint.is_archived else StatusUpdate
+    columns = {
+        'id': update.id, 'old_status': update.old_status, 'new_status': update.new_status,
+        'note': update.note, 'timestamp': update.timestamp, 'updated_by': update.updated_by,
+        'updated_by_name': User.name,
+    }
+    query = db.session.query(*[columns[field] for field in fields]).filter(update.complaint_id == complaint.id)
+    if 'updated_by_name' in fields:
+        query = query.outerjoin(User, User.id == update.updated_by)
+    rows = query.order_by(update.timestamp.desc(), update.id.desc()).all()
+    return api_response({'data': [dict(zip(fields, row)) for row in rows]})
+
+@api_bp.route('/dashboard')
+@api_role_required()
+def dashboard():
+    """Complaint counts for the user's dashboard: own, department or all"""
+    counts = visible_complaints(db.session.query(Complaint.status, func.count(Complaint.id)))\
+        .group_by(Complaint.status).all()
+    by_status = dict.fromkeys(get_reference_data().statuses, 0)
+    by_status.update({status: count for status, count in counts})
+    data = {
+        'role': current_user.role,
+        'total': sum(by_status.values()),
+        'by_status': by_status,
+        'pending': by_status['submitted'] + by_status['in_progress'],
+    }
+
+    if current_user.role == 'municipal':
+        data['department'] = current_user.department
+        data['resolved_today'] = visible_complaints(Complaint.query).filter(
+            Complaint.status == 'resolved',
+            Complaint.resolved_at >= datetime.utcnow().date()
+        ).count()
+    elif current_user.is_admin():
+        departments = db.session.query(
+            Complaint.assigned_department,
+            func.count(Complaint.id),
+            func.sum(case((Complaint.status.in_(['submitted', 'in_progress']), 1), else_=0))
+        ).filter(Complaint.assigned_department.isnot(None))\
+         .group_by(Complaint.assigned_department).all()
+        data['by_department'] = {department: {'total': total, 'pending': int(pending or 0)}
+                                 for department, total, pending in departments}
+        data['unassigned'] = Complaint.query.filter_by(assigned_officer=None)\
+            .filter(Complaint.status.in_(['submitted', 'in_progress'])).count()
+
+    return api_response({'data': data})
+
+@api_bp.route('/jobs/<int:id>')
+@api_role_required()
+def get_job(id):
+    """Status of a background job the user started (admins see every job)"""
+    job = db.session.get(Job, id)
+    if job is None or (job.created_by != current_user.id and not current_user.is_admin()):
+        return api_error(404, 'Job not found')
+    data = job_status(job)
+    # The download, like the admin job pages, is only for the admin who asked for the export
+    if job.status == 'succeeded' and job.name == 'export_report' and job.created_by == current_user.id:
+        data['download_url'] = url_for('admin.download_job_result', id=job.id)
+    return api_response({'data': data}, headers={'Retry-After': '2'} if job.status in ('queued', 'running') else None)
@@ -2,6 +2,7 @@ from flask import render_template, request, redirect, url_for, flash, session
 from flask_login import login_user, logout_user, login_required, current_user
 from models import db, User
 from routes import auth_bp
+from reference import get_reference_data
 from datetime import datetime
 import re
 
@@ -54,7 +55,7 @@ def register():
         if password != confirm_password:
             errors.append('Passwords do not match')
 
-        if role not in ['citizen', 'municipal', 'admin']:
+        if role not in get_reference_data().roles:
             errors.append('Invalid role selected')
 
         if role == 'municipal' and not department:
@@ -1,31 +1,29 @@
 import os
+import time
 from datetime import datetime
-from flask import render_template, request, redirect, url_for, flash, current_app, jsonify
+from flask import render_template, request, redirect, url_for, flash, current_app, jsonify, abort
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
-from models import db, Complaint, StatusUpdate, User, get_auto_assignment_department, find_best_officer_for_assignment
+from models import db, Complaint, StatusUpdate, User, get_auto_assignment_department, find_best_officer_for_assignment, bulk_update_status
 from routes import complaints_bp
 from routes.auth import role_required
-
-# Valid complaint categories
-VALID_CATEGORIES = ['potholes', 'streetlight', 'garbage', 'water_supply', 'drainage', 'other']
-
-# Valid status values
-VALID_STATUSES = ['submitted', 'in_progress', 'resolved', 'rejected']
-
-# Valid priority values
-VALID_PRIORITIES = ['high', 'medium', 'low']
+from archive import get_complaint_or_archived
+from metrics import observe_upload
+from projections import citizen_summary, department_queue
+from reference import get_reference_data
+from intake import intake_queued, enqueue_submission, pending_submissions
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
-def validate_complaint_form(data):
-    """Validate complaint form data"""
+def validate_complaint_form(data, reference=None):
+    """Validate complaint form data; ``reference`` is passed where there is no app context"""
+    reference = reference or get_reference_data()
     errors = []
 
-    if not data.get('category') in VALID_CATEGORIES:
+    if not data.get('category') in reference.categories:
         errors.append('Please select a valid complaint category')
 
     if not data.get('description') or len(data.get('description', '').strip()) < 10:
@@ -34,11 +32,79 @@ def validate_complaint_form(data):
     if not data.get('address') or len(data.get('address', '').strip()) < 5:
         errors.append('Please provide a valid address')
 
-    if not data.get('priority') in VALID_PRIORITIES:
+    if not data.get('priority') in reference.priorities:
         errors.append('Please select a valid priority level')
 
     return errors
 
+def save_complaint_image(file):
+    """Validate and store an uploaded image; returns (filename, error)"""
+    if not allowed_file(file.filename):
+        return None, 'Invalid file type. Only PNG, JPG, JPEG, and GIF files are allowed.'
+    if file.content_length > current_app.config['MAX_CONTENT_LENGTH']:
+        return None, 'File size too large. Maximum size is 5MB.'
+
+    # Secure and save file
+    filename = secure_filename(file.filename)
+    # Add timestamp to prevent conflicts
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    image_filename = f"{timestamp}_{filename}"
+    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], image_filename)
+    started = time.perf_counter()
+    file.save(file_path)
+    observe_upload(os.path.getsize(file_path), time.perf_counter() - started)
+    return image_filename, None
+
+def remove_complaint_image(image_filename):
+    """Delete an uploaded image whose complaint was not saved"""
+    if image_filename:
+        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], image_filename)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def submit_complaint(user_id, category, description, address, landmark, priority, image_filename=None,
+                     created_at=None):
+    """Add a complaint routed to its department, with its first timeline entry (caller commits).
+
+    ``created_at`` is when the citizen submitted it, for complaints filed later from the intake queue.
+    """
+    # Auto-assignment logic - assign to department only
+    department = get_auto_assignment_department(category)
+
+    complaint = Complaint(
+        user_id=user_id,
+        category=category,
+        description=description,
+        address=address,
+        landmark=landmark if landmark else None,
+        image_filename=image_filename,
+        priority=priority,
+        assigned_department=department
+    )
+    if created_at is not None:
+        complaint.created_at = created_at
+    db.session.add(complaint)
+
+    # Add status update for department assignment; both rows are inserted at the
+    # next flush, so the intake writer files a whole group in one
+    update = complaint.add_status_update(
+        updated_by=user_id,
+        old_status=None,
+        new_status='submitted',
+        note=f'Complaint submitted to {department} department'
+    )
+    if created_at is not None:
+        update.timestamp = created_at
+    return complaint
+
+def can_view_complaint(user, complaint):
+    """Citizens see their own complaints, officers their department's, admins all"""
+    if user.role == 'citizen':
+        return complaint.user_id == user.id
+    if user.role == 'municipal':
+        return complaint.assigned_department == user.department
+    return user.role == 'admin'
+
 @complaints_bp.route('/complaints/new', methods=['GET', 'POST'])
 @login_required
 @role_required('citizen')
@@ -65,18 +131,9 @@ def new_complaint():
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename != '':
-                if not allowed_file(file.filename):
-                    errors.append('Invalid file type. Only PNG, JPG, JPEG, and GIF files are allowed.')
-                elif file.content_length > current_app.config['MAX_CONTENT_LENGTH']:
-                    errors.append('File size too large. Maximum size is 5MB.')
-                else:
-                    # Secure and save file
-                    filename = secure_filename(file.filename)
-                    # Add timestamp to prevent conflicts
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    image_filename = f"{timestamp}_{filename}"
-                    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], image_filename)
-                    file.save(file_path)
+                image_filename, error = save_complaint_image(file)
+                if error:
+                    errors.append(error)
 
         if errors:
             for error in errors:
@@ -88,33 +145,27 @@ def new_complaint():
                                  landmark=landmark,
                                  priority=priority)
 
-        # Create complaint
-        complaint = Complaint(
-            user_id=current_user.id,
-            category=category,
-            description=description,
-            address=address,
-            landmark=landmark if landmark else None,
-            image_filename=image_filename,
-            priority=priority
-        )
+        if intake_queued():
+            try:
+                enqueue_submission(current_user.id, category, description, address, landmark, priority,
+                                   image_filename)
+            except Exception:
+                remove_complaint_image(image_filename)
+                flash('Failed to submit complaint. Please try again.', 'danger')
+                return render_template('complaint_form.html',
+                                     category=category,
+                                     description=description,
+                                     address=address,
+                                     landmark=landmark,
+                                     priority=priority)
+            department = get_reference_data().department_for(category)
+            flash(f'Complaint received! It will be assigned to the {department} department shortly.', 'success')
+            return redirect(url_for('complaints.citizen_dashboard'))
 
         try:
-            db.session.add(complaint)
-            db.session.flush()  # Get the complaint ID
-
-            # Auto-assignment logic - assign to department only
-            department = get_auto_assignment_department(category)
-            complaint.assigned_department = department
-
-            # Add status update for department assignment
-            complaint.add_status_update(
-                updated_by=current_user.id,
-                old_status=None,
-                new_status='submitted',
-                note=f'Complaint submitted to {department} department'
-            )
-            flash(f'Complaint submitted successfully! Assigned to {department} department.', 'success')
+            complaint = submit_complaint(current_user.id, category, description, address, landmark,
+                                         priority, image_filename)
+            flash(f'Complaint submitted successfully! Assigned to {complaint.assigned_department} department.', 'success')
 
             db.session.commit()
             return redirect(url_for('complaints.citizen_dashboard'))
@@ -122,10 +173,7 @@ def new_complaint():
         except Exception as e:
             db.session.rollback()
             # Clean up uploaded file if database operation failed
-            if image_filename:
-                file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], image_filename)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+            remove_complaint_image(image_filename)
             flash('Failed to submit complaint. Please try again.', 'danger')
             return render_template('complaint_form.html',
                                  category=category,
@@ -140,16 +188,20 @@ def new_complaint():
 @login_required
 def view_complaint(id):
     """View complaint details with timeline"""
-    complaint = Complaint.query.get_or_404(id)
+    # Closed complaints may have been moved to the archive tables
+    complaint = get_complaint_or_archived(id)
+    if complaint is None:
+        abort(404)
 
     # Check access permissions
-    if current_user.role == 'citizen' and complaint.user_id != current_user.id:
-        flash('You can only view your own complaints.', 'danger')
-        return redirect(url_for('complaints.citizen_dashboard'))
-
-    if current_user.role == 'municipal' and complaint.assigned_department != current_user.department:
-        flash('You can only view complaints assigned to your department.', 'danger')
-        return redirect(url_for('complaints.municipal_dashboard'))
+    if not can_view_complaint(current_user, complaint):
+        if current_user.role == 'citizen':
+            flash('You can only view your own complaints.', 'danger')
+            return redirect(url_for('complaints.citizen_dashboard'))
+        if current_user.role == 'municipal':
+            flash('You can only view complaints assigned to your department.', 'danger')
+            return redirect(url_for('complaints.municipal_dashboard'))
+        abort(403)
 
     # Admins can view all complaints
 
@@ -180,7 +232,7 @@ def edit_complaint(id):
         resolution_notes = request.form.get('resolution_notes', '').strip()
 
         # Validate status
-        if new_status not in VALID_STATUSES:
+        if new_status not in get_reference_data().statuses:
             flash('Invalid status selected.', 'danger')
             return redirect(url_for('complaints.view_complaint', id=complaint.id))
 
@@ -216,6 +268,57 @@ def edit_complaint(id):
 
     return render_template('edit_complaint.html', complaint=complaint)
 
+@complaints_bp.route('/complaints/bulk-status', methods=['POST'])
+@login_required
+@role_required(['municipal', 'admin'])
+def bulk_update_complaint_status():
+    """Apply one status change to several selected complaints (municipal officers, admin)"""
+    new_status = request.form.get('status')
+    note = request.form.get('note', '').strip() or None
+    complaint_ids = sorted({int(value) for value in request.form.getlist('complaint_ids') if value.isdigit()})
+    limit = current_app.config['BULK_STATUS_UPDATE_LIMIT']
+
+    redirect_url = url_for('complaints.municipal_dashboard') if current_user.role == 'municipal' \
+        else url_for('admin.all_complaints')
+
+    if new_status not in get_reference_data().statuses:
+        flash('Invalid status selected.', 'danger')
+        return redirect(redirect_url)
+
+    if not complaint_ids:
+        flash('Please select at least one complaint to update.', 'danger')
+        return redirect(redirect_url)
+
+    if len(complaint_ids) > limit:
+        flash(f'You can update at most {limit} complaints at once.', 'danger')
+        return redirect(redirect_url)
+
+    rows = db.session.query(Complaint.id, Complaint.status, Complaint.assigned_department)\
+        .filter(Complaint.id.in_(complaint_ids)).all()
+
+    missing = set(complaint_ids) - {row.id for row in rows}
+    if missing:
+        flash(f"Complaints not found: {', '.join(f'#{id}' for id in sorted(missing))}", 'danger')
+        return redirect(redirect_url)
+
+    # Same department check as edit_complaint, for every selected complaint
+    if current_user.role == 'municipal':
+        denied = [row.id for row in rows if row.assigned_department != current_user.department]
+        if denied:
+            flash(f"You can only edit complaints assigned to your department "
+                  f"({', '.join(f'#{id}' for id in denied)}).", 'danger')
+            return redirect(redirect_url)
+
+    try:
+        updated = bulk_update_status([(row.id, row.status) for row in rows], new_status, current_user.id, note)
+        db.session.commit()
+        flash(f"{updated} complaints updated to {new_status.replace('_', ' ')}.", 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Failed to update complaints. Please try again.', 'danger')
+
+    return redirect(redirect_url)
+
 @complaints_bp.route('/complaints/<int:id>/assign', methods=['POST'])
 @login_required
 @role_required('admin')
@@ -264,6 +367,10 @@ def citizen_dashboard():
     """Citizen dashboard - shows user's own complaints"""
     status_filter = request.args.get('status', 'all')
 
+    # Statistics from the citizen summary projection, archived complaints included. Read first:
+    # catching up may commit, which would expire the complaints loaded below
+    summary = citizen_summary(current_user.id)
+
     # Base query for user's complaints
     query = Complaint.query.filter_by(user_id=current_user.id)
 
@@ -273,20 +380,13 @@ def citizen_dashboard():
 
     complaints = query.order_by(Complaint.created_at.desc()).all()
 
-    # Get statistics
-    total_complaints = Complaint.query.filter_by(user_id=current_user.id).count()
-    resolved_count = Complaint.query.filter_by(user_id=current_user.id, status='resolved').count()
-    pending_count = Complaint.query.filter(
-        Complaint.user_id == current_user.id,
-        Complaint.status.in_(['submitted', 'in_progress'])
-    ).count()
-
     return render_template('citizen_dashboard.html',
                          complaints=complaints,
                          status_filter=status_filter,
-                         total_complaints=total_complaints,
-                         resolved_count=resolved_count,
-                         pending_count=pending_count)
+                         total_complaints=summary['total'],
+                         resolved_count=summary['resolved'],
+                         pending_count=summary['open'],
+                         queued_count=pending_submissions(current_user.id))
 
 @complaints_bp.route('/complaints/municipal/dashboard')
 @login_required
@@ -296,6 +396,9 @@ def municipal_dashboard():
     status_filter = request.args.get('status', 'all')
     priority_filter = request.args.get('priority', 'all')
 
+    # Open complaints from the department queue projection, read before the complaints are loaded
+    queue = department_queue(current_user.department)
+
     # Base query for complaints assigned to officer's department
     query = Complaint.query.filter_by(assigned_department=current_user.department)
 
@@ -315,10 +418,6 @@ def municipal_dashboard():
         Complaint.status == 'resolved',
         Complaint.resolved_at >= datetime.utcnow().date()
     ).count()
-    pending_count = Complaint.query.filter(
-        Complaint.assigned_department == current_user.department,
-        Complaint.status.in_(['submitted', 'in_progress'])
-    ).count()
 
     return render_template('municipal_dashboard.html',
                          complaints=complaints,
@@ -326,5 +425,6 @@ def municipal_dashboard():
                          priority_filter=priority_filter,
                          total_assigned=total_assigned,
                          resolved_today=resolved_today,
-                         pending_count=pending_count,
+                         pending_count=queue['open'],
+                         oldest_queued_at=queue['oldest_queued_at'],
                          department=current_user.department)
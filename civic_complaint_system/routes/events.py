@@ -0,0 +1,78 @@
+"""Server-Sent Events streams of complaint status updates (see events.py)"""
+from flask import Response, abort, current_app, request, stream_with_context
+from flask_login import login_required, current_user
+from models import db
+from routes import complaints_bp
+from routes.complaints import can_view_complaint
+from archive import get_complaint_or_archived
+from events import format_event, event_from_row, get_event_bus, status_event_query
+
+def last_event_id():
+    """Where a reconnecting client left off: the Last-Event-ID header, or ?last_event_id="""
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return int(value) if value and value.isdigit() else None
+
+def event_stream(**scope):
+    """Stream status updates in ``scope``, replaying any the client missed"""
+    bus = get_event_bus()
+    if bus is None:
+        abort(404)
+
+    resume_from = last_event_id()
+    subscription = bus.subscribe(last_id=resume_from or 0, **scope)
+    if subscription is None:
+        return Response('Too many live update connections, retry later\n', status=503, mimetype='text/plain',
+                        headers={'Retry-After': str(max(1, current_app.config['EVENTS_RETRY_MS'] // 1000))})
+
+    # Subscribed before reading, so nothing committed in between is lost;
+    # the subscription skips events the replay already sent
+    replay = []
+    if resume_from is not None:
+        rows = db.session.execute(status_event_query(resume_from, **scope)
+                                  .limit(current_app.config['EVENTS_REPLAY_LIMIT'])).all()
+        replay = [event_from_row(row) for row in rows]
+        if replay:
+            subscription.last_id = replay[-1]['id']
+    # Streams stay open for minutes; don't hold a pooled connection meanwhile
+    db.session.close()
+
+    heartbeat = current_app.config['EVENTS_HEARTBEAT_SECONDS']
+    retry_ms = current_app.config['EVENTS_RETRY_MS']
+
+    def generate():
+        yield f'retry: {retry_ms}\n\n'
+        for event in replay:
+            yield format_event(event)
+        while not subscription.overflowed:
+            event = subscription.next_event(timeout=heartbeat)
+            # Comment lines keep proxies from closing an idle connection
+            yield format_event(event) if event else ': heartbeat\n\n'
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(lambda: bus.unsubscribe(subscription))
+    return response
+
+@complaints_bp.route('/complaints/<int:id>/events')
+@login_required
+def complaint_events(id):
+    """Live status updates of one complaint"""
+    complaint = get_complaint_or_archived(id)
+    if complaint is None:
+        abort(404)
+    if not can_view_complaint(current_user, complaint):
+        abort(403)
+    return event_stream(complaint_id=complaint.id)
+
+@complaints_bp.route('/complaints/events')
+@login_required
+def dashboard_events():
+    """Live status updates for the user's dashboard: own complaints, department or all"""
+    if current_user.role == 'citizen':
+        return event_stream(user_id=current_user.id)
+    if current_user.role == 'municipal':
+        return event_stream(department=current_user.department)
+    if current_user.is_admin():
+        return event_stream(department=request.args.get('department') or None)
+    abort(403)
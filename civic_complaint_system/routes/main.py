@@ -2,6 +2,7 @@ from flask import render_template, redirect, url_for
 from flask_login import login_required, current_user
 from models import db, Complaint, User
 from routes import main_bp
+from reference import get_reference_data
 from sqlalchemy import func
 from datetime import datetime, timedelta
 
@@ -82,27 +83,12 @@ def internal_error():
 @main_bp.app_template_filter('get_department_name')
 def get_department_name(department_code):
     """Convert department code to readable name"""
-    department_names = {
-        'roads': 'Roads & Transportation',
-        'water': 'Water Supply & Drainage',
-        'sanitation': 'Sanitation & Waste Management',
-        'general': 'General Administration',
-        'administration': 'System Administration'
-    }
-    return department_names.get(department_code, department_code.title())
+    return get_reference_data().label('department', department_code)
 
 @main_bp.app_template_filter('get_category_name')
 def get_category_name(category_code):
     """Convert category code to readable name"""
-    category_names = {
-        'potholes': 'Potholes & Road Damage',
-        'streetlight': 'Street Light Issues',
-        'garbage': 'Garbage Collection',
-        'water_supply': 'Water Supply Issues',
-        'drainage': 'Drainage Problems',
-        'other': 'Other Issues'
-    }
-    return category_names.get(category_code, category_code.title())
+    return get_reference_data().label('category', category_code)
 
 @main_bp.app_context_processor
 def inject_global_vars():
@@ -113,6 +99,7 @@ def inject_global_vars():
     pending_count = Complaint.query.filter(Complaint.status.in_(['submitted', 'in_progress'])).count()
 
     return {
+        'reference': get_reference_data(),
         'total_complaints': total_complaints,
         'resolved_count': resolved_count,
         'pending_count': pending_count,
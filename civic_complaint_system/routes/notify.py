@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from models import db, Complaint
 from routes import admin_bp
 from routes.auth import role_required
+from notifications import department_officers, notify_department_officers
 
 @admin_bp.route('/admin/complaints/<int:id>/notify_department', methods=['POST'])
 @login_required
@@ -11,17 +12,29 @@ def notify_department(id):
     """Notify department about pending work (admin only)"""
     complaint = Complaint.query.get_or_404(id)
 
-    # Add a status update noting the notification
-    complaint.add_status_update(
-        updated_by=current_user.id,
-        old_status=complaint.status,
-        new_status=complaint.status,  # Keep same status
-        note='Admin notified department about pending work'
-    )
+    officers = department_officers(complaint.assigned_department)
+    if not officers:
+        flash(f'The {complaint.assigned_department} department has no active officers to notify.', 'warning')
+        return redirect(url_for('admin.all_complaints'))
 
     try:
+        # Queued in the outbox in the same commit as the timeline entry;
+        # dispatch_notifications.py delivers it
+        queued = notify_department_officers(complaint, officers, current_user)
+        if not queued:
+            db.session.rollback()
+            flash('The department was already notified about this complaint today.', 'info')
+            return redirect(url_for('admin.all_complaints'))
+
+        # Add a status update noting the notification
+        complaint.add_status_update(
+            updated_by=current_user.id,
+            old_status=complaint.status,
+            new_status=complaint.status,  # Keep same status
+            note='Admin notified department about pending work'
+        )
         db.session.commit()
-        flash('Department notified successfully!', 'success')
+        flash(f'Department notified successfully! ({queued} officers)', 'success')
     except Exception as e:
         db.session.rollback()
         flash('Failed to notify department. Please try again.', 'danger')
@@ -0,0 +1,88 @@
+import hmac
+from flask import render_template, current_app, request, abort, make_response, send_from_directory
+from flask_login import login_required
+from routes import admin_bp, main_bp
+from routes.auth import role_required
+from metrics import CONTENT_TYPE, get_metrics
+from profiling import list_profiles
+
+@admin_bp.route('/admin/performance')
+@login_required
+@role_required('admin')
+def performance():
+    """Per-endpoint request latency and SQL statistics for this worker (admin only)"""
+    endpoint_stats = current_app.extensions.get('sql_stats')
+    window_minutes = current_app.config.get('SQL_STATS_WINDOW_SECONDS', 3600) // 60
+
+    rows = []
+    if endpoint_stats is not None:
+        for endpoint, window in endpoint_stats.snapshot().items():
+            requests = window.latency.total
+            rows.append({
+                'endpoint': endpoint,
+                'requests': requests,
+                'p50': window.latency.percentile(0.50),
+                'p95': window.latency.percentile(0.95),
+                'p99': window.latency.percentile(0.99),
+                'avg_latency': window.latency.sum / requests,
+                'avg_queries': window.queries.sum / requests,
+                'max_queries': window.max_queries,
+                'avg_sql_ms': window.sql_time * 1000 / requests,
+                'total_sql_ms': window.sql_time * 1000,
+                'slowest_ms': window.slowest_time * 1000,
+                'slowest_statement': window.slowest_statement,
+            })
+    rows.sort(key=lambda row: row['total_sql_ms'], reverse=True)
+
+    return render_template('performance.html',
+                         rows=rows,
+                         enabled=endpoint_stats is not None,
+                         window_minutes=window_minutes)
+
+@admin_bp.route('/admin/slow-queries')
+@login_required
+@role_required('admin')
+def slow_queries():
+    """Slowest SQL statements by total time, with their query plans (admin only)"""
+    recorder = current_app.extensions.get('slow_queries')
+    statements = recorder.worst() if recorder is not None else []
+
+    return render_template('slow_queries.html',
+                         statements=statements,
+                         enabled=recorder is not None,
+                         threshold_ms=current_app.config.get('SLOW_QUERY_THRESHOLD_MS'))
+
+@admin_bp.route('/admin/profiles')
+@login_required
+@role_required('admin')
+def profiles():
+    """Saved request profiles, newest first (admin only)"""
+    return render_template('profiles.html',
+                         profiles=list_profiles(current_app.config.get('PROFILE_DIR')),
+                         enabled=current_app.config.get('PROFILING_ENABLED', True))
+
+@admin_bp.route('/admin/profiles/<profile_id>.prof')
+@login_required
+@role_required('admin')
+def download_profile(profile_id):
+    """Download a pstats file for snakeviz, pstats or similar tools (admin only)"""
+    return send_from_directory(current_app.config['PROFILE_DIR'], f'{profile_id}.prof', as_attachment=True)
+
+@main_bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint, protected by METRICS_TOKEN (required in production)"""
+    registry = get_metrics()
+    if registry is None:
+        abort(404)
+
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(401)
+    elif current_app.config.get('METRICS_REQUIRE_TOKEN'):
+        # Backlog gauges are not public; refuse rather than serve them unauthenticated
+        abort(401)
+
+    response = make_response(registry.render())
+    response.headers['Content-Type'] = CONTENT_TYPE
+    return response
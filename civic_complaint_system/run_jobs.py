@@ -0,0 +1,36 @@
+import argparse
+import os
+from app import create_app
+from models import db
+from jobs import job_counts, run_processes, run_threads
+
+def main():
+    parser = argparse.ArgumentParser(description='Run background jobs queued by the web app')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='worker threads or processes (default: JOBS_WORKERS)')
+    parser.add_argument('--mode', choices=('thread', 'process'), default=None,
+                        help='run workers as threads of this process or as separate processes (default: JOBS_MODE)')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='worker threads in each process with --mode process (default: 1)')
+    parser.add_argument('--once', action='store_true', help='run the jobs that are due, then exit (e.g. from cron)')
+    args = parser.parse_args()
+
+    config_name = os.environ.get('FLASK_ENV', 'default')
+    app = create_app(config_name)
+    with app.app_context():
+        # Make sure the jobs table exists on databases created before it
+        db.create_all()
+    workers = args.workers or app.config['JOBS_WORKERS']
+    mode = args.mode or app.config['JOBS_MODE']
+
+    print(f'Starting {workers} job workers ({mode} mode)')
+    if mode == 'process':
+        run_processes(config_name, workers, args.threads, once=args.once)
+    else:
+        run_threads(app, workers, once=args.once)
+
+    with app.app_context():
+        print(f'Jobs: {job_counts()}')
+
+if __name__ == '__main__':
+    main()
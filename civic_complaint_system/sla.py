@@ -0,0 +1,228 @@
+"""Resolution SLA and time-to-resolution analytics.
+
+Each complaint's lifecycle (submitted -> in_progress -> resolved or
+rejected) is rebuilt from its status updates. Every finished stint in a
+state adds a time-in-state sample, and the first resolution adds a
+time-to-resolution sample, to the complaint's department, category,
+priority and creation week. A resolution later than the priority's target
+in SLA_TARGET_HOURS counts as a breach; open complaints already past their
+target are counted as overdue when the report is read.
+
+Samples are kept sorted in typed arrays (8 bytes per sample), so a report
+is a few index lookups per group. The first report loads every status
+update, hot and archived, in one query. Later reports only read the
+updates added since, and do a full rebuild every SLA_REBUILD_SECONDS to
+pick up edited departments or priorities. Each worker keeps its own copy.
+"""
+import threading
+import time
+from array import array
+from bisect import insort
+from collections import Counter, defaultdict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, union_all
+from models import db, Complaint, StatusUpdate, ArchivedComplaint, ArchivedStatusUpdate
+
+DIMENSIONS = ('department', 'category', 'priority', 'week')
+CLOSED_STATUSES = ('resolved', 'rejected')
+# Time-in-state metrics, plus time from submission to first resolution
+METRICS = ('resolution', 'submitted', 'in_progress')
+PERCENTILES = (0.5, 0.9, 0.95)
+
+def lifecycle_query(complaint_model, update_model):
+    """Status updates with the columns of their complaint that analytics group by"""
+    return (select(update_model.id, update_model.complaint_id, update_model.new_status, update_model.timestamp,
+                   complaint_model.created_at, complaint_model.assigned_department, complaint_model.category,
+                   complaint_model.priority)
+            .join(complaint_model, complaint_model.id == update_model.complaint_id))
+
+def percentile(values, fraction):
+    """Linear interpolation between the closest ranks of a sorted array"""
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+class Lifecycle:
+    """Where one complaint is in its lifecycle"""
+    __slots__ = ('complaint_id', 'created_at', 'groups', 'priority', 'status', 'since', 'resolved')
+
+    def __init__(self, row):
+        self.complaint_id = row.complaint_id
+        self.created_at = row.created_at
+        self.priority = row.priority
+        week = row.created_at.isocalendar()
+        self.groups = (('all', 'all'),
+                       ('department', row.assigned_department or 'unassigned'),
+                       ('category', row.category),
+                       ('priority', row.priority),
+                       ('week', f'{week[0]}-W{week[1]:02d}'))
+        self.status = None
+        self.since = row.created_at
+        self.resolved = False
+
+class SlaAnalytics:
+    """Incrementally maintained lifecycle statistics for one worker"""
+
+    def __init__(self, targets, rebuild_seconds=3600):
+        self.targets = targets
+        self.rebuild_seconds = rebuild_seconds
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.samples = defaultdict(lambda: {metric: array('d') for metric in METRICS})
+        self.counts = defaultdict(Counter)
+        # Only open complaints are kept; a closed one is reloaded if it is reopened
+        self.open = {}
+        self.last_id = None
+        self.built_at = None
+        # During a rebuild samples are appended and sorted once at the end
+        self.loading = False
+
+    def target_hours(self, priority):
+        return self.targets.get(priority)
+
+    def record(self, lifecycle, metric, hours):
+        for group in lifecycle.groups:
+            if self.loading:
+                self.samples[group][metric].append(hours)
+            else:
+                insort(self.samples[group][metric], hours)
+
+    def count(self, lifecycle, name):
+        for group in lifecycle.groups:
+            self.counts[group][name] += 1
+
+    def apply(self, lifecycle, status, timestamp, record=True):
+        """Move a complaint to ``status``; ``record=False`` replays history already counted"""
+        if status == lifecycle.status or timestamp is None:
+            return
+        if record and lifecycle.status in METRICS:
+            self.record(lifecycle, lifecycle.status, (timestamp - lifecycle.since).total_seconds() / 3600)
+        lifecycle.status = status
+        lifecycle.since = timestamp
+
+        if status == 'resolved' and not lifecycle.resolved:
+            lifecycle.resolved = True
+            if record:
+                hours = (timestamp - lifecycle.created_at).total_seconds() / 3600
+                self.record(lifecycle, 'resolution', hours)
+                self.count(lifecycle, 'resolved')
+                target = self.target_hours(lifecycle.priority)
+                if target is not None and hours > target:
+                    self.count(lifecycle, 'breached')
+        elif status == 'rejected' and record:
+            self.count(lifecycle, 'rejected')
+
+        if status in CLOSED_STATUSES:
+            self.open.pop(lifecycle.complaint_id, None)
+        else:
+            self.open[lifecycle.complaint_id] = lifecycle
+
+    def consume(self, rows, known):
+        """Apply status update rows, ordered by complaint and time, to the lifecycles in ``known``"""
+        for row in rows:
+            lifecycle = known.get(row.complaint_id)
+            if lifecycle is None:
+                lifecycle = known[row.complaint_id] = Lifecycle(row)
+                self.count(lifecycle, 'complaints')
+            self.apply(lifecycle, row.new_status, row.timestamp)
+
+    def rebuild(self):
+        """Read every status update, hot and archived, in one query"""
+        self.reset()
+        hot = lifecycle_query(Complaint, StatusUpdate)
+        archived = lifecycle_query(ArchivedComplaint, ArchivedStatusUpdate)
+        updates = union_all(hot, archived).subquery()
+        rows = db.session.execute(
+            select(updates).order_by(updates.c.complaint_id, updates.c.timestamp, updates.c.id)
+        ).all()
+        self.loading = True
+        self.consume(rows, {})
+        self.loading = False
+        for samples in self.samples.values():
+            for metric, values in samples.items():
+                samples[metric] = array('d', sorted(values))
+        self.last_id = max((row.id for row in rows), default=0)
+        self.built_at = time.monotonic()
+
+    def update(self):
+        """Apply the status updates added since the last refresh"""
+        rows = db.session.execute(
+            lifecycle_query(Complaint, StatusUpdate).where(StatusUpdate.id > self.last_id)
+            .order_by(StatusUpdate.complaint_id, StatusUpdate.timestamp, StatusUpdate.id)
+        ).all()
+        if not rows:
+            return
+
+        # Complaints closed before this refresh (e.g. reopened ones): replay
+        # their earlier history without counting it again
+        reopened = {row.complaint_id for row in rows} - set(self.open)
+        known = dict(self.open)
+        if reopened:
+            history = db.session.execute(
+                lifecycle_query(Complaint, StatusUpdate)
+                .where(StatusUpdate.complaint_id.in_(reopened), StatusUpdate.id <= self.last_id)
+                .order_by(StatusUpdate.complaint_id, StatusUpdate.timestamp, StatusUpdate.id)
+            ).all()
+            for row in history:
+                lifecycle = known.get(row.complaint_id)
+                if lifecycle is None:
+                    lifecycle = known[row.complaint_id] = Lifecycle(row)
+                self.apply(lifecycle, row.new_status, row.timestamp, record=False)
+        self.consume(rows, known)
+        self.last_id = max(row.id for row in rows)
+
+    def refresh(self):
+        with self.lock:
+            if self.built_at is None or time.monotonic() - self.built_at > self.rebuild_seconds:
+                self.rebuild()
+            else:
+                self.update()
+
+    def report(self, dimension, now=None):
+        """One row per value of ``dimension`` (or one 'all' row), with percentiles in hours"""
+        now = now or datetime.utcnow()
+        with self.lock:
+            open_counts, overdue = Counter(), Counter()
+            for lifecycle in self.open.values():
+                target = self.target_hours(lifecycle.priority)
+                late = target is not None and (now - lifecycle.created_at).total_seconds() / 3600 > target
+                for group in lifecycle.groups:
+                    open_counts[group] += 1
+                    overdue[group] += late
+
+            rows = []
+            for group, counts in self.counts.items():
+                if group[0] != dimension:
+                    continue
+                samples = self.samples[group]
+                row = {
+                    'value': group[1],
+                    'complaints': counts['complaints'],
+                    'resolved': counts['resolved'],
+                    'rejected': counts['rejected'],
+                    'breached': counts['breached'],
+                    'breach_rate': counts['breached'] / counts['resolved'] if counts['resolved'] else None,
+                    'open': open_counts[group],
+                    'overdue': overdue[group],
+                }
+                for metric in METRICS:
+                    for fraction in PERCENTILES:
+                        row[f'{metric}_p{int(fraction * 100)}'] = percentile(samples[metric], fraction)
+                rows.append(row)
+        rows.sort(key=lambda row: row['value'], reverse=dimension == 'week')
+        return rows
+
+def get_sla_analytics():
+    """This worker's analytics, brought up to date with the database"""
+    analytics = current_app.extensions.get('sla_analytics')
+    if analytics is None:
+        analytics = current_app.extensions['sla_analytics'] = SlaAnalytics(
+            current_app.config['SLA_TARGET_HOURS'], current_app.config['SLA_REBUILD_SECONDS'])
+    analytics.refresh()
+    return analytics
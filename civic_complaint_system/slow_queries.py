@@ -0,0 +1,189 @@
+"""Slow-query recorder with captured query plans.
+
+Statements slower than SLOW_QUERY_THRESHOLD_MS are normalised (literals
+and IN-lists collapsed), grouped, and written as JSON lines to a rotating
+log file together with the endpoint and the shape of their bound
+parameters. The database's query plan (EXPLAIN QUERY PLAN on SQLite,
+EXPLAIN elsewhere) is captured once per distinct statement, so we can see
+which filter combinations in all_complaints or reports miss the indexes.
+Admins see the worst offenders by total time at /admin/slow-queries.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from flask import has_request_context, request
+from sqlalchemy import event
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+WHITESPACE = re.compile(r'\s+')
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+def normalise_sql(statement):
+    """Collapse literals, placeholder lists and whitespace so variants group together"""
+    statement = STRING_LITERAL.sub('?', statement)
+    statement = NUMBER_LITERAL.sub('?', statement)
+    statement = PLACEHOLDER_LIST.sub('(?, ...)', statement)
+    return WHITESPACE.sub(' ', statement).strip()
+
+def parameter_shape(parameters, executemany):
+    """Describe bound parameters by type only, never by value"""
+    if executemany:
+        rows = list(parameters or [])
+        first = parameter_shape(rows[0], False) if rows else '()'
+        return f'{len(rows)} x {first}'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in parameters.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in (parameters or ())) + ')'
+
+def uses_full_scan(plan):
+    """True if an SQLite plan scans a table without an index"""
+    if not plan:
+        return False
+    return any(line.strip().startswith('SCAN') and 'INDEX' not in line for line in plan.splitlines())
+
+class SlowQueryStats:
+    """Aggregates for one normalised statement"""
+    __slots__ = ('statement', 'count', 'total_time', 'max_time', 'endpoints', 'parameter_shape',
+                 'plan', 'first_seen', 'last_seen')
+
+    def __init__(self, statement, shape):
+        self.statement = statement
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.endpoints = {}
+        self.parameter_shape = shape
+        self.plan = None
+        self.first_seen = datetime.utcnow()
+        self.last_seen = self.first_seen
+
+    @property
+    def full_scan(self):
+        return uses_full_scan(self.plan)
+
+class SlowQueryRecorder:
+    """Collects statements over a duration threshold"""
+
+    def __init__(self, threshold_ms, log_path=None, max_bytes=5242880, backup_count=3, max_statements=500):
+        self.threshold = threshold_ms / 1000
+        self.max_statements = max_statements
+        self.lock = threading.Lock()
+        self.statements = {}
+        self.logger = None
+        if log_path:
+            from logging.handlers import RotatingFileHandler
+            os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+            self.logger = logging.getLogger(f'slow_queries.{id(self)}')
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+            handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    def install(self, engine):
+        """Time statements on the engine and record the slow ones"""
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            # On the statement's context, not the pooled connection: a failed statement is never popped
+            if context is not None:
+                context._slow_query_start = time.perf_counter()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, '_slow_query_start', None)
+            if started is None:
+                return
+            duration = time.perf_counter() - started
+            if duration >= self.threshold:
+                self.record(conn, statement, parameters, executemany, duration)
+
+    def record(self, conn, statement, parameters, executemany, duration):
+        normalised = normalise_sql(statement)
+        endpoint = (request.endpoint or 'unmatched') if has_request_context() else 'background'
+        shape = parameter_shape(parameters, executemany)
+
+        with self.lock:
+            stats = self.statements.get(normalised)
+            new_statement = stats is None
+            if new_statement:
+                if len(self.statements) >= self.max_statements:
+                    # Forget the statement that has cost the least so far
+                    cheapest = min(self.statements.values(), key=lambda s: s.total_time)
+                    del self.statements[cheapest.statement]
+                stats = self.statements[normalised] = SlowQueryStats(normalised, shape)
+            stats.count += 1
+            stats.total_time += duration
+            stats.max_time = max(stats.max_time, duration)
+            stats.endpoints[endpoint] = stats.endpoints.get(endpoint, 0) + 1
+            stats.last_seen = datetime.utcnow()
+
+        # Plan capture happens outside the lock, once per distinct statement
+        if new_statement and normalised.upper().startswith(EXPLAINABLE):
+            first_parameters = parameters[0] if executemany and parameters else parameters
+            stats.plan = self.explain(conn, statement, first_parameters)
+
+        if self.logger:
+            entry = {
+                'time': datetime.utcnow().isoformat(timespec='seconds'),
+                'duration_ms': round(duration * 1000, 2),
+                'endpoint': endpoint,
+                'statement': normalised,
+                'parameters': shape,
+            }
+            if new_statement:
+                entry['plan'] = stats.plan
+            self.logger.info(json.dumps(entry))
+
+    def explain(self, conn, statement, parameters):
+        """Return the database's plan for a statement as text"""
+        dialect = conn.dialect.name
+        prefix = 'EXPLAIN QUERY PLAN ' if dialect == 'sqlite' else 'EXPLAIN '
+        try:
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute(prefix + statement, parameters or ())
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception as e:
+            return f'(plan unavailable: {e})'
+
+        if dialect != 'sqlite':
+            return '\n'.join(str(row[0]) for row in rows)
+
+        # SQLite rows are (id, parent, notused, detail); indent children under parents
+        depth = {0: 0}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, 0) + 1
+            lines.append('  ' * (depth[node_id] - 1) + detail)
+        return '\n'.join(lines)
+
+    def worst(self, limit=50):
+        """Statements ordered by total time spent, worst first"""
+        with self.lock:
+            statements = list(self.statements.values())
+        return sorted(statements, key=lambda s: s.total_time, reverse=True)[:limit]
+
+def init_slow_query_log(app, engine):
+    """Install the slow-query recorder if a threshold is configured"""
+    threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS')
+    if not threshold or threshold <= 0:
+        return None
+
+    recorder = SlowQueryRecorder(
+        threshold,
+        log_path=app.config.get('SLOW_QUERY_LOG'),
+        max_bytes=app.config.get('SLOW_QUERY_LOG_MAX_BYTES', 5242880),
+        backup_count=app.config.get('SLOW_QUERY_LOG_BACKUPS', 3),
+    )
+    recorder.install(engine)
+    app.extensions['slow_queries'] = recorder
+    return recorder
@@ -0,0 +1,189 @@
+"""Standard report downloads generated ahead of time.
+
+At month end every admin exports the same previous-month report within
+the same hour, and each export reads and formats every complaint of the
+month again. Instead, a nightly background job writes the standard
+reports once: yesterday, last week (Monday to Sunday) and last month,
+over all departments and for each department, as CSV and Excel. Files go
+to SNAPSHOT_DIR with their SHA-256 recorded in report_snapshots.
+
+The reports page lists the latest snapshots, and an export whose filters
+match one exactly (whole period, all statuses and categories, no archive)
+is served from its file. Any other filters are still generated on demand.
+
+The job runs at SNAPSHOT_HOUR UTC and queues the next night's run when it
+finishes; the reports page queues one if none is pending. It can also be
+run from cron:
+
+    python snapshots.py
+"""
+import hashlib
+import os
+from datetime import date, datetime, time, timedelta
+from flask import current_app
+from sqlalchemy import func
+from models import db, ReportSnapshot
+from reference import get_reference_data
+
+PERIODS = ('yesterday', 'last_week', 'last_month')
+PERIOD_LABELS = {'yesterday': 'Yesterday', 'last_week': 'Last Week', 'last_month': 'Last Month'}
+# Export formats of routes.admin.reports, with the file extension of each
+FORMATS = {'csv': 'csv', 'excel': 'xlsx'}
+
+def period_range(period, today):
+    """First and last day of a standard period, as seen on ``today``"""
+    if period == 'yesterday':
+        day = today - timedelta(days=1)
+        return day, day
+    if period == 'last_week':
+        monday = today - timedelta(days=today.weekday() + 7)
+        return monday, monday + timedelta(days=6)
+    if period == 'last_month':
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1), end
+    raise ValueError(f'Unknown report period: {period}')
+
+def snapshot_departments(complaints):
+    """'all', then every department with categories, plus any other the complaints are assigned to"""
+    departments = set(get_reference_data().category_departments.values())
+    departments.update(c.assigned_department for c in complaints if c.assigned_department)
+    return ['all'] + sorted(departments)
+
+def write_snapshot_file(directory, filename, data):
+    """Write ``data`` next to its final name first, so a download never sees half a file"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    partial = f'{path}.partial'
+    with open(partial, 'wb') as f:
+        f.write(data)
+    os.replace(partial, path)
+
+def generate_period(period, today, force=False):
+    """Write the snapshots of one period; returns how many files were written"""
+    from exports import REPORT_GENERATORS, status_update_counts
+    from routes.admin import report_complaints
+
+    directory = current_app.config['SNAPSHOT_DIR']
+    start, end = period_range(period, today)
+    existing = {(s.department, s.export_format): s
+                for s in ReportSnapshot.query.filter_by(period=period, start_date=start)}
+    if not force and existing and all(os.path.exists(os.path.join(directory, s.filename))
+                                      for s in existing.values()):
+        # Already generated for this range, e.g. by a retried job
+        return 0
+
+    # One query for the whole period; department reports are subsets of it
+    complaints = report_complaints(datetime.combine(start, time.min), datetime.combine(end, time(23, 59, 59)),
+                                   'all', 'all', 'all', False)
+    update_counts = status_update_counts(complaints)
+    written = 0
+    for department in snapshot_departments(complaints):
+        rows = complaints if department == 'all' else [c for c in complaints if c.assigned_department == department]
+        for export_format, extension in FORMATS.items():
+            response = REPORT_GENERATORS[export_format](rows, update_counts)
+            data = response.get_data()
+            filename = f'{period}_{department}_{start:%Y%m%d}_{end:%Y%m%d}.{extension}'
+            write_snapshot_file(directory, filename, data)
+
+            snapshot = existing.get((department, export_format))
+            if snapshot is None:
+                snapshot = ReportSnapshot(period=period, department=department, export_format=export_format,
+                                          start_date=start)
+                db.session.add(snapshot)
+            snapshot.end_date = end
+            snapshot.filename = filename
+            snapshot.download_name = f'complaints_{period}_{department}_{start.isoformat()}_{end.isoformat()}.{extension}'
+            snapshot.mimetype = response.mimetype
+            snapshot.sha256 = hashlib.sha256(data).hexdigest()
+            snapshot.size = len(data)
+            snapshot.rows = len(rows)
+            snapshot.generated_at = datetime.utcnow()
+            written += 1
+    db.session.commit()
+    return written
+
+def prune_snapshots(today):
+    """Delete snapshots of ranges that ended more than SNAPSHOT_KEEP_DAYS ago, files included"""
+    cutoff = today - timedelta(days=current_app.config['SNAPSHOT_KEEP_DAYS'])
+    expired = ReportSnapshot.query.filter(ReportSnapshot.end_date < cutoff).all()
+    for snapshot in expired:
+        try:
+            os.remove(os.path.join(current_app.config['SNAPSHOT_DIR'], snapshot.filename))
+        except FileNotFoundError:
+            pass
+        db.session.delete(snapshot)
+    db.session.commit()
+    return len(expired)
+
+def generate_snapshots(today=None, force=False):
+    """Generate every standard period as of ``today``; returns files written per period"""
+    today = today or datetime.utcnow().date()
+    written = {period: generate_period(period, today, force) for period in PERIODS}
+    prune_snapshots(today)
+    return written
+
+# Scheduling
+
+def snapshots_generated_at():
+    return db.session.query(func.max(ReportSnapshot.generated_at)).scalar()
+
+def schedule_report_snapshots(now=None):
+    """Queue the next generate_report_snapshots job, at SNAPSHOT_HOUR UTC.
+
+    Today's run is due at once if its hour has passed without snapshots
+    being generated today.
+    """
+    from jobs import enqueue
+
+    now = now or datetime.utcnow()
+    day = now.date()
+    generated_at = snapshots_generated_at()
+    if generated_at is not None and generated_at.date() >= day:
+        day += timedelta(days=1)
+    run_at = max(now, datetime.combine(day, time(current_app.config['SNAPSHOT_HOUR'])))
+    job = enqueue('generate_report_snapshots', {'today': day.isoformat()},
+                  delay=(run_at - now).total_seconds(), idempotency_key=f'report_snapshots:{day.isoformat()}')
+    db.session.commit()
+    return job
+
+# Reading
+
+def latest_snapshots():
+    """The most recent range of each period, with its files by department and format"""
+    periods = []
+    for period in PERIODS:
+        start = db.session.query(func.max(ReportSnapshot.start_date)).filter_by(period=period).scalar()
+        if start is None:
+            continue
+        snapshots = ReportSnapshot.query.filter_by(period=period, start_date=start)\
+                                        .order_by(ReportSnapshot.department).all()
+        departments = {}
+        for snapshot in snapshots:
+            departments.setdefault(snapshot.department, {})[snapshot.export_format] = snapshot
+        periods.append({'period': period, 'label': PERIOD_LABELS[period], 'start_date': start,
+                        'end_date': snapshots[0].end_date,
+                        'generated_at': max(s.generated_at for s in snapshots), 'departments': departments})
+    return periods
+
+def find_snapshot(export_format, start_date, end_date, status_filter, category_filter, department_filter,
+                  include_archived):
+    """The snapshot holding exactly this export, if there is one"""
+    if status_filter != 'all' or category_filter != 'all' or include_archived or not (start_date and end_date):
+        return None
+    return ReportSnapshot.query.filter_by(export_format=export_format, department=department_filter,
+                                          start_date=start_date.date(), end_date=end_date.date())\
+                               .order_by(ReportSnapshot.generated_at.desc()).first()
+
+if __name__ == '__main__':
+    import argparse
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Generate the standard report snapshots')
+    parser.add_argument('--date', type=date.fromisoformat, default=None,
+                        help='generate as if on this day (default: today, UTC)')
+    parser.add_argument('--force', action='store_true', help='regenerate snapshots that already exist')
+    args = parser.parse_args()
+    with create_app().app_context():
+        db.create_all()
+        for period, written in generate_snapshots(args.date, args.force).items():
+            print(f'{period}: {written} files')
@@ -81,6 +81,66 @@ function showMessage(message, type = 'success') {
     }
 }
 
+// ===== LIVE STATUS UPDATES =====
+
+const STATUS_BADGE_CLASSES = {
+    submitted: 'secondary',
+    in_progress: 'primary',
+    resolved: 'success',
+    rejected: 'danger'
+};
+
+/**
+ * Format a status code for display (e.g. "in_progress" -> "In Progress")
+ * @param {string} status - Status code
+ * @returns {string} Display label
+ */
+function formatStatus(status) {
+    return status.replace('_', ' ').replace(/\b\w/g, letter => letter.toUpperCase());
+}
+
+/**
+ * Show a status in an existing badge element
+ * @param {HTMLElement} badge - The badge to update
+ * @param {string} status - New status code
+ */
+function setStatusBadge(badge, status) {
+    badge.className = `badge bg-${STATUS_BADGE_CLASSES[status] || 'secondary'}`;
+    badge.textContent = formatStatus(status);
+}
+
+/**
+ * Subscribe to a Server-Sent Events stream of status updates.
+ * The browser reconnects on its own and resumes from the last event it saw.
+ * @param {string} url - Stream URL
+ * @param {Function} onUpdate - Called with each status update
+ * @returns {EventSource|null} The open stream, or null if unsupported
+ */
+function watchStatusUpdates(url, onUpdate) {
+    if (!window.EventSource) {
+        return null;
+    }
+    const source = new EventSource(url);
+    source.addEventListener('status', event => onUpdate(JSON.parse(event.data)));
+    return source;
+}
+
+/**
+ * Keep the status badges of a complaints table current.
+ * Rows need data-complaint-id and their badge a data-status-badge attribute.
+ * @param {string} url - Stream URL
+ */
+function watchComplaintTable(url) {
+    watchStatusUpdates(url, update => {
+        const row = document.querySelector(`tr[data-complaint-id="${update.complaint_id}"]`);
+        if (!row || update.old_status === update.new_status) {
+            return;
+        }
+        setStatusBadge(row.querySelector('[data-status-badge]'), update.new_status);
+        showMessage(`Complaint #${update.complaint_id} is now ${formatStatus(update.new_status)}.`, 'info');
+    });
+}
+
 /**
  * Confirm action before proceeding
  * @param {string} message - Confirmation message
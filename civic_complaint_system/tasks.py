@@ -0,0 +1,43 @@
+"""Tasks run by the background job workers (see jobs.py)"""
+import time
+from datetime import date, datetime
+from flask import current_app
+from jobs import task
+from metrics import observe_export
+
+@task('export_report', max_attempts=3, timeout=600)
+def export_report(export_format, start_date, end_date, status_filter, category_filter, department_filter,
+                  include_archived=False):
+    """Build a report download into EXPORT_DIR"""
+    from exports import write_report
+    from routes.admin import report_complaints
+
+    complaints = report_complaints(datetime.fromisoformat(start_date), datetime.fromisoformat(end_date),
+                                   status_filter, category_filter, department_filter, include_archived)
+    started = time.perf_counter()
+    result = write_report(export_format, complaints, current_app.config['EXPORT_DIR'])
+    observe_export(export_format, len(complaints), time.perf_counter() - started)
+    return result
+
+@task('refresh_forecasts', max_attempts=2, timeout=1800)
+def refresh_forecasts():
+    """Refit the complaint volume forecasts shown on the admin dashboard"""
+    from forecasting import refresh_forecasts as refresh
+
+    return {'series': refresh()}
+
+@task('rebuild_projections', max_attempts=1, timeout=1800)
+def rebuild_projections(names=()):
+    """Recompute status log projections from scratch"""
+    from projections import rebuild
+
+    return rebuild(*names)
+
+@task('generate_report_snapshots', max_attempts=2, timeout=3600)
+def generate_report_snapshots(today=None):
+    """Write the standard report snapshots, then queue the next night's run"""
+    from snapshots import generate_snapshots, schedule_report_snapshots
+
+    written = generate_snapshots(date.fromisoformat(today) if today else None)
+    schedule_report_snapshots()
+    return written
@@ -0,0 +1,53 @@
+import json
+from datetime import datetime, timedelta
+from functools import partial
+from models import db, AnomalyState, AnomalyAlert, NotificationOutbox
+from anomalies import advance, z_score
+from notifications import build_digest
+
+def test_running_statistics():
+    start = datetime(2024, 7, 1)
+    state = {'hour': start, 'count': 0, 'mean': 0.0, 'variance': 0.0, 'hours': 0}
+    for hour in range(1, 49):
+        state = advance(state, start + timedelta(hours=hour), 0.2)
+        state['count'] = 2 if hour % 2 else 0
+    assert abs(state['mean'] - 1) < 0.2 and abs(state['variance'] - 1) < 0.3 and state['hours'] == 48
+    assert z_score(2, state['mean'], state['variance']) < 1.5
+    assert z_score(8, state['mean'], state['variance']) > 4
+
+    # A long quiet spell decays the average without one step per hour
+    quiet = advance(state, state['hour'] + timedelta(days=365), 0.2)
+    assert quiet['mean'] < 1e-6 and quiet['hours'] == 48 + 365 * 24 and quiet['count'] == 0
+    # Earlier hours leave the state alone
+    assert advance(state, start, 0.2) is state
+
+def test_burst_raises_one_alert_and_notifies_department(app, client, login, add_complaint):
+    now = datetime.utcnow()
+    water_supply = partial(add_complaint, category='water_supply', assigned_department='water',
+                           description='No water since morning', address='Gandhi Nagar, Pune', created_at=now)
+    water_supply(category='garbage')
+    water_supply(address='Koregaon Park, Pune')
+    # Imported or back-dated complaints are not live submissions
+    water_supply(created_at=now - timedelta(days=2))
+    for _ in range(4):
+        water_supply(address='12, Gandhi Nagar, Pune 411001')
+    assert AnomalyAlert.query.count() == 0
+
+    water_supply()
+    water_supply()
+    alert = AnomalyAlert.query.one()
+    assert (alert.category, alert.locality, alert.count, alert.department) == (
+        'water_supply', 'gandhi nagar, pune', 5, 'water')
+    state = db.session.get(AnomalyState, ('water_supply', 'gandhi nagar, pune'))
+    assert state.count == 6 and state.alerted_hour == alert.hour
+
+    notification = NotificationOutbox.query.one()
+    assert (notification.kind, notification.recipient) == ('complaint_spike', 'water@example.com')
+    digest = build_digest('water', notification.recipient, [notification])
+    assert digest['subject'].startswith('Complaint spike:')
+    assert '5 water_supply complaints from gandhi nagar, pune' in digest['text']
+    assert json.loads(notification.payload)['id'] == alert.id
+
+    login('admin@example.com', 'Admin123!')
+    response = client.get('/admin/dashboard')
+    assert b'Complaint Spikes' in response.data and b'Gandhi Nagar, Pune' in response.data
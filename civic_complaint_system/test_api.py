@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+import pytest
+from flask import g
+from models import db, Complaint, User
+from archive import archive_closed_complaints
+
+@pytest.fixture(autouse=True)
+def fresh_user_per_request(app):
+    # The app fixture keeps one app context, and so one g, for the whole test;
+    # forget the user Flask-Login cached there so every request authenticates
+    # on its own, as it does when each request gets its own context
+    @app.before_request
+    def forget_user():
+        g.pop('_login_user', None)
+
+@pytest.fixture
+def token(client):
+    """Bearer token header for the given user"""
+    def get_token(email, password):
+        response = client.post('/api/v1/tokens', json={'email': email, 'password': password})
+        assert response.status_code == 201
+        return {'Authorization': f"Bearer {response.get_json()['token']}"}
+    return get_token
+
+@pytest.fixture
+def add_complaints(add_complaint):
+    """Add ``count`` high priority complaints a minute apart, from a day ago; returns their ids"""
+    def add(count, **fields):
+        start = datetime.utcnow() - timedelta(days=1)
+        complaints = [add_complaint(priority='high', created_at=start + timedelta(minutes=i), commit=False, **fields)
+                      for i in range(count)]
+        db.session.commit()
+        return [complaint.id for complaint in complaints]
+    return add
+
+def test_token_auth_does_not_set_a_session_cookie(client, token):
+    headers = token('citizen@example.com', 'Citizen123!')
+    response = client.get('/api/v1/complaints', headers=headers)
+    assert response.status_code == 200
+    assert 'Set-Cookie' not in response.headers
+
+    assert client.get('/api/v1/complaints').status_code == 401
+    assert client.get('/api/v1/complaints', headers={'Authorization': 'Bearer forged'}).status_code == 401
+    assert client.post('/api/v1/tokens', json={'email': 'citizen@example.com', 'password': 'wrong'}).status_code == 401
+
+def test_password_change_revokes_tokens(app, client, token):
+    headers = token('citizen@example.com', 'Citizen123!')
+    user = User.query.filter_by(email='citizen@example.com').first()
+    user.set_password('Changed123!')
+    db.session.commit()
+    assert client.get('/api/v1/dashboard', headers=headers).status_code == 401
+
+def test_cursor_pagination_walks_every_complaint_once(app, client, token, add_complaints):
+    ids = add_complaints(7)
+    headers = token('citizen@example.com', 'Citizen123!')
+
+    seen, cursor = [], None
+    while True:
+        url = '/api/v1/complaints?limit=3&fields=id,status' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url, headers=headers).get_json()
+        assert all(set(item) == {'id', 'status'} for item in page['data'])
+        seen += [item['id'] for item in page['data']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert seen == sorted(ids, reverse=True)
+
+def test_unknown_fields_are_rejected(app, client, token):
+    headers = token('citizen@example.com', 'Citizen123!')
+    response = client.get('/api/v1/complaints?fields=id,password_hash', headers=headers)
+    assert response.status_code == 400
+    assert 'password_hash' in response.get_json()['error']['message']
+
+def test_role_rules_match_html_views(app, client, token, add_complaints):
+    roads_id, = add_complaints(1)
+    water_id, = add_complaints(1, category='drainage', assigned_department='water')
+
+    roads = token('roads@example.com', 'Officer123!')
+    listed = client.get('/api/v1/complaints?fields=id', headers=roads).get_json()['data']
+    assert [item['id'] for item in listed] == [roads_id]
+    assert client.get(f'/api/v1/complaints/{water_id}', headers=roads).status_code == 403
+    assert client.post('/api/v1/complaints', json={}, headers=roads).status_code == 403
+
+    admin = token('admin@example.com', 'Admin123!')
+    listed = client.get('/api/v1/complaints?fields=id', headers=admin).get_json()['data']
+    assert {item['id'] for item in listed} == {roads_id, water_id}
+
+def test_citizen_submits_and_follows_a_complaint(app, client, token):
+    headers = token('citizen@example.com', 'Citizen123!')
+    invalid = client.post('/api/v1/complaints', json={'category': 'potholes'}, headers=headers)
+    assert invalid.status_code == 400
+    assert invalid.get_json()['error']['details']
+
+    response = client.post('/api/v1/complaints', headers=headers, json={
+        'category': 'garbage', 'description': 'Overflowing bins near the market',
+        'address': 'Park Street, Kolkata', 'priority': 'high'})
+    assert response.status_code == 201
+    complaint = response.get_json()['data']
+    assert complaint['assigned_department'] == 'sanitation'
+    assert response.headers['Location'].endswith(f"/api/v1/complaints/{complaint['id']}")
+
+    timeline = client.get(f"/api/v1/complaints/{complaint['id']}/timeline", headers=headers).get_json()['data']
+    assert timeline[0]['new_status'] == 'submitted'
+    assert timeline[0]['updated_by_name'] == 'Jane Citizen'
+
+    dashboard = client.get('/api/v1/dashboard', headers=headers).get_json()['data']
+    assert dashboard['total'] == 1 and dashboard['pending'] == 1
+
+def test_archived_complaints_stay_readable(app, client, token, add_complaints):
+    complaint_id, = add_complaints(1, status='resolved')
+    complaint = db.session.get(Complaint, complaint_id)
+    complaint.resolved_at = complaint.updated_at = datetime.utcnow() - timedelta(days=400)
+    db.session.commit()
+    archive_closed_complaints(older_than_days=365)
+
+    headers = token('citizen@example.com', 'Citizen123!')
+    response = client.get(f'/api/v1/complaints/{complaint_id}?fields=id,status', headers=headers)
+    assert response.get_json()['data'] == {'id': complaint_id, 'status': 'resolved'}
@@ -0,0 +1,92 @@
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from models import Complaint, StatusUpdate, ArchivedComplaint, ArchivedStatusUpdate
+from archive import archive_closed_complaints
+from migrate_autoincrement import migrate_database
+
+@pytest.fixture
+def add_aged(add_complaint):
+    """Add a complaint in ``status`` last changed ``days_ago``; returns its id"""
+    def add(status, days_ago):
+        when = datetime.utcnow() - timedelta(days=days_ago)
+        return add_complaint(status=status, priority='high', created_at=when, updated_at=when, submitted=True).id
+    return add
+
+def test_archives_only_old_closed_complaints(app, add_aged):
+    old_resolved = [add_aged('resolved', 400) for _ in range(5)]
+    old_open = add_aged('in_progress', 400)
+    recent_rejected = add_aged('rejected', 10)
+
+    archived = archive_closed_complaints(older_than_days=365, batch_size=2)
+
+    assert archived == 5
+    assert {c.id for c in Complaint.query.all()} == {old_open, recent_rejected}
+    assert sorted(c.id for c in ArchivedComplaint.query.all()) == old_resolved
+    assert StatusUpdate.query.filter(StatusUpdate.complaint_id.in_(old_resolved)).count() == 0
+    assert ArchivedStatusUpdate.query.count() == 5
+
+def test_view_complaint_reads_through_to_archive(app, client, login, add_aged):
+    complaint_id = add_aged('resolved', 400)
+    archive_closed_complaints(older_than_days=365)
+
+    login('admin@example.com', 'Admin123!')
+    response = client.get(f'/complaints/{complaint_id}')
+    assert response.status_code == 200
+    assert b'Archived' in response.data
+
+    assert client.get('/complaints/9999').status_code == 404
+
+def test_reports_include_archive_only_when_asked(app, client, login, add_aged):
+    complaint_id = add_aged('resolved', 400)
+    archive_closed_complaints(older_than_days=365)
+    login('admin@example.com', 'Admin123!')
+
+    start = (datetime.utcnow() - timedelta(days=500)).strftime('%Y-%m-%d')
+    response = client.get(f'/admin/reports?start_date={start}')
+    assert f'#{complaint_id}'.encode() not in response.data
+
+    response = client.get(f'/admin/reports?start_date={start}&include_archived=1')
+    assert f'#{complaint_id}'.encode() in response.data
+
+def test_archived_ids_are_not_reused(app, client, login, add_aged):
+    complaint_id = add_aged('resolved', 400)
+    update_id = StatusUpdate.query.filter_by(complaint_id=complaint_id).one().id
+    archive_closed_complaints(older_than_days=365)
+
+    new_id = add_aged('submitted', 0)
+    assert new_id > complaint_id
+    assert StatusUpdate.query.filter_by(complaint_id=new_id).one().id > update_id
+
+    login('admin@example.com', 'Admin123!')
+    assert b'Archived' in client.get(f'/complaints/{complaint_id}').data
+
+def test_migrates_tables_that_reuse_ids(tmp_path):
+    path = tmp_path / 'legacy.db'
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR(100));
+        CREATE TABLE complaints (id INTEGER NOT NULL, user_id INTEGER NOT NULL, assigned_department SMALLINT,
+            assigned_officer INTEGER, category SMALLINT NOT NULL, description TEXT NOT NULL,
+            address VARCHAR(255) NOT NULL, landmark VARCHAR(255), image_filename VARCHAR(255), status SMALLINT,
+            priority SMALLINT, resolution_notes TEXT, created_at DATETIME, updated_at DATETIME, resolved_at DATETIME,
+            PRIMARY KEY (id));
+        CREATE INDEX idx_status_priority ON complaints (status, priority);
+        CREATE TABLE complaints_archive (id INTEGER NOT NULL, PRIMARY KEY (id));
+        INSERT INTO complaints (id, user_id, category, description, address) VALUES (1, 1, 1, 'Pothole', 'MG Road');
+        INSERT INTO complaints_archive (id) VALUES (7);
+    """)
+    conn.commit()
+    conn.close()
+
+    engine = create_engine(f'sqlite:///{path}')
+    assert migrate_database(engine, log=lambda message: None) == ['complaints']
+    assert migrate_database(engine, log=lambda message: None) == []
+    with engine.begin() as conn:
+        assert conn.exec_driver_sql('SELECT id, description FROM complaints').all() == [(1, 'Pothole')]
+        conn.exec_driver_sql("INSERT INTO complaints (user_id, category, description, address) "
+                             "VALUES (1, 2, 'Streetlight', 'MG Road')")
+        assert conn.exec_driver_sql("SELECT id FROM complaints WHERE description = 'Streetlight'").scalar() == 8
+        indexes = {row[1] for row in conn.exec_driver_sql('PRAGMA index_list(complaints)')}
+    assert {index.name for index in Complaint.__table__.indexes} <= indexes
@@ -0,0 +1,45 @@
+from benchmarks.load import ROUTES, compare_results, run_load
+from benchmarks.startup import measure_once
+from benchmarks.synthetic import build_dataset
+
+def test_load_run_reports_every_role(tmp_path):
+    dataset = build_dataset(str(tmp_path / 'small.db'), 300, log=lambda message: None)
+    results = run_load(dataset, {'anonymous': 1, 'citizen': 1, 'municipal': 1, 'admin': 1},
+                       max_requests=6, warmup=0, seed=7, log=lambda message: None)
+
+    assert results['dataset']['complaints'] == 300
+    assert results['requests'] == 24
+    roles = {route['role'] for route in results['routes'].values()}
+    assert roles == set(ROUTES)
+    for route in results['routes'].values():
+        assert route['errors'] == 0
+        assert route['p50_ms'] <= route['p95_ms'] <= route['p99_ms']
+        assert route['queries_mean'] is not None
+
+def test_server_mode(tmp_path):
+    dataset = build_dataset(str(tmp_path / 'small.db'), 50, log=lambda message: None)
+    results = run_load(dataset, {'citizen': 1}, max_requests=3, warmup=0, server=True, log=lambda message: None)
+    assert results['mode'] == 'server'
+    assert results['requests'] == 3
+
+def test_compare_flags_slower_routes_and_extra_queries():
+    def results(p95, queries):
+        return {'routes': {'home': {'p95_ms': p95, 'queries_mean': queries}}}
+
+    assert compare_results(results(100, 8), results(110, 8))[1] == []
+    assert compare_results(results(100, 8), results(150, 8))[1] == ['home']
+    assert compare_results(results(100, 8), results(100, 12))[1] == ['home']
+
+def test_cold_start_skips_optional_dependencies():
+    result = measure_once()
+    assert result['create_app_ms'] > 0 and result['rss_kb'] > 0
+    assert 'app' in result['import_modules']
+    # Loaded on first export or profiled request, not at boot
+    for module in ('openpyxl', 'exports', 'cProfile', 'pstats'):
+        assert module not in result['import_modules']
+
+def test_excel_export_loads_openpyxl_on_demand(client, login):
+    login('admin@example.com', 'Admin123!')
+    response = client.get('/admin/reports?export=excel')
+    assert response.status_code == 200
+    assert response.data[:2] == b'PK'
@@ -0,0 +1,81 @@
+import csv
+import json
+from models import db, User, Complaint, StatusUpdate, ImportCheckpoint
+from bulk_import import run_import
+
+COMPLAINT_FIELDS = ['user_email', 'category', 'description', 'address', 'priority', 'status', 'created_at']
+
+def write_complaints_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COMPLAINT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def complaint_row(**overrides):
+    row = {'user_email': 'citizen@example.com', 'category': 'drainage', 'description': 'Blocked drain overflowing',
+           'address': 'Adyar, Chennai', 'priority': 'high', 'status': 'submitted', 'created_at': '2024-07-01 09:30'}
+    row.update(overrides)
+    return row
+
+def test_imports_complaints_with_timeline_and_rejects(app, tmp_path):
+    path = str(tmp_path / 'complaints.csv')
+    write_complaints_csv(path, [
+        complaint_row(),
+        complaint_row(status='resolved', category='potholes'),
+        complaint_row(category='volcano'),
+        complaint_row(user_email='nobody@example.com'),
+        complaint_row(description='short'),
+    ])
+
+    stats = run_import('complaints', path, chunk_size=2, assign_officers=True, log=lambda message: None)
+
+    assert stats['inserted'] == 2
+    assert stats['rejected'] == 3
+    complaints = Complaint.query.order_by(Complaint.id).all()
+    assert [c.assigned_department for c in complaints] == ['water', 'roads']
+    assert complaints[1].resolved_at is not None
+    assert complaints[1].assigned_officer == User.query.filter_by(email='roads@example.com').first().id
+    assert StatusUpdate.query.count() == 3
+
+    with open(path + '.rejects.ndjson') as f:
+        rejects = [json.loads(line) for line in f]
+    assert len(rejects) == 3
+
+def test_resumes_from_checkpoint(app, tmp_path):
+    path = str(tmp_path / 'complaints.csv')
+    write_complaints_csv(path, [complaint_row(description=f'Blocked drain number {i}') for i in range(5)])
+
+    # A previous run committed the first two rows before failing
+    source = f'complaints:{path}'
+    db.session.add(ImportCheckpoint(source=source, rows_done=2, inserted=2))
+    db.session.commit()
+
+    stats = run_import('complaints', path, chunk_size=2, log=lambda message: None)
+    assert stats['skipped'] == 2
+    assert [c.description for c in Complaint.query.order_by(Complaint.id)] == \
+        [f'Blocked drain number {i}' for i in range(2, 5)]
+
+    db.session.expire_all()
+    checkpoint = db.session.get(ImportCheckpoint, source)
+    assert checkpoint.completed and checkpoint.rows_done == 5 and checkpoint.inserted == 5
+
+    # Completed imports are not repeated
+    assert run_import('complaints', path, log=lambda message: None)['inserted'] == 0
+
+def test_imports_users_across_process_pool(app, tmp_path):
+    path = str(tmp_path / 'users.ndjson')
+    records = [
+        {'name': 'Ravi Kumar', 'email': 'ravi@example.com', 'password_hash': 'pbkdf2:sha256:1$x$y'},
+        {'name': 'Drain Officer', 'email': 'drains@example.com', 'role': 'municipal', 'department': 'water',
+         'password_hash': 'pbkdf2:sha256:1$x$y'},
+        {'name': 'Dup', 'email': 'citizen@example.com', 'password_hash': 'pbkdf2:sha256:1$x$y'},
+        {'name': 'No Dept', 'email': 'nodept@example.com', 'role': 'municipal', 'password_hash': 'x'},
+    ]
+    with open(path, 'w') as f:
+        f.write('\n'.join(json.dumps(record) for record in records))
+
+    stats = run_import('users', path, chunk_size=2, workers=2, log=lambda message: None)
+
+    assert stats['inserted'] == 2
+    assert stats['rejected'] == 2
+    assert User.query.filter_by(email='drains@example.com').first().role == 'municipal'
@@ -0,0 +1,59 @@
+import pytest
+from models import db, Complaint, StatusUpdate
+
+@pytest.fixture
+def add_complaints(add_complaint):
+    """Add ``count`` streetlight complaints in progress in a department; returns their ids"""
+    def add(department, count):
+        return [add_complaint(category='streetlight', description='Street light not working',
+                              assigned_department=department, status='in_progress', priority='medium',
+                              resolution_notes='old notes').id
+                for _ in range(count)]
+    return add
+
+def test_officer_resolves_batch_in_one_request(app, client, login, add_complaints):
+    ids = add_complaints('roads', 3)
+    login('roads@example.com', 'Officer123!')
+
+    response = client.post('/complaints/bulk-status',
+                           data={'complaint_ids': ids, 'status': 'resolved', 'note': 'Lights replaced'})
+    assert response.status_code == 302
+
+    db.session.expire_all()
+    complaints = Complaint.query.filter(Complaint.id.in_(ids)).all()
+    assert all(c.status == 'resolved' and c.resolved_at is not None for c in complaints)
+    updates = StatusUpdate.query.filter(StatusUpdate.complaint_id.in_(ids)).all()
+    assert len(updates) == 3
+    assert all(u.old_status == 'in_progress' and u.note == 'Lights replaced' for u in updates)
+
+def test_department_check_rejects_whole_batch(app, client, login, add_complaints):
+    roads_ids = add_complaints('roads', 2)
+    water_ids = add_complaints('water', 1)
+    login('roads@example.com', 'Officer123!')
+
+    client.post('/complaints/bulk-status', data={'complaint_ids': roads_ids + water_ids, 'status': 'rejected'})
+
+    db.session.expire_all()
+    assert Complaint.query.filter_by(status='rejected').count() == 0
+    assert StatusUpdate.query.count() == 0
+
+def test_limit_and_citizen_access(app, client, login, add_complaints):
+    app.config['BULK_STATUS_UPDATE_LIMIT'] = 2
+    ids = add_complaints('roads', 3)
+
+    login('admin@example.com', 'Admin123!')
+    client.post('/complaints/bulk-status', data={'complaint_ids': ids, 'status': 'submitted'})
+    db.session.expire_all()
+    assert Complaint.query.filter_by(status='submitted').count() == 0
+
+    client.post('/complaints/bulk-status', data={'complaint_ids': ids[:2], 'status': 'submitted'})
+    db.session.expire_all()
+    complaints = Complaint.query.filter_by(status='submitted').all()
+    assert len(complaints) == 2
+    assert all(c.resolution_notes is None for c in complaints)
+
+    client.get('/logout')
+    login('citizen@example.com', 'Citizen123!')
+    client.post('/complaints/bulk-status', data={'complaint_ids': ids[2:], 'status': 'resolved'})
+    db.session.expire_all()
+    assert db.session.get(Complaint, ids[2]).status == 'in_progress'
@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import tempfile
+import pytest
+from sqlalchemy import create_engine, text
+from models import db, User, Complaint
+from migrate_coded_columns import migrate_database
+
+def test_columns_stored_as_codes_and_read_as_strings(app, add_complaint):
+    complaint = add_complaint(category='garbage', assigned_department='sanitation', status='in_progress',
+                              priority='high')
+
+    raw = db.session.execute(text('SELECT status, priority, category, assigned_department FROM complaints')).one()
+    assert raw == (2, 3, 3, 3)
+    assert db.session.execute(text("SELECT role FROM users WHERE email = 'admin@example.com'")).scalar() == 3
+
+    db.session.expire_all()
+    complaint = db.session.get(Complaint, complaint.id)
+    assert (complaint.status, complaint.priority, complaint.category) == ('in_progress', 'high', 'garbage')
+    assert complaint.assigned_department == 'sanitation'
+
+def test_filters_and_ordering(app, add_complaint):
+    for priority in ['medium', 'high', 'low']:
+        add_complaint(priority=priority)
+
+    ordered = Complaint.query.order_by(Complaint.priority.desc()).all()
+    assert [c.priority for c in ordered] == ['high', 'medium', 'low']
+    assert Complaint.query.filter(Complaint.priority.in_(['high', 'low'])).count() == 2
+    assert User.query.filter_by(role='municipal').count() == 2
+    # Unknown filter values match nothing instead of failing
+    assert Complaint.query.filter_by(status='pending').count() == 0
+
+def test_unknown_value_rejected_on_write(app, add_complaint):
+    with pytest.raises(Exception):
+        add_complaint(priority='urgent')
+    db.session.rollback()
+
+def test_migrates_legacy_varchar_tables():
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'legacy.db')
+        conn = sqlite3.connect(path)
+        conn.executescript("""
+            CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, email VARCHAR(120) NOT NULL,
+                password_hash VARCHAR(255) NOT NULL, role VARCHAR(20) NOT NULL, department VARCHAR(50),
+                is_active BOOLEAN, created_at DATETIME, last_login DATETIME);
+            CREATE TABLE complaints (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, assigned_department VARCHAR(50),
+                assigned_officer INTEGER, category VARCHAR(50) NOT NULL, description TEXT NOT NULL,
+                address VARCHAR(255) NOT NULL, landmark VARCHAR(255), image_filename VARCHAR(255), status VARCHAR(20),
+                priority VARCHAR(10), resolution_notes TEXT, created_at DATETIME, updated_at DATETIME, resolved_at DATETIME);
+            CREATE INDEX idx_status_priority ON complaints (status, priority);
+            INSERT INTO users (id, name, email, password_hash, role) VALUES (1, 'Jane', 'jane@example.com', 'x', 'citizen');
+            INSERT INTO complaints (id, user_id, assigned_department, category, description, address, status, priority)
+                VALUES (1, 1, 'water', 'drainage', 'Blocked drain', 'Adyar, Chennai', 'resolved', 'low'),
+                       (2, 1, NULL, 'other', 'Broken bench', 'Dwarka, Delhi', 'submitted', 'high');
+        """)
+        conn.commit()
+        conn.close()
+
+        engine = create_engine('sqlite:///' + path)
+        assert migrate_database(engine, batch_size=1, log=lambda message: None) == ['users', 'complaints']
+        assert migrate_database(engine, log=lambda message: None) == []
+        with engine.connect() as conn:
+            rows = conn.execute(text('SELECT id, assigned_department, category, status, priority FROM complaints ORDER BY id')).all()
+            assert rows == [(1, 2, 5, 3, 1), (2, None, 6, 1, 3)]
+            assert conn.execute(text('SELECT role FROM users')).scalar() == 1
+            indexes = {row[1] for row in conn.execute(text('PRAGMA index_list(complaints)'))}
+            assert 'idx_status_priority' in indexes
+        engine.dispose()
@@ -59,7 +59,7 @@ def create_sample_data():
             description='Large pothole on Main Street causing traffic issues',
             address='123 Main Street',
             landmark='Near Central Park',
-            status='pending'
+            status='submitted'
         )
         db.session.add(complaint1)
 
@@ -89,7 +89,7 @@ def create_sample_data():
         update1 = StatusUpdate(
             complaint_id=2,
             updated_by=2,  # officer
-            old_status='pending',
+            old_status='submitted',
             new_status='in_progress',
             note='Assigned to maintenance team'
         )
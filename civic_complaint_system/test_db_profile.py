@@ -0,0 +1,29 @@
+import os
+import tempfile
+from sqlalchemy import create_engine, text
+from config import ProductionConfig, production_engine_options
+from models import install_sqlite_pragmas
+
+def test_sqlite_pragmas_applied_on_connect():
+    with tempfile.TemporaryDirectory() as workdir:
+        uri = 'sqlite:///' + os.path.join(workdir, 'profile.db')
+        engine = create_engine(uri, **production_engine_options(uri))
+        install_sqlite_pragmas(engine, ProductionConfig.SQLITE_PRAGMAS)
+
+        with engine.connect() as conn:
+            assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+            assert conn.execute(text('PRAGMA busy_timeout')).scalar() == ProductionConfig.SQLITE_PRAGMAS['busy_timeout']
+            assert conn.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+        engine.dispose()
+
+def test_engine_options_per_backend():
+    sqlite_options = production_engine_options('sqlite:////tmp/complaints.db')
+    assert sqlite_options['pool_size'] == 5
+    assert 'pool_pre_ping' not in sqlite_options
+
+    server_options = production_engine_options('postgresql://civic@localhost/complaints')
+    assert server_options['pool_pre_ping'] is True
+    assert server_options['pool_size'] == 10
+    assert server_options['pool_recycle'] == 1800
+
+    assert production_engine_options('sqlite://') == {}
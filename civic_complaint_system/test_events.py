@@ -0,0 +1,99 @@
+import json
+import pytest
+from app import create_app
+from config import TestingConfig
+from models import db, User, bulk_update_status
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    """App on a database file, so the bus thread gets its own connection"""
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'events.db'}")
+    monkeypatch.setattr(TestingConfig, 'EVENTS_HEARTBEAT_SECONDS', 0.2)
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        citizen = User(name='Jane Citizen', email='citizen@example.com', role='citizen')
+        citizen.set_password('Citizen123!')
+        other = User(name='Other Citizen', email='other@example.com', role='citizen')
+        other.set_password('Citizen123!')
+        roads = User(name='Roads Officer', email='roads@example.com', role='municipal', department='roads')
+        roads.set_password('Officer123!')
+        db.session.add_all([citizen, other, roads])
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+def change_status(complaint, new_status):
+    officer = User.query.filter_by(email='roads@example.com').first()
+    complaint.add_status_update(updated_by=officer.id, old_status=complaint.status, new_status=new_status)
+    complaint.status = new_status
+    db.session.commit()
+
+def read_events(response, count):
+    """The first ``count`` status events of a stream, skipping heartbeats"""
+    events = []
+    for chunk in response.response:
+        for message in chunk.decode().split('\n\n'):
+            if message.startswith('id: '):
+                events.append(json.loads(message.split('data: ', 1)[1]))
+        if len(events) >= count:
+            return events
+    return events
+
+def test_one_commit_reaches_every_matching_subscriber(app, add_complaint):
+    bus = app.extensions['status_events']
+    complaint = add_complaint(submitted=True)
+    water = add_complaint(category='drainage', assigned_department='water', submitted=True)
+
+    by_complaint = bus.subscribe(complaint_id=complaint.id)
+    by_department = bus.subscribe(department='roads')
+    other_department = bus.subscribe(department='water')
+    try:
+        change_status(complaint, 'in_progress')
+        for subscription in (by_complaint, by_department):
+            event = subscription.next_event(timeout=5)
+            assert (event['complaint_id'], event['new_status']) == (complaint.id, 'in_progress')
+        assert other_department.next_event(timeout=0.3) is None
+
+        # Core inserts from bulk updates are picked up too
+        bulk_update_status([(water.id, 'submitted')], 'resolved', water.user_id)
+        db.session.commit()
+        assert other_department.next_event(timeout=5)['new_status'] == 'resolved'
+    finally:
+        for subscription in (by_complaint, by_department, other_department):
+            bus.unsubscribe(subscription)
+
+def test_stream_resumes_from_last_event_id(app, client, login, add_complaint):
+    complaint = add_complaint(submitted=True)
+    change_status(complaint, 'in_progress')
+    first_update = complaint.get_status_history()[-1].id
+    login('citizen@example.com', 'Citizen123!')
+
+    response = client.get(f'/complaints/{complaint.id}/events', headers={'Last-Event-ID': str(first_update)},
+                          buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    replayed, = read_events(response, 1)
+    assert replayed['new_status'] == 'in_progress'
+
+    change_status(complaint, 'resolved')
+    live, = read_events(response, 1)
+    assert live['new_status'] == 'resolved' and live['id'] > replayed['id']
+    response.close()
+    assert not app.extensions['status_events'].subscribers
+
+def test_streams_follow_view_permissions_and_connection_cap(app, client, login, add_complaint):
+    complaint = add_complaint(email='other@example.com', submitted=True)
+    login('citizen@example.com', 'Citizen123!')
+    assert client.get(f'/complaints/{complaint.id}/events').status_code == 403
+
+    # Streams leave half of the worker's threads for ordinary requests
+    bus = app.extensions['status_events']
+    assert bus.max_subscribers == app.config['WEB_THREADS'] // 2
+    bus.max_subscribers = 1
+    held = bus.subscribe()
+    try:
+        response = client.get('/complaints/events')
+        assert response.status_code == 503
+        assert 'Retry-After' in response.headers
+    finally:
+        bus.unsubscribe(held)
@@ -0,0 +1,64 @@
+from datetime import datetime, time, timedelta
+import pytest
+from models import db, ComplaintForecast, Job
+from forecasting import daily_series, fit_series, refresh_forecasts
+
+WEEKLY = [10, 12, 11, 9, 8, 3, 2]
+
+@pytest.fixture
+def add_complaints(add_complaint):
+    """Add ``count`` complaints made at 10:00 on ``day``, left uncommitted"""
+    def add(day, count, **fields):
+        for _ in range(count):
+            add_complaint(created_at=datetime.combine(day, time(10)), commit=False, **fields)
+    return add
+
+def test_fit_recovers_weekly_pattern():
+    values = WEEKLY * 12
+    key, model, forecasts = fit_series((('roads', 'potholes'), values, 7))
+    assert key == ('roads', 'potholes') and model == 'holt_winters'
+    # The series ends on the last day of a week, so the forecast starts a new one
+    for (expected, low, high), actual in zip(forecasts, WEEKLY):
+        assert abs(expected - actual) < 1
+        assert low <= expected <= high
+
+    # Sparse series are forecast by their recent average
+    key, model, forecasts = fit_series((('roads', 'drainage'), [0, 1, 0, 2, 0], 3))
+    assert model == 'mean' and forecasts[0][0] == 0.6 and len(forecasts) == 3
+
+def test_refresh_stores_forecasts(app, add_complaints):
+    today = datetime.utcnow().date()
+    for days_ago in range(1, 29):
+        add_complaints(today - timedelta(days=days_ago), 3 if days_ago % 7 else 1)
+    add_complaints(today - timedelta(days=2), 2, category='garbage', assigned_department='sanitation')
+    add_complaints(today, 5)  # today is not complete and is left out
+    db.session.commit()
+
+    series = daily_series(30, today)
+    assert len(series[('roads', 'potholes')]) == 28 and sum(series[('roads', 'potholes')]) == 24 * 3 + 4
+    assert series[('sanitation', 'garbage')] == [2, 0]
+
+    assert refresh_forecasts(today, workers=1) == 2
+    assert ComplaintForecast.query.count() == 2 * app.config['FORECAST_HORIZON_DAYS']
+    # Refitting replaces the previous forecasts
+    refresh_forecasts(today, workers=1)
+    rows = ComplaintForecast.query.filter_by(department='roads').order_by(ComplaintForecast.day).all()
+    assert [row.day for row in rows] == [today + timedelta(days=h) for h in range(7)]
+    assert all(row.model == 'holt_winters' and row.low <= row.expected <= row.high for row in rows)
+
+def test_dashboard_shows_forecast_and_schedules_refresh(app, client, login, add_complaints):
+    login('admin@example.com', 'Admin123!')
+    response = client.get('/admin/dashboard')
+    assert b'No forecast yet' in response.data
+    # Opening the dashboard again the same day does not queue another refresh
+    client.get('/admin/dashboard')
+    assert Job.query.filter_by(name='refresh_forecasts').count() == 1
+
+    today = datetime.utcnow().date()
+    for days_ago in range(1, 29):
+        add_complaints(today - timedelta(days=days_ago), 2)
+    db.session.commit()
+    refresh_forecasts(workers=1)
+    response = client.get('/admin/dashboard')
+    assert b'forecastChart' in response.data and b'Staffing Outlook' in response.data
+    assert b'No forecast yet' not in response.data
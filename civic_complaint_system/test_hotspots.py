@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+import models
+from models import db, ComplaintLocality, HotspotBucket, rebuild_hotspot_counts
+from addresses import locality_key
+from hotspots import rank_hotspots, trend
+
+def bucket_totals():
+    return {(row.locality, row.category): row.count for row in db.session.query(
+        HotspotBucket.locality, HotspotBucket.category, db.func.sum(HotspotBucket.count).label('count'))
+        .group_by(HotspotBucket.locality, HotspotBucket.category) if row.count}
+
+def test_locality_keys():
+    assert locality_key('MG Road, Bangalore') == 'mg road, bangalore'
+    assert locality_key('12, M.G. Rd, Bengaluru 560001') == 'mg road, bangalore'
+    assert locality_key('Near Metro Station, MG Road, Bangalore') == 'mg road, bangalore'
+    assert locality_key('#4B, 5th Cross, Indiranagar, Bangalore') == 'indiranagar, bangalore'
+    assert locality_key('  ') == 'unknown'
+
+def test_buckets_follow_complaint_changes(app, add_complaint):
+    complaint = add_complaint(address='12, M.G. Rd, Bengaluru')
+    add_complaint(address='MG Road, Bangalore')
+    assert bucket_totals() == {('mg road, bangalore', 'potholes'): 2}
+    assert db.session.get(ComplaintLocality, complaint.id).locality == 'mg road, bangalore'
+
+    # Editing the address or category moves the complaint between buckets
+    complaint.address = 'Indiranagar, Bangalore'
+    complaint.category = 'garbage'
+    db.session.commit()
+    assert bucket_totals() == {('mg road, bangalore', 'potholes'): 1, ('indiranagar, bangalore', 'garbage'): 1}
+    assert db.session.get(ComplaintLocality, complaint.id).locality == 'indiranagar, bangalore'
+
+    # A rebuild from the complaints gives the same counts
+    incremental = bucket_totals()
+    rebuild_hotspot_counts(db.session.connection())
+    db.session.commit()
+    assert bucket_totals() == incremental
+
+def test_counts_without_on_conflict(app, add_complaint, monkeypatch):
+    # Databases other than SQLite and PostgreSQL update first and insert the buckets that are missing
+    monkeypatch.setattr(models, 'conflict_insert', lambda connection: None)
+    complaint = add_complaint(address='MG Road, Bangalore')
+    add_complaint(address='MG Road, Bangalore')
+    complaint.category = 'garbage'
+    db.session.commit()
+    assert bucket_totals() == {('mg road, bangalore', 'potholes'): 1, ('mg road, bangalore', 'garbage'): 1}
+
+def test_windows_and_trends(app, add_complaint):
+    now = datetime.utcnow()
+    for hours_ago in (1, 2, 3, 30):
+        add_complaint(address='MG Road, Bangalore', created_at=now - timedelta(hours=hours_ago))
+    for hours_ago in (2, 26, 27, 28):
+        add_complaint(address='Indiranagar, Bangalore', category='garbage', created_at=now - timedelta(hours=hours_ago))
+
+    day = rank_hotspots('24h')
+    assert [(h['locality'], h['count'], h['previous'], h['trend']) for h in day] == [
+        ('mg road, bangalore', 3, 1, 'up'),
+        ('indiranagar, bangalore', 1, 3, 'down'),
+    ]
+    week = rank_hotspots('7d')
+    assert [(h['locality'], h['count']) for h in week] == [('indiranagar, bangalore', 4), ('mg road, bangalore', 4)]
+    assert trend(10, 9) == 'steady' and trend(2, 0) == 'up' and trend(1, 0) == 'steady'
+
+def test_hotspots_page_links_to_locality_complaints(app, client, login, add_complaint):
+    add_complaint(address='MG Road, Bangalore')
+    add_complaint(address='12, M.G. Rd, Bengaluru 560001')
+    add_complaint(address='Indiranagar, Bangalore')
+    # Complaints from before the hotspot tables are counted on first use
+    db.session.execute(ComplaintLocality.__table__.delete())
+    db.session.execute(HotspotBucket.__table__.delete())
+    db.session.commit()
+    login('admin@example.com', 'Admin123!')
+
+    response = client.get('/admin/hotspots?window=24h')
+    assert response.status_code == 200
+    assert b'Mg Road, Bangalore' in response.data
+
+    complaints = client.get('/admin/complaints?locality=mg+road,+bangalore')
+    assert b'MG Road, Bangalore' in complaints.data and b'M.G. Rd' in complaints.data
+    assert b'Indiranagar' not in complaints.data
@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from models import db
+from instrumentation import Histogram, RequestQueryStats, RollingEndpointStats
+
+def test_debug_headers_report_query_count(app, client, login):
+    app.config['SQL_STATS_HEADERS'] = True
+    login('admin@example.com', 'Admin123!')
+
+    response = client.get('/admin/dashboard')
+    # Dashboard counts plus load_user and the template context processor
+    assert int(response.headers['X-SQL-Query-Count']) > 10
+    assert float(response.headers['X-SQL-Time-Ms']) > 0
+    assert 'sql;dur=' in response.headers['Server-Timing']
+
+def test_headers_off_outside_debug(app, client):
+    response = client.get('/about')
+    assert 'X-SQL-Query-Count' not in response.headers
+
+def test_failed_statements_leave_nothing_on_the_connection(app):
+    connection = db.session.connection()
+    connection.execute(text('SELECT 1'))
+    info = {key: list(value) if isinstance(value, list) else value for key, value in connection.info.items()}
+    for _ in range(3):
+        with pytest.raises(OperationalError):
+            connection.execute(text('SELECT * FROM no_such_table'))
+    # The pooled connection is reused by later requests, so nothing may pile up on it
+    assert connection.info == info
+
+def test_admin_page_lists_endpoints(app, client, login):
+    login('admin@example.com', 'Admin123!')
+    client.get('/admin/dashboard')
+
+    response = client.get('/admin/performance')
+    assert response.status_code == 200
+    assert b'admin.admin_dashboard' in response.data
+
+    stats = app.extensions['sql_stats'].snapshot()
+    assert stats['admin.admin_dashboard'].latency.total == 1
+
+def test_histogram_percentiles():
+    histogram = Histogram([10, 100, 1000])
+    for value in [1, 2, 3, 50, 500]:
+        histogram.observe(value)
+    assert histogram.percentile(0.5) == 10
+    assert histogram.percentile(0.8) == 100
+    assert histogram.percentile(1.0) == 1000
+
+def test_rolling_window_drops_old_slots():
+    rolling = RollingEndpointStats(window_seconds=60, slots=6)
+    stats = RequestQueryStats()
+    stats.record('SELECT 1', 0.002)
+
+    rolling.observe('main.index', 12.0, stats, now=1000)
+    rolling.observe('main.index', 12.0, stats, now=1030)
+    assert rolling.snapshot(now=1035)['main.index'].latency.total == 2
+    assert rolling.snapshot(now=1085)['main.index'].latency.total == 1
+    assert rolling.snapshot(now=2000) == {}
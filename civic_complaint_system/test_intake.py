@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select
+from models import db, User, Complaint, IntakeCheckpoint
+import intake
+from intake import drain_intake, enqueue_submission, get_intake_engine, submissions, failed
+
+@pytest.fixture
+def queued(app, tmp_path):
+    app.config.update(INTAKE_MODE='queued', INTAKE_PATH=str(tmp_path / 'intake.db'), INTAKE_BATCH_SIZE=3,
+                      INTAKE_MAX_DELAY_MS=60000)
+    yield app
+    get_intake_engine().dispose()
+
+def queue_rows(table=submissions):
+    with get_intake_engine().connect() as connection:
+        return connection.execute(select(table).order_by(table.c.id)).all()
+
+def test_submission_is_acknowledged_then_filed_with_its_received_time(queued, client, login):
+    login('citizen@example.com', 'Citizen123!')
+    response = client.post('/complaints/new', data={'category': 'potholes', 'description': 'Deep pothole near the bus stop',
+                                                     'address': 'MG Road', 'priority': 'high'}, follow_redirects=True)
+    assert b'Complaint received! It will be assigned to the roads department shortly.' in response.data
+    assert b'1 complaint received and being filed' in response.data
+    assert Complaint.query.count() == 0
+
+    # Not filed until the group fills or its oldest submission has waited long enough
+    assert drain_intake() == 0
+    received_at = queue_rows()[0].received_at
+    assert drain_intake(max_delay_ms=0) == 1
+    complaint = Complaint.query.one()
+    assert complaint.assigned_department == 'roads' and complaint.created_at == received_at
+    assert complaint.status_updates[0].timestamp == received_at
+    assert queue_rows() == []
+    assert b'being filed' not in client.get('/complaints/citizen/dashboard').data
+
+def test_groups_are_filed_exactly_once(queued):
+    citizen = User.query.filter_by(email='citizen@example.com').first()
+    for i in range(5):
+        enqueue_submission(citizen.id, 'water_supply', f'No water supply since morning #{i}', 'Park Street', '',
+                           'medium')
+
+    assert drain_intake() == 3
+    checkpoint = IntakeCheckpoint.query.one()
+    assert checkpoint.filed == 3
+
+    # A writer that died after committing but before trimming the queue files nothing twice
+    with get_intake_engine().begin() as connection:
+        connection.execute(submissions.insert(), {
+            'id': 1, 'reference': 'restored', 'user_id': citizen.id, 'category': 'potholes',
+            'description': 'Already filed complaint', 'address': 'MG Road', 'priority': 'low',
+            'received_at': datetime.utcnow() - timedelta(minutes=1),
+        })
+    assert drain_intake(max_delay_ms=0) == 2
+    assert Complaint.query.count() == 5
+    assert [c.description[-2:] for c in Complaint.query.order_by(Complaint.id)] == ['#0', '#1', '#2', '#3', '#4']
+    assert queue_rows() == []
+
+    # A checkpoint moved by another writer makes this one back off
+    enqueue_submission(citizen.id, 'potholes', 'Pothole opened up again', 'MG Road', '', 'low')
+    db.session.get(IntakeCheckpoint, checkpoint.queue_id).position += 1
+    db.session.commit()
+    assert drain_intake(max_delay_ms=0) == 0
+    assert Complaint.query.count() == 5
+
+def test_submission_that_cannot_be_filed_is_set_aside(queued, monkeypatch):
+    citizen = User.query.filter_by(email='citizen@example.com').first()
+    for description in ('Streetlight out for a week', 'Broken streetlight pole', 'Flickering streetlight'):
+        enqueue_submission(citizen.id, 'streetlight', description, 'Lake Road', '', 'low')
+
+    file_submission = intake.file_submission
+    def failing_file_submission(row):
+        if row.description.startswith('Broken'):
+            raise ValueError('assignment failed')
+        return file_submission(row)
+    monkeypatch.setattr(intake, 'file_submission', failing_file_submission)
+
+    # The writer dies after recording the failure but before moving its checkpoint past it
+    advance_checkpoint = intake.advance_checkpoint
+    def crashing_advance_checkpoint(queue, position, new_position, filed=0, failed=0):
+        if failed:
+            raise SystemExit('writer killed')
+        return advance_checkpoint(queue, position, new_position, filed, failed)
+    monkeypatch.setattr(intake, 'advance_checkpoint', crashing_advance_checkpoint)
+    with pytest.raises(SystemExit):
+        drain_intake()
+    db.session.rollback()
+    assert len(queue_rows(failed)) == 1 and len(queue_rows()) == 3
+    assert IntakeCheckpoint.query.one().position == queue_rows()[0].id
+
+    # The restarted writer records it only once
+    monkeypatch.setattr(intake, 'advance_checkpoint', advance_checkpoint)
+    assert drain_intake(max_delay_ms=0) == 1
+    assert {c.description for c in Complaint.query} == {'Streetlight out for a week', 'Flickering streetlight'}
+    checkpoint = IntakeCheckpoint.query.one()
+    assert (checkpoint.filed, checkpoint.failed) == (2, 1)
+    [row] = queue_rows(failed)
+    assert row.error == 'assignment failed' and 'Broken streetlight pole' in row.payload
+    assert queue_rows() == []
+
+def test_api_accepts_queued_submissions(queued, client):
+    response = client.post('/api/v1/tokens', json={'email': 'citizen@example.com', 'password': 'Citizen123!'})
+    headers = {'Authorization': f"Bearer {response.get_json()['token']}"}
+    response = client.post('/api/v1/complaints', headers=headers, json={
+        'category': 'garbage', 'description': 'Garbage not collected for days', 'address': 'Market Road'})
+    assert response.status_code == 202
+    data = response.get_json()['data']
+    assert data['status'] == 'queued' and data['reference'] == queue_rows()[0].reference
+    assert client.post('/api/v1/complaints', headers=headers, json={'category': 'garbage'}).status_code == 400
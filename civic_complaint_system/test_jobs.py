@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta
+import pytest
+from flask import g
+from app import create_app
+from config import TestingConfig
+from models import db, User, Job
+from jobs import task, enqueue, claim_next, run_job, run_pending, run_threads
+
+calls = []
+
+@task('test.record')
+def record(value):
+    calls.append(value)
+    return {'value': value}
+
+@task('test.flaky')
+def flaky():
+    raise ConnectionError('upstream unavailable')
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+def test_idempotency_key_and_priority_order(app):
+    first = enqueue('test.record', {'value': 'low'}, idempotency_key='record:low')
+    again = enqueue('test.record', {'value': 'low'}, idempotency_key='record:low')
+    enqueue('test.record', {'value': 'high'}, priority=10)
+    enqueue('test.record', {'value': 'later'}, priority=20, delay=60)
+    db.session.commit()
+    assert again.id == first.id
+    assert Job.query.count() == 3
+
+    assert run_pending() == 2
+    assert calls == ['high', 'low']
+    done = db.session.get(Job, first.id)
+    assert done.status == 'succeeded' and done.attempts == 1 and done.result == '{"value": "low"}'
+
+def test_failing_job_backs_off_then_fails(app):
+    job = enqueue('test.flaky', max_attempts=2)
+    db.session.commit()
+
+    assert run_job(claim_next()) == 'queued'
+    db.session.refresh(job)
+    assert job.run_at > datetime.utcnow() and 'upstream unavailable' in job.last_error
+    # Not due until the backoff has passed
+    assert claim_next() is None
+
+    job.run_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert run_job(claim_next()) == 'failed'
+    db.session.refresh(job)
+    assert (job.status, job.attempts) == ('failed', 2)
+
+def test_crashed_worker_job_is_taken_again_after_visibility_timeout(app):
+    job = enqueue('test.record', {'value': 'once'}, timeout=30)
+    db.session.commit()
+
+    lost = claim_next()
+    # A second worker doesn't see it while the first one holds it
+    assert claim_next() is None
+
+    # The first worker dies; once its lease runs out the job is visible again
+    job.locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    retaken = claim_next()
+    assert retaken.id == lost.id and retaken.attempts == 2
+    assert run_job(retaken) == 'succeeded'
+
+    # A late result from the first worker is discarded
+    assert run_job(lost) == 'succeeded'
+    db.session.refresh(job)
+    assert job.attempts == 2 and calls == ['once', 'once']
+
+def test_background_report_export(app, client, login, tmp_path, add_complaint):
+    app.config.update(BACKGROUND_EXPORTS=True, EXPORT_DIR=str(tmp_path))
+    add_complaint()
+    login('admin@example.com', 'Admin123!')
+
+    response = client.get('/admin/reports?export=csv&start_date=2020-01-01&end_date=2030-12-31')
+    assert response.status_code == 302
+    status_page = response.headers['Location']
+    assert b'being prepared' in client.get(status_page).data
+    # Asking again while it is queued returns the same job
+    assert client.get('/admin/reports?export=csv&start_date=2020-01-01&end_date=2030-12-31')\
+        .headers['Location'] == status_page
+
+    assert run_pending() == 1
+    g.pop('_login_user', None)
+    token = client.post('/api/v1/tokens', json={'email': 'admin@example.com', 'password': 'Admin123!'})
+    job = client.get(f"/api/v1/jobs/{Job.query.one().id}",
+                     headers={'Authorization': f"Bearer {token.get_json()['token']}"}).get_json()['data']
+    assert job['status'] == 'succeeded' and job['result']['rows'] == 1
+
+    g.pop('_login_user', None)
+    download = client.get(job['download_url'])
+    assert download.mimetype == 'text/csv'
+    assert b'MG Road, Bangalore' in download.data
+
+    # Another admin can follow the job but not download its file
+    other = User(name='Other Admin', email='other.admin@example.com', role='admin', department='administration')
+    other.set_password('Admin123!')
+    db.session.add(other)
+    db.session.commit()
+    g.pop('_login_user', None)
+    client = app.test_client()
+    token = client.post('/api/v1/tokens', json={'email': 'other.admin@example.com', 'password': 'Admin123!'})
+    data = client.get(f"/api/v1/jobs/{Job.query.one().id}",
+                      headers={'Authorization': f"Bearer {token.get_json()['token']}"}).get_json()['data']
+    assert data['status'] == 'succeeded' and 'download_url' not in data
+
+def test_export_asked_again_after_failure_gets_a_new_job(app, client, login, tmp_path):
+    app.config.update(BACKGROUND_EXPORTS=True, EXPORT_DIR=str(tmp_path))
+    login('admin@example.com', 'Admin123!')
+    url = '/admin/reports?export=csv&start_date=2020-01-01&end_date=2030-12-31'
+    first = db.session.get(Job, int(client.get(url).headers['Location'].rsplit('/', 1)[1]))
+    first.status = 'failed'
+    db.session.commit()
+
+    second_page = client.get(url).headers['Location']
+    second = db.session.get(Job, int(second_page.rsplit('/', 1)[1]))
+    assert second.id != first.id and second.status == 'queued'
+    assert first.idempotency_key is None and second.idempotency_key.startswith('export_report:')
+
+    # Finished exports are not served again either: the data may have changed since
+    assert run_pending() == 1
+    assert client.get(url).headers['Location'] not in (second_page, f'/admin/jobs/{first.id}')
+    assert Job.query.count() == 3
+
+def test_thread_pool_runs_each_job_once(monkeypatch, tmp_path):
+    # A database file: each worker thread needs its own connection to the same data
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'jobs.db'}")
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        for value in range(20):
+            enqueue('test.record', {'value': value})
+        db.session.commit()
+
+    run_threads(app, 4, once=True)
+    assert sorted(calls) == list(range(20))
+    with app.app_context():
+        assert Job.query.filter_by(status='succeeded').count() == 20
+        db.session.remove()
@@ -0,0 +1,85 @@
+import json
+import os
+from models import db, User, Complaint, OpenComplaintCount, rebuild_open_counts
+from metrics import MetricsRegistry
+
+def open_counts():
+    return {(row.department, row.status, row.assigned): row.count
+            for row in OpenComplaintCount.query.all() if row.count}
+
+def test_scrape_reports_request_latency_per_blueprint(app, client):
+    client.get('/about')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    body = response.get_data(as_text=True)
+    assert 'civic_http_request_duration_seconds_count{blueprint="main",endpoint="main.about"} 1' in body
+    assert 'civic_http_requests_total{blueprint="main",endpoint="main.about",status="200"} 1' in body
+
+def test_token_protects_scrape(app, client):
+    app.config['METRICS_TOKEN'] = 's3cret'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+
+    # Production refuses scrapes until a token is configured
+    app.config.update(METRICS_TOKEN=None, METRICS_REQUIRE_TOKEN=True)
+    assert client.get('/metrics').status_code == 401
+
+def test_backlog_counts_follow_complaint_changes(app, client, login):
+    login('citizen@example.com', 'Citizen123!')
+    for _ in range(2):
+        client.post('/complaints/new', data={'category': 'potholes', 'description': 'Deep pothole near the bus stop',
+                                             'address': 'MG Road, Bangalore', 'priority': 'high'})
+    assert open_counts() == {('roads', 'submitted', False): 2}
+
+    complaint = Complaint.query.first()
+    complaint.status = 'in_progress'
+    complaint.assigned_officer = User.query.filter_by(email='roads@example.com').first().id
+    db.session.commit()
+    assert open_counts() == {('roads', 'submitted', False): 1, ('roads', 'in_progress', True): 1}
+
+    client.get('/logout')
+    login('admin@example.com', 'Admin123!')
+    client.post('/complaints/bulk-status', data={'complaint_ids': [c.id for c in Complaint.query], 'status': 'resolved'})
+    db.session.expire_all()
+    assert open_counts() == {}
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'civic_unassigned_complaints 0' in body
+
+def test_scrape_only_reads_the_backlog_counts(app, client, add_complaint):
+    for _ in range(3):
+        add_complaint(category='garbage', assigned_department='sanitation')
+    db.session.execute(OpenComplaintCount.__table__.delete())
+    db.session.commit()
+
+    # Counts missing (a database older than the table) are not rebuilt by a scrape
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'civic_unassigned_complaints 0' in body
+    assert open_counts() == {}
+
+    # python metrics.py rebuild
+    assert rebuild_open_counts(db.session.connection()) == 3
+    db.session.commit()
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'civic_open_complaints{department="sanitation",status="submitted"} 3' in body
+    assert 'civic_unassigned_complaints 3' in body
+
+def test_export_metrics(app, client, login):
+    login('admin@example.com', 'Admin123!')
+    client.get('/admin/reports?export=csv')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'civic_export_rows_count{format="csv"} 1' in body
+
+def test_workers_share_counters_through_directory(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    requests = registry.counter('civic_http_requests', 'Requests served', ('endpoint',))
+    requests.inc(endpoint='main.index')
+
+    # Another worker's last flush, under a pid that has since exited
+    other = {'pid': 2 ** 22 + 1, 'metrics': {'civic_http_requests': [[['main.index'], 4]]}}
+    (tmp_path / 'metrics_99999.json').write_text(json.dumps(other))
+
+    assert 'civic_http_requests_total{endpoint="main.index"} 5' in registry.render()
+    registry.flush(force=True)
+    assert (tmp_path / f'metrics_{os.getpid()}.json').exists()
@@ -0,0 +1,79 @@
+import json
+from datetime import datetime, timedelta
+import models
+from models import db, User, NotificationOutbox, StatusUpdate
+from notifications import FileChannel, dispatch_once, enqueue_notification, department_officers, \
+    notify_department_officers
+
+class FailingChannel:
+    def send(self, digest):
+        raise ConnectionRefusedError('SMTP server down')
+
+def test_notify_department_queues_reminder_with_timeline_entry(app, client, login, add_complaint):
+    complaint = add_complaint()
+    login('admin@example.com', 'Admin123!')
+
+    client.post(f'/admin/complaints/{complaint.id}/notify_department')
+    reminder, = NotificationOutbox.query.all()
+    assert (reminder.recipient, reminder.department, reminder.status) == ('roads@example.com', 'roads', 'pending')
+    assert StatusUpdate.query.filter_by(complaint_id=complaint.id).count() == 1
+
+    # A second click the same day is deduplicated, timeline entry included
+    response = client.post(f'/admin/complaints/{complaint.id}/notify_department', follow_redirects=True)
+    assert b'already notified' in response.data
+    assert NotificationOutbox.query.count() == 1
+    assert StatusUpdate.query.filter_by(complaint_id=complaint.id).count() == 1
+
+def test_rolled_back_change_leaves_no_notification(app, add_complaint):
+    complaint = add_complaint()
+    admin = User.query.filter_by(email='admin@example.com').first()
+    notify_department_officers(complaint, department_officers('roads'), admin)
+    db.session.rollback()
+    assert NotificationOutbox.query.count() == 0
+
+def test_dedupe_without_on_conflict(app, add_complaint, monkeypatch):
+    # Databases other than SQLite and PostgreSQL look for the key first
+    monkeypatch.setattr(models, 'conflict_insert', lambda connection: None)
+    assert enqueue_notification('reminder', 'roads', 'roads@example.com', {}, 'reminder:1')
+    assert not enqueue_notification('reminder', 'roads', 'roads@example.com', {}, 'reminder:1')
+    assert NotificationOutbox.query.count() == 1
+
+def test_one_digest_per_recipient(app, tmp_path, add_complaint):
+    app.config['NOTIFY_FILE_PATH'] = str(tmp_path / 'notifications.ndjson')
+    admin = User.query.filter_by(email='admin@example.com').first()
+    for _ in range(3):
+        notify_department_officers(add_complaint(), department_officers('roads'), admin)
+    water = add_complaint(assigned_department='water', category='drainage')
+    notify_department_officers(water, department_officers('water'), admin)
+    db.session.commit()
+
+    stats = dispatch_once(FileChannel(app.config))
+    assert stats == {'claimed': 4, 'digests': 2, 'sent': 4, 'retrying': 0, 'dead': 0}
+    digests = [json.loads(line) for line in (tmp_path / 'notifications.ndjson').read_text().splitlines()]
+    assert sorted(len(digest['items']) for digest in digests) == [1, 3]
+    assert {digest['recipient'] for digest in digests} == {'roads@example.com', 'water@example.com'}
+    assert NotificationOutbox.query.filter_by(status='sent').count() == 4
+
+    # Nothing left to send
+    assert dispatch_once(FileChannel(app.config))['claimed'] == 0
+
+def test_failed_delivery_backs_off_then_gives_up(app):
+    app.config['NOTIFY_MAX_ATTEMPTS'] = 2
+    enqueue_notification('department_reminder', 'roads', 'roads@example.com',
+                         {'complaint_id': 1, 'priority': 'high', 'category': 'potholes', 'address': 'MG Road',
+                          'status': 'submitted', 'requested_by': 'Admin User'}, 'reminder:1')
+    db.session.commit()
+
+    assert dispatch_once(FailingChannel())['retrying'] == 1
+    notification = NotificationOutbox.query.one()
+    assert notification.attempts == 1
+    assert notification.next_attempt_at > datetime.utcnow()
+    assert 'SMTP server down' in notification.last_error
+
+    # Not due yet, so the next pass leaves it alone
+    assert dispatch_once(FailingChannel())['claimed'] == 0
+
+    notification.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert dispatch_once(FailingChannel())['dead'] == 1
+    assert NotificationOutbox.query.one().status == 'dead'
@@ -0,0 +1,56 @@
+import pstats
+from profiling import APP_ROOT, categorise, list_profiles, make_profile_token
+
+def test_admin_profiles_a_request(app, client, login, tmp_path):
+    app.config['PROFILE_DIR'] = str(tmp_path)
+    login('admin@example.com', 'Admin123!')
+
+    response = client.get('/admin/dashboard?_profile=1')
+    profile_id = response.headers['X-Profile-Id']
+    assert (tmp_path / f'{profile_id}.prof').exists()
+    assert pstats.Stats(str(tmp_path / f'{profile_id}.prof')).total_tt > 0
+
+    page = client.get('/admin/profiles')
+    assert b'admin.admin_dashboard' in page.data
+    download = client.get(f'/admin/profiles/{profile_id}.prof')
+    assert download.status_code == 200
+    assert 'attachment' in download.headers['Content-Disposition']
+
+def test_breakdown_separates_templates_and_database(app, client, login, tmp_path):
+    app.config['PROFILE_DIR'] = str(tmp_path)
+    login('admin@example.com', 'Admin123!')
+    client.get('/admin/dashboard?_profile=1')
+
+    profile = list_profiles(str(tmp_path))[0]
+    assert profile['breakdown_ms']['templates'] > 0
+    assert profile['breakdown_ms']['database'] > 0
+    assert profile['top_functions']
+
+def test_non_admins_and_plain_requests_are_not_profiled(app, client, login, tmp_path):
+    app.config['PROFILE_DIR'] = str(tmp_path)
+    assert 'X-Profile-Id' not in client.get('/about').headers
+
+    login('citizen@example.com', 'Citizen123!')
+    assert 'X-Profile-Id' not in client.get('/about?_profile=1').headers
+    assert 'X-Profile-Id' not in client.get('/about', headers={'X-Profile-Token': 'forged'}).headers
+    assert not list(tmp_path.iterdir())
+
+def test_signed_header_enables_profiling(app, client, tmp_path):
+    app.config['PROFILE_DIR'] = str(tmp_path)
+    token = make_profile_token(app.config['SECRET_KEY'])
+    response = client.get('/about', headers={'X-Profile-Token': token})
+    assert response.headers['X-Profile-Id'].endswith('main.about')
+
+def test_old_profiles_are_pruned(app, client, login, tmp_path):
+    app.config['PROFILE_DIR'] = str(tmp_path)
+    app.config['PROFILE_MAX_FILES'] = 2
+    login('admin@example.com', 'Admin123!')
+    for _ in range(4):
+        client.get('/about?_profile=1')
+    assert len(list(tmp_path.glob('*.prof'))) == 2
+
+def test_categorise():
+    assert categorise(APP_ROOT + '/templates/base.html', 'root') == 'templates'
+    assert categorise('~', "<method 'execute' of 'sqlite3.Cursor' objects>") == 'database'
+    assert categorise(APP_ROOT + '/routes/admin.py', 'admin_dashboard') == 'view'
+    assert categorise('/usr/lib/python3/site-packages/werkzeug/routing.py', 'match') == 'framework'
@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+import pytest
+from flask import g
+from models import (db, User, ProjectionCheckpoint, DepartmentQueueEntry, CitizenSummary,
+                    ComplaintLifecycle, bulk_update_status)
+from archive import archive_batch
+from jobs import run_pending
+from projections import PROJECTIONS, advance_checkpoint, catch_up, citizen_summary, department_queue, rebuild
+
+@pytest.fixture
+def submit(add_complaint):
+    """Submit a complaint ``days_ago``, with its timeline entry"""
+    def add(days_ago=0, **fields):
+        return add_complaint(created_at=datetime.utcnow() - timedelta(days=days_ago), submitted=True, **fields)
+    return add
+
+def change_status(complaint, new_status, when=None):
+    officer = User.query.filter_by(email='roads@example.com').first()
+    update = complaint.add_status_update(officer.id, complaint.status, new_status)
+    update.timestamp = when or datetime.utcnow()
+    complaint.status = new_status
+    db.session.commit()
+
+def read_models():
+    return (
+        sorted((e.complaint_id, e.department, e.status, e.queued_at) for e in DepartmentQueueEntry.query),
+        sorted((s.user_id, s.total, s.submitted, s.in_progress, s.resolved, s.rejected) for s in CitizenSummary.query),
+        sorted((l.complaint_id, l.status, l.submitted_at, l.started_at, l.closed_at, l.reopened, l.transitions,
+                l.notes) for l in ComplaintLifecycle.query),
+    )
+
+def test_projections_follow_the_log(app, submit):
+    first = submit(days_ago=3)
+    second = submit(days_ago=2, category='water_supply', assigned_department='water')
+    third = submit(days_ago=1)
+    change_status(first, 'in_progress', first.created_at + timedelta(hours=5))
+    change_status(first, 'resolved', first.created_at + timedelta(hours=30))
+    # Timeline notes such as a department notification keep the status
+    change_status(second, 'submitted')
+    bulk_update_status([(third.id, 'submitted')], 'rejected', third.user_id)
+    db.session.commit()
+
+    assert catch_up() == {'department_queue': 7, 'citizen_summary': 7, 'lifecycle': 7}
+    assert department_queue('roads')['open'] == 0
+    assert department_queue('water') == {'submitted': 1, 'in_progress': 0, 'open': 1,
+                                         'oldest_queued_at': second.created_at}
+    assert citizen_summary(first.user_id) == {'submitted': 1, 'in_progress': 0, 'resolved': 1, 'rejected': 1,
+                                              'total': 3, 'open': 1}
+    lifecycle = db.session.get(ComplaintLifecycle, first.id)
+    assert (lifecycle.started_at - lifecycle.submitted_at, lifecycle.closed_at - lifecycle.submitted_at) == (
+        timedelta(hours=5), timedelta(hours=30))
+    assert db.session.get(ComplaintLifecycle, second.id).notes == 1
+
+    # Reopening puts the complaint back in the queue from the time it was reopened
+    reopened_at = datetime.utcnow()
+    change_status(first, 'in_progress', reopened_at)
+    assert catch_up() == {'department_queue': 1, 'citizen_summary': 1, 'lifecycle': 1}
+    assert department_queue('roads') == {'submitted': 0, 'in_progress': 1, 'open': 1, 'oldest_queued_at': reopened_at}
+    assert db.session.get(ComplaintLifecycle, first.id).reopened == 1
+
+    # Archived events are part of the log: a rebuild gives the same read models
+    change_status(third, 'rejected')
+    catch_up()
+    incremental = read_models()
+    archive_batch([third.id])
+    assert rebuild() == {'department_queue': 9, 'citizen_summary': 9, 'lifecycle': 9}
+    assert read_models() == incremental
+
+def test_checkpoints_guard_against_double_application(app, submit):
+    submit()
+    catch_up()
+    checkpoint = db.session.get(ProjectionCheckpoint, 'citizen_summary')
+    assert (checkpoint.position, checkpoint.events) == (1, 1)
+
+    # A runner that read the log before another one advanced the checkpoint loses
+    submit()
+    connection = db.session.connection()
+    assert not advance_checkpoint(connection, 'citizen_summary', 0, 2, 1)
+    db.session.rollback()
+    assert catch_up('citizen_summary') == {'citizen_summary': 1}
+    assert CitizenSummary.query.one().total == 2
+
+    # A new projection version rebuilds from the start
+    projection = PROJECTIONS['citizen_summary']
+    projection.version += 1
+    try:
+        assert catch_up('citizen_summary') == {'citizen_summary': 2}
+        assert CitizenSummary.query.one().total == 2
+        assert db.session.get(ProjectionCheckpoint, 'citizen_summary').version == projection.version
+    finally:
+        projection.version -= 1
+
+def test_dashboards_and_admin_page(app, client, login, submit):
+    complaint = submit()
+    submit()
+    change_status(complaint, 'resolved')
+
+    login('citizen@example.com', 'Citizen123!')
+    response = client.get('/complaints/citizen/dashboard')
+    assert response.status_code == 200
+    assert b'50.0%' in response.data
+
+    client.get('/logout')
+    g.pop('_login_user', None)
+    login('admin@example.com', 'Admin123!')
+    response = client.get('/admin/projections')
+    assert response.status_code == 200 and b'department_queue' in response.data
+
+    response = client.post('/admin/projections/rebuild', data={'name': 'lifecycle'})
+    assert response.status_code == 302
+    assert run_pending() == 1
+    assert db.session.get(ProjectionCheckpoint, 'lifecycle').rebuilt_at is not None
+
+def test_dashboards_load_each_complaint_once(app, client, login, submit):
+    app.config['SQL_STATS_HEADERS'] = True
+
+    def query_counts(email, password, url):
+        client.get('/logout')
+        g.pop('_login_user', None)
+        login(email, password)
+        # The first view catches the projections up, the second has nothing to apply
+        return [int(client.get(url).headers['X-SQL-Query-Count']) for _ in range(2)]
+
+    dashboards = [('citizen@example.com', 'Citizen123!', '/complaints/citizen/dashboard'),
+                  ('roads@example.com', 'Officer123!', '/complaints/municipal/dashboard')]
+    submit()
+    few = [query_counts(*dashboard) for dashboard in dashboards]
+    for _ in range(29):
+        submit()
+    many = [query_counts(*dashboard) for dashboard in dashboards]
+    # Catching up costs the same for one event as for thirty, and an up to date view commits nothing
+    assert [counts[0] <= before[0] for counts, before in zip(many, few)] == [True, True]
+    assert [counts[1] for counts in many] == [counts[1] for counts in few]
@@ -0,0 +1,69 @@
+import codes
+from flask import g
+from models import db, User, Complaint, ReferenceVersion
+from reference import get_reference_data, save_reference_value
+from routes.complaints import submit_complaint, validate_complaint_form
+
+def test_seeded_from_the_code_vocabularies(app):
+    reference = get_reference_data()
+    assert list(reference.categories)[:2] == ['potholes', 'streetlight']
+    assert reference.label('category', 'water_supply') == 'Water Supply Issues'
+    assert reference.label('department', 'parks') == 'Parks'
+    assert reference.department_for('drainage') == 'water' and reference.department_for('unknown') == 'general'
+    assert list(reference.priorities) == ['high', 'medium', 'low']
+    assert get_reference_data() is reference
+
+    data = {'category': 'tree_fall', 'description': 'A tree fell across the road', 'address': 'MG Road',
+            'priority': 'high'}
+    assert validate_complaint_form(data) == ['Please select a valid complaint category']
+
+def test_admin_adds_a_category_and_department(app, client, login):
+    login('admin@example.com', 'Admin123!')
+    assert b'Reference Data' in client.get('/admin/reference').data
+
+    client.post('/admin/reference', data={'kind': 'department', 'value': 'parks', 'label': 'Parks & Gardens'})
+    response = client.post('/admin/reference', data={'kind': 'category', 'value': 'Tree_Fall',
+                                                      'label': 'Fallen Trees', 'department': 'parks'},
+                           follow_redirects=True)
+    assert b'Category tree_fall saved.' in response.data
+    assert client.post('/admin/reference', data={'kind': 'role', 'value': 'auditor', 'label': 'Auditor'},
+                       follow_redirects=True).data.count(b'Only categories and departments can be edited') == 1
+    assert db.session.get(ReferenceVersion, 1).version == 3
+
+    # The new category is valid at once, routed to its department and stored as a code
+    reference = get_reference_data()
+    assert reference.categories['tree_fall'] == 'Fallen Trees'
+    citizen = User.query.filter_by(email='citizen@example.com').first()
+    complaint = submit_complaint(citizen.id, 'tree_fall', 'A tree fell across the road', 'MG Road', None, 'high')
+    db.session.commit()
+    assert complaint.assigned_department == 'parks'
+    db.session.expire_all()
+    assert db.session.get(Complaint, complaint.id).category == 'tree_fall'
+
+    client.get('/logout')
+    g.pop('_login_user', None)
+    login('citizen@example.com', 'Citizen123!')
+    assert b'Fallen Trees' in client.get('/complaints/new').data
+
+def test_other_workers_reload_after_the_check_interval(app):
+    app.config['REFERENCE_CHECK_SECONDS'] = 60
+    reference = get_reference_data()
+    state = app.extensions['reference_data']
+
+    # Another worker adds a category and files a complaint under it
+    save_reference_value('category', 'stray_animals', 'Stray Animals', 'general')
+    citizen = User.query.filter_by(email='citizen@example.com').first()
+    complaint = submit_complaint(citizen.id, 'stray_animals', 'Dogs chasing cyclists at night', 'MG Road', None,
+                                 'low')
+    db.session.commit()
+    code = codes.VOCABULARIES['category'].pop('stray_animals')
+    del codes._DECODE['category'][code]
+
+    # This worker still uses its copy, but can read the new code
+    app.extensions['reference_data'] = state
+    assert get_reference_data() is reference and 'stray_animals' not in reference.categories
+    db.session.expire_all()
+    assert db.session.get(Complaint, complaint.id).category == 'stray_animals'
+
+    state.checked_at -= 60
+    assert get_reference_data().categories['stray_animals'] == 'Stray Animals'
@@ -0,0 +1,49 @@
+from models import db
+from report_cache import ReportCache, get_report_cache
+
+def results(response):
+    return response.data.split(b'<!-- Report Results -->')[1].split(b'</main>')[0]
+
+def test_lru_eviction_and_size_bound():
+    cache = ReportCache(max_entries=2, max_bytes=100)
+    cache.put('a', 1, 'A', 10)
+    cache.put('b', 1, 'B', 10)
+    assert cache.get('a', 1) == 'A'  # now b is the least recently used
+    cache.put('c', 1, 'C', 10)
+    assert cache.get('b', 1) is None and cache.get('a', 1) == 'A' and cache.get('c', 1) == 'C'
+
+    # Entries are evicted to stay under the byte limit; one over it is not kept
+    cache.put('d', 1, 'D', 95)
+    assert list(cache.entries) == ['d'] and cache.size == 95
+    cache.put('e', 1, 'E', 101)
+    assert cache.get('e', 1) is None
+
+    # A different stamp means the data changed: the entry is dropped
+    assert cache.get('d', 2) is None and cache.size == 0
+    assert cache.stats == {'hits': 3, 'stale': 1, 'misses': 2, 'evictions': 3}
+
+def test_reports_are_served_from_cache_until_their_data_changes(app, client, login, add_complaint):
+    add_complaint(address='Brigade Road, Bangalore')
+    add_complaint(category='water_supply', assigned_department='water', address='Gandhi Nagar, Pune')
+    login('admin@example.com', 'Admin123!')
+    cache = get_report_cache()
+
+    everything = client.get('/admin/reports')
+    roads = client.get('/admin/reports?department=roads')
+    assert b'2 complaints' in everything.data and b'1 complaints' in roads.data
+    assert results(client.get('/admin/reports')) == results(everything)
+    assert cache.stats['hits'] == 1 and len(cache.entries) == 2
+
+    # A water complaint changes the full report, but not the roads one
+    complaint = add_complaint(category='water_supply', assigned_department='water', address='Koregaon Park, Pune')
+    assert b'3 complaints' in client.get('/admin/reports').data
+    assert results(client.get('/admin/reports?department=roads')) == results(roads)
+    assert cache.stats['stale'] == 1 and cache.stats['hits'] == 2
+
+    # So does a status change of a complaint the report covers
+    water = client.get('/admin/reports?department=water')
+    complaint.add_status_update(complaint.user_id, 'submitted', 'resolved')
+    complaint.status = 'resolved'
+    db.session.commit()
+    changed = client.get('/admin/reports?department=water')
+    assert results(changed) != results(water) and b'Resolved' in results(changed)
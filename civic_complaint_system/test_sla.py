@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+import pytest
+from models import db, User, StatusUpdate
+from sla import SlaAnalytics, get_sla_analytics
+
+START = datetime(2026, 3, 2, 9, 0)
+TARGETS = {'high': 48, 'medium': 168, 'low': 336}
+
+@pytest.fixture
+def add_lifecycle(add_complaint):
+    """Factory for complaints created at START that moved through (status, hours after START) steps"""
+    def add(steps, **fields):
+        officer = User.query.filter_by(email='roads@example.com').first()
+        complaint = add_complaint(**{'priority': 'high', 'created_at': START, 'commit': False, **fields})
+        old_status = None
+        for status, hours in [('submitted', 0)] + steps:
+            db.session.add(StatusUpdate(complaint=complaint, updated_by=officer.id, old_status=old_status,
+                                        new_status=status, timestamp=START + timedelta(hours=hours)))
+            old_status = status
+        complaint.status = old_status
+        db.session.commit()
+        return complaint
+    return add
+
+def by_value(rows):
+    return {row['value']: row for row in rows}
+
+def test_percentiles_and_breaches_by_dimension(app, add_lifecycle):
+    add_lifecycle([('in_progress', 2), ('resolved', 10)])
+    add_lifecycle([('in_progress', 4), ('resolved', 60)])
+    add_lifecycle([('resolved', 30)], category='drainage', assigned_department='water', priority='low')
+    add_lifecycle([('rejected', 1)], category='drainage', assigned_department='water', priority='low')
+    add_lifecycle([('in_progress', 1)])
+
+    analytics = SlaAnalytics(TARGETS)
+    analytics.refresh()
+    departments = by_value(analytics.report('department', now=START + timedelta(hours=100)))
+
+    roads = departments['roads']
+    assert (roads['complaints'], roads['resolved'], roads['rejected']) == (3, 2, 0)
+    assert roads['resolution_p50'] == 35 and roads['resolution_p90'] == 55
+    assert roads['submitted_p50'] == 2 and roads['in_progress_p50'] == 32
+    # 60h against a 48h target; the open one is 100h old
+    assert (roads['breached'], roads['breach_rate'], roads['open'], roads['overdue']) == (1, 0.5, 1, 1)
+
+    water = departments['water']
+    assert (water['resolved'], water['rejected'], water['breached'], water['open']) == (1, 1, 0, 0)
+
+    week, = analytics.report('week')
+    assert (week['value'], week['complaints']) == ('2026-W10', 5)
+
+def test_new_updates_are_applied_incrementally(app, add_lifecycle):
+    open_complaint = add_lifecycle([('in_progress', 1)])
+    reopened = add_lifecycle([('resolved', 10)])
+    analytics = SlaAnalytics(TARGETS)
+    analytics.refresh()
+    built_at = analytics.built_at
+
+    officer = User.query.filter_by(email='roads@example.com').first()
+    for complaint, steps in ((open_complaint, [('resolved', 21)]), (reopened, [('in_progress', 20), ('resolved', 50)])):
+        for status, hours in steps:
+            db.session.add(StatusUpdate(complaint_id=complaint.id, updated_by=officer.id, new_status=status,
+                                        timestamp=START + timedelta(hours=hours)))
+    db.session.commit()
+    analytics.refresh()
+    assert analytics.built_at == built_at
+
+    roads, = analytics.report('department')
+    # The reopened complaint keeps its first resolution time
+    assert (roads['complaints'], roads['resolved'], roads['open']) == (2, 2, 0)
+    assert roads['resolution_p50'] == 15.5
+    assert list(analytics.samples[('all', 'all')]['in_progress']) == [20, 30]
+
+    # A full rebuild agrees with the incrementally maintained numbers
+    rebuilt = SlaAnalytics(TARGETS)
+    rebuilt.refresh()
+    assert rebuilt.report('department') == analytics.report('department')
+
+def test_sla_page(app, client, login, add_lifecycle):
+    add_lifecycle([('in_progress', 2), ('resolved', 10)])
+    login('admin@example.com', 'Admin123!')
+    response = client.get('/admin/sla?by=category')
+    assert response.status_code == 200
+    assert b'Potholes' in response.data and b'10.0 h' in response.data
+    assert app.extensions['sla_analytics'] is get_sla_analytics()
@@ -0,0 +1,63 @@
+import json
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from models import db
+from slow_queries import SlowQueryRecorder, normalise_sql, parameter_shape, uses_full_scan
+
+def install_recorder(app, tmp_path):
+    recorder = SlowQueryRecorder(0, log_path=str(tmp_path / 'slow.log'))
+    with app.app_context():
+        recorder.install(db.engine)
+    app.extensions['slow_queries'] = recorder
+    return recorder
+
+def test_normalise_collapses_literals_and_lists():
+    sql = "SELECT * FROM complaints\n WHERE status = 'resolved' AND id IN (?, ?, ?) LIMIT 20"
+    assert normalise_sql(sql) == 'SELECT * FROM complaints WHERE status = ? AND id IN (?, ...) LIMIT ?'
+    assert normalise_sql('SELECT anon_1.id FROM t AS anon_1') == 'SELECT anon_1.id FROM t AS anon_1'
+
+def test_parameter_shape_hides_values():
+    assert parameter_shape((3, 'secret'), False) == '(int, str)'
+    assert parameter_shape([(1,), (2,)], True) == '2 x (int)'
+
+def test_plan_captured_once_and_logged(app, client, login, tmp_path):
+    recorder = install_recorder(app, tmp_path)
+    login('admin@example.com', 'Admin123!')
+    client.get('/admin/complaints?status=resolved')
+    client.get('/admin/complaints?status=rejected')
+
+    statements = {s.statement: s for s in recorder.worst(limit=500)}
+    listing = [s for s in statements.values() if 'FROM complaints' in s.statement and s.count == 2]
+    assert listing
+    assert listing[0].plan
+    assert listing[0].endpoints == {'admin.all_complaints': 2}
+
+    entries = [json.loads(line) for line in (tmp_path / 'slow.log').read_text().splitlines()]
+    logged = [e for e in entries if e['statement'] == listing[0].statement]
+    assert len(logged) == 2
+    assert 'plan' in logged[0] and 'plan' not in logged[1]
+    assert 'admin@example.com' not in json.dumps(entries)
+
+def test_failed_statement_is_not_timed_against_the_connection(app, tmp_path):
+    install_recorder(app, tmp_path)
+    connection = db.session.connection()
+    with pytest.raises(OperationalError):
+        connection.execute(text('SELECT * FROM no_such_table'))
+    connection.execute(text('SELECT 1'))
+    assert 'slow_query_start' not in connection.info
+
+def test_admin_page_lists_statements(app, client, login, tmp_path):
+    install_recorder(app, tmp_path)
+    login('admin@example.com', 'Admin123!')
+    client.get('/admin/dashboard')
+
+    response = client.get('/admin/slow-queries')
+    assert response.status_code == 200
+    assert b'FROM complaints' in response.data
+    assert b'Query plan' in response.data
+
+def test_full_scan_detection():
+    assert uses_full_scan('SCAN complaints')
+    assert not uses_full_scan('SEARCH complaints USING INDEX ix_complaints_status (status=?)')
+    assert not uses_full_scan('SCAN complaints USING COVERING INDEX ix_complaints_status')
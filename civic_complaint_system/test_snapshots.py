@@ -0,0 +1,59 @@
+import hashlib
+from datetime import date, datetime, time, timedelta
+from models import Job, ReportSnapshot
+from snapshots import generate_snapshots, period_range, schedule_report_snapshots
+
+TODAY = date(2026, 10, 1)  # a Thursday
+
+def test_standard_periods_are_written_once_with_checksums(app, tmp_path, add_complaint):
+    app.config['SNAPSHOT_DIR'] = str(tmp_path)
+    assert period_range('yesterday', TODAY) == (date(2026, 9, 30), date(2026, 9, 30))
+    assert period_range('last_week', TODAY) == (date(2026, 9, 21), date(2026, 9, 27))
+    assert period_range('last_month', TODAY) == (date(2026, 9, 1), date(2026, 9, 30))
+
+    add_complaint(created_at=datetime(2026, 9, 2, 10), submitted=True)
+    add_complaint(created_at=datetime(2026, 9, 22, 9), category='water_supply', assigned_department='water',
+                  submitted=True)
+    add_complaint(created_at=datetime(2026, 9, 30, 23, 30), submitted=True)
+    add_complaint(created_at=datetime(2026, 10, 1, 8), submitted=True)
+
+    # 'all' and every department, as CSV and Excel
+    departments = len(set(app.config['CATEGORY_DEPARTMENT_MAP'].values())) + 1
+    assert generate_snapshots(TODAY) == {period: 2 * departments for period in ('yesterday', 'last_week', 'last_month')}
+    rows = {(s.period, s.department): s.rows for s in ReportSnapshot.query.filter_by(export_format='csv')}
+    assert rows[('last_month', 'all')] == 3 and rows[('last_month', 'roads')] == 2
+    assert rows[('last_week', 'water')] == 1 and rows[('yesterday', 'all')] == 1
+
+    snapshot = ReportSnapshot.query.filter_by(period='last_month', department='roads', export_format='csv').one()
+    data = (tmp_path / snapshot.filename).read_bytes()
+    assert hashlib.sha256(data).hexdigest() == snapshot.sha256 and len(data) == snapshot.size
+    assert data.decode().splitlines()[1].split(',')[-1] == '1'  # status updates counted in bulk
+
+    # A retried job finds the files in place and leaves them alone
+    assert generate_snapshots(TODAY) == {'yesterday': 0, 'last_week': 0, 'last_month': 0}
+
+def test_matching_exports_are_served_from_snapshots(app, client, login, tmp_path, add_complaint):
+    app.config['SNAPSHOT_DIR'] = str(tmp_path)
+    add_complaint(created_at=datetime(2026, 9, 2, 10), submitted=True)
+    generate_snapshots(TODAY)
+    login('admin@example.com', 'Admin123!')
+
+    response = client.get('/admin/reports')
+    assert b'Standard Reports' in response.data and b'Last Month' in response.data
+    job = Job.query.filter_by(name='generate_report_snapshots').one()
+    # Snapshots were generated today, so the next run is tomorrow night
+    tomorrow = datetime.utcnow().date() + timedelta(days=1)
+    assert abs(job.run_at - datetime.combine(tomorrow, time(app.config['SNAPSHOT_HOUR']))) < timedelta(seconds=1)
+    assert schedule_report_snapshots().id == job.id
+
+    month = '/admin/reports?start_date=2026-09-01&end_date=2026-09-30&department=roads&status=all&category=all'
+    response = client.get(f'{month}&export=csv')
+    snapshot = ReportSnapshot.query.filter_by(period='last_month', department='roads', export_format='csv').one()
+    assert response.status_code == 302 and response.location.endswith(f'/admin/reports/snapshots/{snapshot.id}')
+    download = client.get(response.location)
+    assert download.status_code == 200 and download.headers['ETag'] == f'"{snapshot.sha256}"'
+    assert snapshot.download_name in download.headers['Content-Disposition']
+
+    # Custom filters are generated on demand
+    response = client.get('/admin/reports?start_date=2026-09-01&end_date=2026-09-30&status=submitted&export=csv')
+    assert response.status_code == 200 and response.headers['Content-Type'] == 'text/csv'
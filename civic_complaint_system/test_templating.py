@@ -0,0 +1,32 @@
+from app import create_app
+from config import TestingConfig
+
+def test_workers_share_compiled_templates(monkeypatch, tmp_path):
+    monkeypatch.setattr(TestingConfig, 'TEMPLATE_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(TestingConfig, 'TEMPLATE_WARMUP', True)
+
+    first = create_app('testing')
+    templates = first.jinja_env.list_templates(extensions=['html'])
+    compiled = sorted(path.name for path in tmp_path.iterdir())
+    assert len(compiled) == len(templates)
+    assert len(first.jinja_env.cache) == len(templates)
+
+    # A second worker loads the bytecode instead of compiling again
+    second = create_app('testing')
+    cache = second.extensions['template_cache']
+    buckets = []
+    load_bytecode = cache.load_bytecode
+
+    def recording_load(bucket):
+        load_bytecode(bucket)
+        buckets.append(bucket)
+
+    monkeypatch.setattr(cache, 'load_bytecode', recording_load)
+    second.jinja_env.cache.clear()
+    second.jinja_env.get_template('admin_dashboard.html')
+    assert buckets[0].code is not None
+    assert sorted(path.name for path in tmp_path.iterdir()) == compiled
+
+def test_warmup_is_off_by_default_in_tests(app):
+    assert 'template_cache' not in app.extensions
+    assert not app.jinja_env.cache